@@ -32,6 +32,7 @@ if __name__ == '__main__':
     splash.show()
 
 import re
+import time
 import widgetClasses as wc
 import ImageViewer as ImgV
 import TextEditor as TextV
@@ -40,6 +41,16 @@ import HtmlViewer as HtmlV
 import HtmlEditor as HtmlE
 import glyphs
 import distance
+import heads
+import dictionary
+import scannos
+import checks
+import jobs
+import macros
+import rules
+import pages
+import tohtml
+import joined
 
 
 IMG_TYPES = ('.png','.bmp','.tif','.tiff','.jpg','.jpeg','.pbm','.pgm','.ppm','.xbm','.xpm')
@@ -80,14 +91,31 @@ class MainProgram(QtWidgets.QMainWindow):
         self.editorList = []
         self.currentEditor = None
 
+        # Background jobs
+        self.jobRunner = jobs.JobRunner(self)
+        self.jobRunner.started.connect(self.jobStarted)
+        self.jobRunner.progress.connect(self.jobProgress)
+        self.jobRunner.ended.connect(self.jobEnded)
+        self.menuEnabled = True
+
         # Settings
         self.initMenu()
         self.initToolbar()
         self.statusBar = QtWidgets.QStatusBar(self)
         self.setStatusBar(self.statusBar)
+        self.progressBar = QtWidgets.QProgressBar(self)
+        self.progressBar.setMaximumWidth(200)
+        self.progressBar.hide()
+        self.statusBar.addPermanentWidget(self.progressBar)
+        self.cancelJobButton = QtWidgets.QPushButton('Cancel', self)
+        self.cancelJobButton.clicked.connect(lambda: self.jobRunner.cancel())
+        self.cancelJobButton.hide()
+        self.statusBar.addPermanentWidget(self.cancelJobButton)
 
 
         self.lastLocation = os.path.expanduser('~')
+        self.dictionaries = dictionary.loadDictionaries()
+        self.rulePacks = [] # Paths of the Clean OCR rule packs loaded in this session
 
         self.resize(1000, 1000)
         self.show()
@@ -114,6 +142,14 @@ class MainProgram(QtWidgets.QMainWindow):
         self.currentEditor = self.editorList[-1]
         self.currentEditor.setTextList([loc])
 
+    def addHtmlFile(self,loc):
+        """
+        Opens an html file in a viewer and in an editor that updates the viewer.
+        """
+        self.addHtmlViewer(loc)
+        self.addHtmlEditor(loc)
+        self.currentEditor.setViewer(self.currentViewer)
+
     def addTextEdit(self,textList):
         textEdit = TextV.multiTextFrame(self)
         self.editTabs.addTab(textEdit,'Txt')
@@ -128,6 +164,47 @@ class MainProgram(QtWidgets.QMainWindow):
             self.statusBar.setStyleSheet("QStatusBar{padding-left:8px;}")
         self.statusBar.showMessage(msg, 10000)
 
+    def runJob(self, name, func, args=(), onDone=None, onEnd=None):
+        """
+        Runs func(progress, *args) in the background (see jobs.JobRunner.start).
+        Only one job can run at a time.
+        """
+        job = self.jobRunner.start(name, func, args, onDone, onEnd)
+        if job is None:
+            self.dispMsg(f'{name}: another operation is still running', 'red')
+        return job
+
+    def jobStarted(self, name):
+        self.menuEnable(self.menuEnabled)
+        self.progressBar.setMaximum(0) # Busy indicator until the first progress
+        self.progressBar.show()
+        self.cancelJobButton.show()
+        self.dispMsg(f'{name}: running')
+
+    def jobProgress(self, name, done, total):
+        self.progressBar.setMaximum(max(total, 1))
+        self.progressBar.setValue(done)
+        self.dispMsg(f'{name}: {done}/{total}')
+
+    def jobEnded(self, name, status):
+        self.progressBar.hide()
+        self.cancelJobButton.hide()
+        self.menuEnable(self.menuEnabled)
+        if status == 'finished':
+            self.dispMsg(f'{name}: finished')
+        else:
+            self.dispMsg(f'{name}: {status}', 'red')
+
+    def closeEvent(self, event):
+        self.jobRunner.cancel()
+        self.jobRunner.wait()
+        for editor in self.editorList:
+            editor.saveCurrent()
+        errors = pages.flush()
+        if errors:
+            QtWidgets.QMessageBox.warning(self, 'Saving failed', 'The following pages could not be saved:\n\n' + '\n'.join(errors))
+        event.accept()
+
     def removeViewTab(self,num):
         self.viewerList[num].clearReader() 
         self.viewTabs.removeTab(num)
@@ -185,6 +262,7 @@ class MainProgram(QtWidgets.QMainWindow):
         self.menubar.addMenu(self.filemenu)
         self.openFileAct = self.filemenu.addAction('Add files', self.openFileDialog)
         self.openFolderAct = self.filemenu.addAction('Add folder', self.openFolderDialog)
+        self.buildDictAct = self.filemenu.addAction('Build dictionary', self.buildDictionary)
 
         self.viewmenu = QtWidgets.QMenu('View', self)
         self.menubar.addMenu(self.viewmenu)
@@ -201,9 +279,11 @@ class MainProgram(QtWidgets.QMainWindow):
         #self.greekTransAct = self.textmenu.addAction('Greek UTF8 --> Transliterated Greek', self.transliterateGreek)
         self.charCountAct = self.textmenu.addAction(QtGui.QIcon(IconDirectory + 'charcount.png'),'Get character count', self.charCount)
         self.wordListAct = self.textmenu.addAction(QtGui.QIcon(IconDirectory + 'wordcount.png'),'Get word list', self.wordList)
+        self.scannoAct = self.textmenu.addAction('Find scannos', self.scannoWindow)
         self.hyphenWordsAct = self.textmenu.addAction(QtGui.QIcon(IconDirectory + 'corrhyphen.png'),'Correct EOL hyphens', self.hyphenCorrext)
         self.headerDelAct = self.textmenu.addAction(QtGui.QIcon(IconDirectory + 'head.png'),'Remove headers', self.headerDelWindow)
         self.footerDelAct = self.textmenu.addAction(QtGui.QIcon(IconDirectory + 'foot.png'),'Remove footers', self.footerDelWindow)
+        self.pageLabelsAct = self.textmenu.addAction('Page numbers', self.pageLabelWindow)
         self.emptyPagesAct = self.textmenu.addAction(QtGui.QIcon(IconDirectory + 'labelblank.png'),'Label blank pages', self.labelEmptyPages)
         self.greekWidgetAct = self.textmenu.addAction(QtGui.QIcon(IconDirectory + 'greek.png'),'Greek input window', self.textOpenGreek)
         self.copticWidgetAct = self.textmenu.addAction('Coptic input window', self.textOpenCoptic)
@@ -213,17 +293,33 @@ class MainProgram(QtWidgets.QMainWindow):
         self.unicodeWidgetAct = self.textmenu.addAction(QtGui.QIcon(IconDirectory + 'unicodeinput.png'),'Unicode input window', self.textOpenUnicode)
         self.searchWidgetAct = self.textmenu.addAction(QtGui.QIcon(IconDirectory + 'search.png'),'Search', self.textSearch, QtCore.Qt.CTRL + QtCore.Qt.Key_F)
         self.formatWidgetAct = self.textmenu.addAction(QtGui.QIcon(IconDirectory + 'format.png'),'Format tools', self.textFormat)
+        self.textmenu.addSeparator()
+        self.recordMacroAct = self.textmenu.addAction('Start macro recording', self.toggleMacroRecording)
+        self.runMacroAct = self.textmenu.addAction('Run macro', self.runMacro)
+        self.profileRulesAct = self.textmenu.addAction('Profile regular expressions')
+        self.profileRulesAct.setCheckable(True)
+        self.textmenu.addSeparator()
+        self.revertAct = self.textmenu.addAction('Revert last operation', self.revertLast)
+        self.historyAct = self.textmenu.addAction('Operation history', self.historyWindow)
         
         self.textmenupost = QtWidgets.QMenu('Text editor: post', self)
         self.menubar.addMenu(self.textmenupost)
         self.searchDPmarksAct = self.textmenupost.addAction('Find DP markers', self.textDPSearch)
+        self.markerIndexAct = self.textmenupost.addAction('DP marker index', self.textMarkerIndex)
         self.tonos2OxiaAct = self.textmenupost.addAction('Convert Tonos to Oxia', self.textTonos2Oxia)
         self.starHyphenWidgetAct = self.textmenupost.addAction('Fix starred hyphens', self.textStarHyphen)
-
-        self.textViewActs = [self.cleanOCRAct,self.charCountAct,self.wordListAct,
-                            self.hyphenWordsAct,self.headerDelAct,self.footerDelAct,self.emptyPagesAct,
+        self.checksAct = self.textmenupost.addAction('Run checks', self.textChecks)
+        self.htmlChecksAct = self.textmenupost.addAction('Check HTML', self.htmlChecks)
+        self.htmlOutlineAct = self.textmenupost.addAction('HTML outline', self.htmlOutline)
+        self.toHtmlAct = self.textmenupost.addAction('Convert to HTML', self.toHtml)
+        self.joinAct = self.textmenupost.addAction('Join pages', self.joinPages)
+        self.splitAct = self.textmenupost.addAction('Split joined file', self.splitJoined)
+
+        self.textViewActs = [self.cleanOCRAct,self.charCountAct,self.wordListAct,self.scannoAct,
+                            self.hyphenWordsAct,self.headerDelAct,self.footerDelAct,self.pageLabelsAct,self.emptyPagesAct,
                             self.greekWidgetAct,self.hebrewWidgetAct,self.unicodeWidgetAct,
-                            self.searchWidgetAct,self.searchDPmarksAct,self.tonos2OxiaAct,self.formatWidgetAct,self.starHyphenWidgetAct]
+                            self.searchWidgetAct,self.searchDPmarksAct,self.markerIndexAct,self.tonos2OxiaAct,self.formatWidgetAct,self.starHyphenWidgetAct,self.checksAct,self.htmlChecksAct,self.htmlOutlineAct,self.toHtmlAct,self.joinAct,self.splitAct,
+                            self.recordMacroAct,self.runMacroAct,self.profileRulesAct,self.revertAct,self.historyAct]
 
         self.helpmenu = QtWidgets.QMenu('Help', self)
         self.menubar.addMenu(self.helpmenu)
@@ -233,6 +329,9 @@ class MainProgram(QtWidgets.QMainWindow):
 
 
     def menuEnable(self,enable):
+        self.menuEnabled = enable
+        # Menus stay disabled while a job runs
+        enable = enable and not self.jobRunner.busy()
         self.textmenu.menuAction().setEnabled(enable)
         self.textmenupost.menuAction().setEnabled(enable) 
         self.imagemenu.menuAction().setEnabled(enable)
@@ -291,12 +390,18 @@ class MainProgram(QtWidgets.QMainWindow):
     def footerDelWindow(self):
         FooterDelWindow(self)
 
+    def pageLabelWindow(self):
+        PageLabelWindow(self)
+
     def labelEmptyPages(self):
         EmptyPagesWindow(self)
 
     def wordList(self):
         WordCountWindow(self)
 
+    def scannoWindow(self):
+        ScannoWindow(self)
+
     def textOpenGreek(self):
         self.currentEditor.openGreekWidget()
 
@@ -321,13 +426,141 @@ class MainProgram(QtWidgets.QMainWindow):
     def textFormat(self):
         self.currentEditor.openFormatWindow()
 
+    def toggleMacroRecording(self):
+        editor = self.currentEditor
+        if editor.macro is None:
+            editor.startRecording()
+            self.recordMacroAct.setText('Stop macro recording')
+            self.dispMsg('Macro: recording')
+            return
+        macro = editor.stopRecording()
+        self.recordMacroAct.setText('Start macro recording')
+        if len(macro) == 0:
+            self.dispMsg('Macro: nothing recorded', 'red')
+            return
+        path = QtWidgets.QFileDialog.getSaveFileName(self, 'Save macro', self.lastLocation, 'Macro (*.json)')
+        if isinstance(path, tuple):
+            path = path[0]
+        if len(path) > 0:
+            if not path.endswith('.json'):
+                path += '.json'
+            macro.save(path)
+            self.dispMsg(f'Macro: {len(macro)} steps saved')
+
+    def revertLast(self):
+        log = self.currentEditor.snapshotStore().log()
+        if len(log) == 0:
+            self.dispMsg('Revert: no operations to revert', 'red')
+            return
+        msg = f'Revert "{log[-1]["name"]}" ({time.strftime("%Y-%m-%d %H:%M", time.localtime(log[-1]["time"]))})?'
+        run = QtWidgets.QMessageBox.Yes == QtWidgets.QMessageBox.question(self, 'Revert', msg, QtWidgets.QMessageBox.Yes, QtWidgets.QMessageBox.No)
+        if run:
+            self.currentEditor.revertSnapshot()
+
+    def historyWindow(self):
+        HistoryWindow(self)
+
+    def showRuleProfile(self, name, profile):
+        RuleProfileWindow(self, name, profile)
+
+    def runMacro(self):
+        path = QtWidgets.QFileDialog.getOpenFileName(self, 'Open macro', self.lastLocation, 'Macro (*.json)')
+        if isinstance(path, tuple):
+            path = path[0]
+        if len(path) == 0:
+            return
+        try:
+            macro = macros.loadMacro(path)
+        except macros.MacroError as e:
+            self.dispMsg(f'Macro: {e}', 'red')
+            return
+        msg = 'Run the following steps on all pages?\n\n' + '\n'.join(macro.describe())
+        run = QtWidgets.QMessageBox.Yes == QtWidgets.QMessageBox.question(self, 'Run macro', msg, QtWidgets.QMessageBox.Yes, QtWidgets.QMessageBox.No)
+        if run:
+            try:
+                self.currentEditor.runMacro(macro)
+            except rules.RulePackError as e:
+                self.dispMsg(f'Macro: {e}', 'red')
+
     def textStarHyphen(self):
         self.currentEditor.openStarHyphenFixWindow()
 
 
+    def textChecks(self):
+        CheckWindow(self)
+
+    def htmlEditor(self, name):
+        """
+        Returns the current editor if it is an HTML editor. Otherwise, shows a message and returns None.
+        """
+        if isinstance(self.currentEditor, HtmlE.HtmlEditFrame):
+            return self.currentEditor
+        self.dispMsg(f'{name}: select an HTML editor first')
+        return None
+
+    def htmlChecks(self):
+        editor = self.htmlEditor('Check HTML')
+        if editor is not None:
+            editor.openHtmlCheckWindow()
+
+    def htmlOutline(self):
+        editor = self.htmlEditor('HTML outline')
+        if editor is not None:
+            editor.openOutlineWindow()
+
+    def toHtml(self):
+        HtmlConvertWindow(self)
+
+    def htmlConverted(self, result):
+        path, warnings = result
+        self.addHtmlFile(path)
+        if warnings:
+            self.dispMsg(f'Converted to {path}; ' + '; '.join(warnings), 'red')
+        else:
+            self.dispMsg(f'Converted to {path}')
+
+    def joinPages(self):
+        editor = self.currentEditor
+        folder = os.path.dirname(editor.textLocs[0])
+        default = os.path.join(os.path.dirname(folder), os.path.basename(folder) + '.txt')
+        path = QtWidgets.QFileDialog.getSaveFileName(self, 'Join pages', default, 'Text (*.txt)')
+        if isinstance(path, tuple):
+            path = path[0]
+        if len(path) == 0:
+            return
+        if os.path.dirname(os.path.abspath(path)) == os.path.abspath(folder):
+            self.dispMsg('Join pages: choose a file outside the folder of the pages', 'red')
+            return
+        editor.runJob('Join pages', joined.joinPages, (editor.textLocs, path),
+                      lambda index: self.dispMsg(f'Joined {len(index)} pages into {path}'), modify=False)
+
+    def splitJoined(self):
+        path = QtWidgets.QFileDialog.getOpenFileName(self, 'Split joined file', self.lastLocation, 'Text (*.txt)')
+        if isinstance(path, tuple):
+            path = path[0]
+        if len(path) == 0:
+            return
+        try:
+            joined.loadIndex(path)
+        except joined.JoinError as e:
+            self.dispMsg(f'Split: {e}', 'red')
+            return
+        editor = self.currentEditor
+        editor.runJob('Split joined file', joined.splitFile, (path, editor.textLocs), self.splitDone)
+
+    def splitDone(self, result):
+        written, skipped = result
+        self.dispMsg(f'Split: {len(written)} pages written')
+        if skipped:
+            more = f'\n... and {len(skipped) - 50} more' if len(skipped) > 50 else ''
+            QtWidgets.QMessageBox.warning(self, 'Split', 'The following pages were not written:\n\n' + '\n'.join(skipped[:50]) + more)
+
     def textDPSearch(self):
         self.currentEditor.openSearchDPWindow()
 
+    def textMarkerIndex(self):
+        self.currentEditor.openMarkerWindow()
+
     def textTonos2Oxia(self):
         self.currentEditor.greekTonos2Oxia()
 
@@ -346,6 +579,27 @@ class MainProgram(QtWidgets.QMainWindow):
             if len(fileList) > 0:
                 self.loadFiles(fileList)
 
+    def buildDictionary(self):
+        fileList = QtWidgets.QFileDialog.getOpenFileNames(self, 'Select word lists (.dic or plain text)', self.lastLocation)
+        if isinstance(fileList, tuple):
+            fileList = fileList[0]
+        if len(fileList) == 0:
+            return
+        name, ok = QtWidgets.QInputDialog.getText(self, 'Build dictionary', 'Dictionary name (e.g. en_GB):')
+        if not ok or len(name) == 0:
+            return
+        if not os.path.isdir(dictionary.DICT_DIR):
+            os.makedirs(dictionary.DICT_DIR)
+        # Release the mapped files before a dictionary is possibly overwritten
+        self.dictionaries.close()
+        try:
+            count = dictionary.buildDictionary(fileList, os.path.join(dictionary.DICT_DIR, name + dictionary.DICT_EXT))
+        except (OSError, UnicodeError) as e:
+            self.dispMsg(f'Dictionary: {e}', 'red')
+        else:
+            self.dispMsg(f'Dictionary: {name} built with {count} words')
+        self.dictionaries = dictionary.loadDictionaries()
+
     def loadFiles(self,fileList):
         self.lastLocation = os.path.dirname(fileList[-1])  # Save used path
         #Get all text files, sorted alphabetically
@@ -358,8 +612,7 @@ class MainProgram(QtWidgets.QMainWindow):
             self.addImageViewer(imageList)
         if len(htmlList):
             for html in htmlList:
-                self.addHtmlViewer(html)
-                self.addHtmlEditor(html)
+                self.addHtmlFile(html)
         if len(textList):
             self.addTextEdit(textList)
 
@@ -392,19 +645,25 @@ class HyphenWindow(wc.ToolWindow):
         self.checkText.setChecked(True)
         self.grid.addWidget(self.checkText, 0, 0)
         self.checkDict = QtWidgets.QCheckBox('Based on dictionary')
-        self.checkDict.setEnabled(False)
+        self.checkDict.setEnabled(len(self.father.dictionaries) > 0)
+        self.checkDict.setChecked(len(self.father.dictionaries) > 0)
+        if len(self.father.dictionaries) > 0:
+            self.checkDict.setToolTip(', '.join(self.father.dictionaries.names()))
         self.grid.addWidget(self.checkDict, 1, 0)
         self.grid.addWidget(QtWidgets.QLabel('Otherwise:'),2,0)
         self.otherwiseDrop = QtWidgets.QComboBox()
         self.otherwiseDrop.addItems(['Do nothing','Join and keep hyphen','Join and remove hyphen'])
         self.grid.addWidget(self.otherwiseDrop, 3, 0)
+        self.checkPages = QtWidgets.QCheckBox('Also across pages')
+        self.checkPages.setToolTip('Move the completed word of a hyphen at the end of a page to that page')
+        self.grid.addWidget(self.checkPages, 4, 0)
 
 
     def applyFunc(self):
         useDict = self.checkDict.isChecked()
         useText = self.checkText.isChecked()
         otherwise = self.otherwiseDrop.currentIndex()
-        self.father.currentEditor.delEOLHypenWords(useDict,useText,otherwise)
+        self.father.currentEditor.delEOLHypenWords(useDict,useText,otherwise,self.checkPages.isChecked())
 
 
 class EmptyPagesWindow(wc.ToolWindow):
@@ -435,19 +694,29 @@ class CharCountWindow(wc.ToolWindow):
         self.orderType = QtWidgets.QComboBox()
         self.orderType.addItems(['Alphabetically (Ascending)','Alphabetically (Descending)','Count (Ascending)',
             'Count (Descending)'])
-        self.orderType.currentIndexChanged.connect(self.upd)
+        self.orderType.currentIndexChanged.connect(self.fill)
         self.grid.addWidget(self.orderType,0,1)
         self.table = QtWidgets.QTableWidget(1, 6)
         self.table.setHorizontalHeaderLabels(['Character', 'Code point', 'Name','Count','DP suite','Replace'])
         self.table.verticalHeader().hide()
+        self.counter = None
         self.upd()
         self.grid.addWidget(self.table, 1, 0, 1, 6)
         self.resize(900, 800)
         #self.setGeometry(self.frameSize().width() - self.geometry().width(), self.frameSize().height(), 0, 0)
 
     def upd(self):
+        self.job = self.father.currentEditor.getCharCount(onDone=self.setCounter)
+
+    def setCounter(self, counter):
+        self.counter = counter
+        self.fill()
+
+    def fill(self):
+        if self.counter is None:
+            return
         ordType = self.orderType.currentIndex()
-        counter = self.father.currentEditor.getCharCount()
+        counter = self.counter
         self.table.setRowCount(len(counter.keys()))
 
         if ordType == 0: #Alphabetical
@@ -509,12 +778,10 @@ class CharCountWindow(wc.ToolWindow):
     def replaceChar(self,char):
         text, ok = QtWidgets.QInputDialog.getText(self, 'Replace character by', 'Characters:')
         if ok:
-            self.father.currentEditor.runRegexp([[re.escape(char),re.escape(text)]],all=True)
-            self.upd()
+            self.father.currentEditor.runRegexp([[re.escape(char),re.escape(text)]],all=True,onDone=lambda changed: self.upd())
 
 
     def applyFunc(self):
-        self.father.currentEditor.saveCurrent()
         self.upd()
 
 
@@ -531,17 +798,26 @@ class WordCountWindow(wc.ToolWindow):
         self.orderType = QtWidgets.QComboBox()
         self.orderType.addItems(['Alphabetically (Ascending)','Alphabetically (Descending)','Count (Ascending)',
             'Count (Descending)'])
-        self.orderType.currentIndexChanged.connect(self.upd)
+        self.orderType.currentIndexChanged.connect(self.fill)
         self.grid.addWidget(self.orderType,0,1)
         self.harmonic = QtWidgets.QPushButton('Harmonic')
         self.grid.addWidget(self.harmonic,0,2)
         self.harmonic.setEnabled(False)
         self.harmonic.clicked.connect(self.popupHarmonics)
-        self.table = QtWidgets.QTableWidget(1, 2)
-        self.table.setHorizontalHeaderLabels(['Word','Count'])
+        self.showType = QtWidgets.QComboBox()
+        self.showType.addItems(['All words','Suspect words'])
+        self.showType.currentIndexChanged.connect(self.upd)
+        self.grid.addWidget(self.showType,0,3)
+        self.goodButton = QtWidgets.QPushButton('Add to good words')
+        self.goodButton.setEnabled(False)
+        self.goodButton.clicked.connect(self.addGoodWord)
+        self.grid.addWidget(self.goodButton,0,4)
+        self.table = QtWidgets.QTableWidget(1, 3)
+        self.table.setHorizontalHeaderLabels(['Word','Count','Pages'])
         self.table.verticalHeader().hide()
         self.table.currentCellChanged.connect(self.selectChanged)
         self.wordList = None
+        self.suspects = None
         self.upd()
         self.grid.addWidget(self.table, 1, 0, 1, 6)
         self.resize(1, 800)
@@ -549,14 +825,32 @@ class WordCountWindow(wc.ToolWindow):
     def selectChanged(self,currentRow, currentColumn, previousRow, previousColumn):
         if self.table.currentRow() is None:
             self.harmonic.setEnabled(False)
+            self.goodButton.setEnabled(False)
         else:
             self.harmonic.setEnabled(True)
+            self.goodButton.setEnabled(self.showType.currentIndex() == 1)
 
     def upd(self):
+        if self.showType.currentIndex() == 1: # Suspects, checked against dictionaries and good words
+            if len(self.father.dictionaries) == 0:
+                self.father.dispMsg('Word Count: no dictionaries loaded, only good words are used', 'red')
+            self.job = self.father.currentEditor.getSpellcheck(onDone=self.setWords)
+        else:
+            self.job = self.father.currentEditor.getWordList(onDone=lambda words: self.setWords((words, None)))
+
+    def setWords(self, result):
+        self.wordList, self.suspects = result
+        self.fill()
+
+    def fill(self):
+        if self.wordList is None:
+            return
         ordType = self.orderType.currentIndex()
-        self.wordList = self.father.currentEditor.getWordList()
-        self.table.setRowCount(len(self.wordList.keys()))
-        keys = self.wordList.keys()
+        if self.suspects is not None:
+            keys = self.suspects.keys()
+        else:
+            keys = self.wordList.keys()
+        self.table.setRowCount(len(keys))
 
         if ordType == 0 or ordType == 1: #Alphabetical
             lwr = [x.lower() for x in keys]
@@ -574,6 +868,7 @@ class WordCountWindow(wc.ToolWindow):
             if ordType == 3: #By count, inverted
                 elements = reversed(elements)
 
+        names = self.father.currentEditor.textNames
         for pos, val in enumerate(elements):
             word = val
             count = str(self.wordList[val])
@@ -583,6 +878,16 @@ class WordCountWindow(wc.ToolWindow):
             item2 = QtWidgets.QTableWidgetItem(count)
             item2.setFlags(QtCore.Qt.ItemIsEnabled)
             self.table.setItem(pos, 1, item2)
+            if self.suspects is not None:
+                pages = self.suspects[val]
+                pageStr = ', '.join([names[x - 1] for x in pages[:3]])
+                if len(pages) > 3:
+                    pageStr += f' (+{len(pages) - 3})'
+                item3 = QtWidgets.QTableWidgetItem(pageStr)
+            else:
+                item3 = QtWidgets.QTableWidgetItem('')
+            item3.setFlags(QtCore.Qt.ItemIsEnabled)
+            self.table.setItem(pos, 2, item3)
 
         self.table.setSizeAdjustPolicy(QtWidgets.QAbstractScrollArea.AdjustToContents)
         self.table.resizeColumnsToContents()
@@ -591,8 +896,13 @@ class WordCountWindow(wc.ToolWindow):
         word = self.table.item(self.table.currentRow(), 0).text()
         HarmonicWindow(self,word)
 
+    def addGoodWord(self):
+        word = self.table.item(self.table.currentRow(), 0).text()
+        self.father.currentEditor.addGoodWords([word])
+        self.table.removeRow(self.table.currentRow())
+        del self.suspects[word]
+
     def applyFunc(self):
-        self.father.currentEditor.saveCurrent()
         self.upd()
 
 class HarmonicWindow(wc.ToolWindow):
@@ -657,11 +967,84 @@ class HarmonicWindow(wc.ToolWindow):
         msg = f'Replace "{self.word}" with "{new}"?'
         run = QtWidgets.QMessageBox.Yes == QtWidgets.QMessageBox.question(self, 'Replace', msg, QtWidgets.QMessageBox.Yes, QtWidgets.QMessageBox.No)
         if run:
-            self.father.father.currentEditor.replaceWords(self.word,new)
-            self.father.upd()
+            self.father.father.currentEditor.replaceWords(self.word,new,onDone=lambda changed: self.father.upd())
             self.closeEvent()
 
 
+class ScannoWindow(wc.ToolWindow):
+    NAME = 'Scannos'
+    CANCELNAME = 'Close'
+    OKNAME = 'Update'
+    APPLYANDCLOSE = False
+    RESIZABLE = True
+
+    def __init__(self, parent):
+        super(ScannoWindow, self).__init__(parent)
+        self.tablePath = None
+        self.grid.addWidget(QtWidgets.QLabel('Confusion table:'), 0, 0)
+        self.tableLabel = QtWidgets.QLabel('Built-in')
+        self.grid.addWidget(self.tableLabel, 0, 1)
+        loadButton = QtWidgets.QPushButton('Load table')
+        loadButton.clicked.connect(self.loadTable)
+        self.grid.addWidget(loadButton, 0, 2)
+        self.table = QtWidgets.QTableWidget(1, 6)
+        self.table.setHorizontalHeaderLabels(['Scanno','Count','Correction','Count','Ratio','Replace'])
+        self.table.verticalHeader().hide()
+        self.wordList = None
+        self.upd()
+        self.grid.addWidget(self.table, 1, 0, 1, 6)
+        self.resize(600, 800)
+
+    def loadTable(self):
+        path = QtWidgets.QFileDialog.getOpenFileName(self, 'Open confusion table', self.father.lastLocation)
+        if isinstance(path, tuple):
+            path = path[0]
+        if len(path) > 0:
+            self.tablePath = path
+            self.tableLabel.setText(os.path.basename(path))
+            self.fill()
+
+    def upd(self):
+        self.job = self.father.currentEditor.getWordList(onDone=self.setWords)
+
+    def setWords(self, words):
+        self.wordList = words
+        self.fill()
+
+    def fill(self):
+        if self.wordList is None:
+            return
+        try:
+            table = scannos.loadTable(self.tablePath)
+        except OSError as e:
+            self.father.dispMsg(f'Scannos: {e}', 'red')
+            return
+        hits = scannos.findScannos(self.wordList, table)
+        self.table.setRowCount(len(hits))
+        for pos, (word, count, correct, correctCount, ratio) in enumerate(hits):
+            items = [word, str(count), correct, str(correctCount), f'{ratio:.1f}']
+            for col, val in enumerate(items):
+                item = QtWidgets.QTableWidgetItem(val)
+                item.setFlags(QtCore.Qt.ItemIsEnabled)
+                self.table.setItem(pos, col, item)
+            button = QtWidgets.QPushButton('Replace')
+            button.clicked.connect(lambda arg, w=word, c=correct: self.replace(w, c))
+            self.table.setCellWidget(pos, 5, button)
+
+        self.table.setSizeAdjustPolicy(QtWidgets.QAbstractScrollArea.AdjustToContents)
+        self.table.resizeColumnsToContents()
+
+    def replace(self, word, correct):
+        msg = f'Replace all "{word}" with "{correct}"?'
+        run = QtWidgets.QMessageBox.Yes == QtWidgets.QMessageBox.question(self, 'Replace', msg, QtWidgets.QMessageBox.Yes, QtWidgets.QMessageBox.No)
+        if run:
+            # The correction is literal text, not a replacement template
+            self.father.currentEditor.replaceWords(re.escape(word), correct.replace('\\', r'\\'), all=True, onDone=lambda changed: self.upd())
+
+    def applyFunc(self):
+        self.upd()
+
+
 class HeaderDelWindow(wc.ToolWindow):
     NAME = 'Remove Headers'
     OKNAME = 'Apply'
@@ -670,8 +1053,8 @@ class HeaderDelWindow(wc.ToolWindow):
 
     def __init__(self, parent):
         super(HeaderDelWindow, self).__init__(parent)
-        self.table = QtWidgets.QTableWidget(1, 4)
-        self.table.setHorizontalHeaderLabels(['Remove','Page #','Page name','Header'])
+        self.table = QtWidgets.QTableWidget(1, 5)
+        self.table.setHorizontalHeaderLabels(['Remove','Page #','Page name','Header','Detected'])
         self.table.verticalHeader().hide()
         self.table.itemClicked.connect(self.itemClicked)
         self.table.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectRows)
@@ -704,6 +1087,7 @@ class HeaderDelWindow(wc.ToolWindow):
         pagenames = self.father.currentEditor.textNames 
         self.table.setRowCount(len(pagenames))
         headers =  self.getLines()
+        kinds = heads.classify(headers)
         self.checkList = []
         for pos in range(len(pagenames)):
 
@@ -718,8 +1102,11 @@ class HeaderDelWindow(wc.ToolWindow):
                 item3 = QtWidgets.QTableWidgetItem(headers[pos])
                 item3.setFlags(QtCore.Qt.ItemIsEnabled)
                 self.table.setItem(pos, 3, item3)
+                item4 = QtWidgets.QTableWidgetItem(kinds[pos] or '')
+                item4.setFlags(QtCore.Qt.ItemIsEnabled)
+                self.table.setItem(pos, 4, item4)
                 item0 = QtWidgets.QTableWidgetItem()
-                item0.setCheckState(2)
+                item0.setCheckState(2 if kinds[pos] else 0)
                 item0.setTextAlignment( QtCore.Qt.AlignCenter )
                 self.table.setItem(pos, 0, item0)
                 self.checkList.append(item0)
@@ -745,7 +1132,7 @@ class FooterDelWindow(HeaderDelWindow):
 
     def __init__(self, parent):
         super(FooterDelWindow, self).__init__(parent)
-        self.table.setHorizontalHeaderLabels(['Remove','Page #','Page name','Footer'])
+        self.table.setHorizontalHeaderLabels(['Remove','Page #','Page name','Footer','Detected'])
 
     def getLines(self):
         return self.father.currentEditor.getFooters()
@@ -756,12 +1143,65 @@ class FooterDelWindow(HeaderDelWindow):
 
 
 
+class PageLabelWindow(wc.ToolWindow):
+    NAME = 'Page numbers'
+    OKNAME = 'Save'
+    RESIZABLE = True
+
+    def __init__(self, parent):
+        super(PageLabelWindow, self).__init__(parent)
+        editor = self.father.currentEditor
+        labels, messages = editor.getPageLabels()
+        self.names = [pages.imageName(loc) for loc in editor.textLocs]
+        saved = heads.loadLabels(editor.pageLabelsFile())
+        if saved is not None: # Keep the corrections of the user
+            labels = [saved.get(name) for name in self.names]
+        self.grid.addWidget(QtWidgets.QLabel('Jumps in the page numbers (from the headers and footers):'), 0, 0)
+        self.messageList = QtWidgets.QListWidget()
+        self.messageList.addItems([x[1] for x in messages] or ['None'])
+        self.messageList.setMaximumHeight(120)
+        self.messagePos = [x[0] for x in messages]
+        self.messageList.itemClicked.connect(self.gotoMessage)
+        self.grid.addWidget(self.messageList, 1, 0)
+        self.table = QtWidgets.QTableWidget(len(self.names), 4)
+        self.table.setHorizontalHeaderLabels(['Image','Header','Footer','Printed page'])
+        self.table.verticalHeader().hide()
+        headers = editor.getHeaders()
+        footers = editor.getFooters()
+        for pos, name in enumerate(self.names):
+            for col, text in enumerate((name, headers[pos], footers[pos])):
+                item = QtWidgets.QTableWidgetItem(text or '')
+                item.setFlags(QtCore.Qt.ItemIsEnabled)
+                self.table.setItem(pos, col, item)
+            self.table.setItem(pos, 3, QtWidgets.QTableWidgetItem(labels[pos] or ''))
+        self.table.resizeColumnsToContents()
+        self.grid.addWidget(self.table, 2, 0)
+        self.resize(800, 800)
+
+    def gotoMessage(self, item):
+        row = self.messageList.row(item)
+        if row < len(self.messagePos):
+            self.table.scrollToItem(self.table.item(self.messagePos[row], 3))
+            self.table.selectRow(self.messagePos[row])
+
+    def applyFunc(self):
+        labels = dict()
+        for pos, name in enumerate(self.names):
+            text = self.table.item(pos, 3).text().strip()
+            if text:
+                labels[name] = text
+        self.father.currentEditor.savePageLabels(labels)
+        self.father.dispMsg(f'Page numbers: {len(labels)} of {len(self.names)} pages labelled')
+
+
 class CleanOCRWindow(wc.ToolWindow):
     NAME = 'Clean OCR'
     OKNAME = 'Run'
     RESIZABLE = False
 
     PRESETS = ['English','Dutch','Empty']
+    PRESETLANGUAGES = ['en','nl',None] # Language tag of each preset, used for the rule packs
+    SAMPLESIZE = 50
 
     def __init__(self, parent):
         super(CleanOCRWindow, self).__init__(parent)
@@ -863,6 +1303,47 @@ class CleanOCRWindow(wc.ToolWindow):
         self.allChecks = self.whiteChecks + self.punctChecks + self.quotesChecks + self.loteChecks
         self.allCodeNames = self.whiteCodeList + self.punctCodeList + self.quotesCodeList + self.loteCodeList
 
+        #Rule packs
+        packWid = QtWidgets.QWidget(self)
+        packGrid = QtWidgets.QGridLayout(packWid)
+        loadButton = QtWidgets.QPushButton('Load rule pack')
+        loadButton.clicked.connect(self.loadPack)
+        packGrid.addWidget(loadButton,0,0)
+        self.packList = QtWidgets.QListWidget()
+        self.packList.itemChanged.connect(self.schedulePreview)
+        packGrid.addWidget(self.packList,1,0)
+        self.tabs.addTab(packWid, 'Rule packs')
+        self.packItems = dict() # rule name --> list item
+        for path in list(self.father.rulePacks):
+            self.addPack(path)
+
+        #Preview
+        previewWid = QtWidgets.QWidget(self)
+        previewGrid = QtWidgets.QGridLayout(previewWid)
+        self.sampleCheck = QtWidgets.QCheckBox(f'Sample pages (about {self.SAMPLESIZE})')
+        self.sampleCheck.setChecked(len(self.father.currentEditor.textLocs) > 2 * self.SAMPLESIZE)
+        self.sampleCheck.stateChanged.connect(self.resetPreview)
+        previewGrid.addWidget(self.sampleCheck,0,0)
+        self.previewTable = QtWidgets.QTableWidget(0, 3)
+        self.previewTable.setHorizontalHeaderLabels(['Rule','Substitutions','Pages'])
+        self.previewTable.verticalHeader().hide()
+        self.previewTable.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectRows)
+        self.previewTable.cellClicked.connect(self.showSnippets)
+        previewGrid.addWidget(self.previewTable,1,0)
+        self.snippetLabel = QtWidgets.QLabel()
+        self.snippetLabel.setWordWrap(True)
+        self.snippetLabel.setTextFormat(QtCore.Qt.PlainText)
+        previewGrid.addWidget(self.snippetLabel,2,0)
+        self.previewIndex = self.tabs.addTab(previewWid, 'Preview')
+        self.previewResults = dict() # option name --> [count, page indices, snippets]
+        self.previewTimer = QtCore.QTimer(self)
+        self.previewTimer.setSingleShot(True)
+        self.previewTimer.setInterval(300)
+        self.previewTimer.timeout.connect(self.updatePreview)
+        self.tabs.currentChanged.connect(self.schedulePreview)
+        for elem in self.allChecks:
+            elem.stateChanged.connect(self.schedulePreview)
+
         self.setBools()
 
         self.grid.addWidget(self.tabs, 1, 0, 1, 2)
@@ -885,15 +1366,349 @@ class CleanOCRWindow(wc.ToolWindow):
         elif ind == 2: # Empty
             for elem in self.loteChecks + self.quotesChecks + self.punctChecks + self.whiteChecks:
                 elem.setChecked(False)
+        self.setPackBools()
+
+    def setPackBools(self):
+        language = self.PRESETLANGUAGES[self.presetDrop.currentIndex()]
+        for path in self.father.rulePacks:
+            try:
+                pack = rules.loadPack(path)
+            except rules.RulePackError as e:
+                self.father.dispMsg(f'Rule pack: {e}', 'red')
+                continue
+            names = pack.names(language) if language is not None else []
+            for name in pack.names():
+                if name in self.packItems: # Rules added to the file after it was loaded are not listed
+                    self.packItems[name].setCheckState(QtCore.Qt.Checked if name in names else QtCore.Qt.Unchecked)
+
+    def addPack(self, path):
+        try:
+            pack = rules.loadPack(path)
+        except rules.RulePackError as e:
+            self.father.dispMsg(f'Rule pack: {e}', 'red')
+            if path in self.father.rulePacks:
+                self.father.rulePacks.remove(path)
+            return False
+        for name in pack.names():
+            if name in self.packItems:
+                self.father.dispMsg(f'Rule pack: {name} is already loaded', 'red')
+                return False
+        for name in pack.names():
+            item = QtWidgets.QListWidgetItem(name)
+            item.setFlags(QtCore.Qt.ItemIsEnabled | QtCore.Qt.ItemIsUserCheckable)
+            item.setCheckState(QtCore.Qt.Unchecked)
+            self.packList.addItem(item)
+            self.packItems[name] = item
+        return True
+
+    def loadPack(self):
+        path = QtWidgets.QFileDialog.getOpenFileName(self, 'Open rule pack', self.father.lastLocation, 'Rule pack (*.json *.txt)')
+        if isinstance(path, tuple):
+            path = path[0]
+        if len(path) == 0 or path in self.father.rulePacks:
+            return
+        if self.addPack(path):
+            self.father.rulePacks.append(path)
+            self.setPackBools()
 
+    def selectedNames(self):
+        names = [x[1] for x in zip(self.allChecks,self.allCodeNames) if x[0].isChecked()]
+        return names + [name for name, item in self.packItems.items() if item.checkState() == QtCore.Qt.Checked]
+
+    def selectedRegexps(self, names):
+        return rules.cleanOCRRegexps(names) + rules.packRegexps(self.father.rulePacks, names)
+
+    def previewLocations(self):
+        locs = self.father.currentEditor.textLocs
+        if not self.sampleCheck.isChecked() or len(locs) <= self.SAMPLESIZE:
+            return list(range(len(locs)))
+        step = len(locs) / self.SAMPLESIZE
+        return [int(x * step) for x in range(self.SAMPLESIZE)]
+
+    def schedulePreview(self, *args):
+        if self.tabs.currentIndex() == self.previewIndex:
+            self.previewTimer.start()
+
+    def resetPreview(self, *args):
+        self.previewResults = dict()
+        self.schedulePreview()
+
+    def updatePreview(self):
+        """
+        Counts the matches of the selected options that have not been counted yet.
+        Each option is counted on the unchanged pages, so the results of
+        options that are already known stay valid.
+        """
+        if self.father.jobRunner.busy(): # Wait for the running job (possibly our own)
+            self.previewTimer.start()
+            return
+        missing = [x for x in self.selectedNames() if x not in self.previewResults]
+        if not missing:
+            self.fillPreview()
+            return
+        editor = self.father.currentEditor
+        indices = self.previewLocations()
+        locs = [editor.textLocs[x] for x in indices]
+        def setResults(result):
+            for name in missing:
+                count, pages, snippets = result.get(name, [0, [], []])
+                self.previewResults[name] = [count, [indices[x] for x in pages], snippets]
+            self.fillPreview()
+        try:
+            regexps = self.selectedRegexps(missing)
+        except rules.RulePackError as e:
+            self.father.dispMsg(f'Clean OCR preview: {e}', 'red')
+            return
+        self.job = editor.runJob('Clean OCR preview', rules.previewRules, (locs, regexps),
+                                 setResults, modify=False)
+
+    def fillPreview(self):
+        editor = self.father.currentEditor
+        labels = {x[1]: x[0].text() for x in zip(self.allChecks,self.allCodeNames)}
+        labels.update({name: name for name in self.packItems})
+        self.previewNames = [x for x in self.selectedNames() if x in self.previewResults]
+        self.previewTable.setRowCount(len(self.previewNames))
+        total = 0
+        for pos, name in enumerate(self.previewNames):
+            count, pages, snippets = self.previewResults[name]
+            total += count
+            pageText = ', '.join(editor.textNames[x] for x in pages[:10])
+            if len(pages) > 10:
+                pageText += f', ... ({len(pages)} pages)'
+            items = [labels[name], str(count), pageText]
+            for num, val in enumerate(items):
+                item = QtWidgets.QTableWidgetItem(val)
+                item.setFlags(QtCore.Qt.ItemIsEnabled | QtCore.Qt.ItemIsSelectable)
+                self.previewTable.setItem(pos, num, item)
+        self.previewTable.resizeColumnsToContents()
+        self.snippetLabel.setText('')
+        sample = ' (sample)' if len(self.previewLocations()) < len(editor.textLocs) else ''
+        self.father.dispMsg(f'Clean OCR preview{sample}: {total} substitutions')
+
+    def showSnippets(self, row, column):
+        snippets = self.previewResults[self.previewNames[row]][2]
+        self.snippetLabel.setText('\n'.join(f'{before}  -->  {after}' for before, after in snippets))
 
     def closeEvent(self, *args):
+        self.previewTimer.stop()
         self.father.currentEditor.setReadOnly(False)
         wc.ToolWindow.closeEvent(self)
 
     def applyFunc(self):
-        names = [x[1] for x in zip(self.allChecks,self.allCodeNames) if x[0].isChecked()]
-        self.father.currentEditor.cleanOCR(names)
+        self.previewTimer.stop()
+        if self.job is not None and self.father.jobRunner.job is self.job:
+            self.father.jobRunner.cancel(self.job)
+            self.father.jobRunner.wait()
+        try:
+            self.father.currentEditor.cleanOCR(self.selectedNames(), self.father.rulePacks)
+        except rules.RulePackError as e:
+            self.father.dispMsg(f'Clean OCR: {e}', 'red')
+
+class HtmlConvertWindow(wc.ToolWindow):
+    NAME = 'Convert to HTML'
+    OKNAME = 'Convert'
+    RESIZABLE = True
+
+    def __init__(self, parent):
+        super(HtmlConvertWindow, self).__init__(parent)
+        editors = [x for x in self.father.editorList if type(x) is TextV.multiTextFrame and x.textLocs]
+        self.editor = editors[0] if editors else None
+        self.pagesRadio = QtWidgets.QRadioButton('Pages of the text editor')
+        self.fileRadio = QtWidgets.QRadioButton('Joined text file:')
+        self.fileEdit = QtWidgets.QLineEdit()
+        fileButton = QtWidgets.QPushButton('Browse')
+        fileButton.clicked.connect(self.browseFile)
+        self.outEdit = QtWidgets.QLineEdit()
+        outButton = QtWidgets.QPushButton('Browse')
+        outButton.clicked.connect(self.browseOut)
+        self.titleEdit = QtWidgets.QLineEdit()
+        self.grid.addWidget(self.pagesRadio, 0, 0, 1, 3)
+        self.grid.addWidget(self.fileRadio, 1, 0)
+        self.grid.addWidget(self.fileEdit, 1, 1)
+        self.grid.addWidget(fileButton, 1, 2)
+        self.grid.addWidget(QtWidgets.QLabel('Output:'), 2, 0)
+        self.grid.addWidget(self.outEdit, 2, 1)
+        self.grid.addWidget(outButton, 2, 2)
+        self.grid.addWidget(QtWidgets.QLabel('Title:'), 3, 0)
+        self.grid.addWidget(self.titleEdit, 3, 1, 1, 2)
+        if self.editor is not None:
+            folder = os.path.dirname(self.editor.textLocs[0])
+            self.pagesRadio.setChecked(True)
+            self.outEdit.setText(os.path.join(folder, 'book.html'))
+            self.titleEdit.setText(os.path.basename(folder))
+        else:
+            self.pagesRadio.setEnabled(False)
+            self.fileRadio.setChecked(True)
+        self.resize(600, 200)
+
+    def browseFile(self):
+        path = QtWidgets.QFileDialog.getOpenFileName(self, 'Open joined text file', self.father.lastLocation, 'Text (*.txt)')
+        if isinstance(path, tuple):
+            path = path[0]
+        if path:
+            self.fileEdit.setText(path)
+            self.fileRadio.setChecked(True)
+            self.outEdit.setText(os.path.splitext(path)[0] + '.html')
+
+    def browseOut(self):
+        path = QtWidgets.QFileDialog.getSaveFileName(self, 'Save HTML', self.outEdit.text() or self.father.lastLocation, 'HTML (*.html)')
+        if isinstance(path, tuple):
+            path = path[0]
+        if path:
+            self.outEdit.setText(path)
+
+    def applyFunc(self):
+        out = self.outEdit.text()
+        title = self.titleEdit.text()
+        labels = heads.loadLabels(self.editor.pageLabelsFile()) if self.editor is not None else None
+        if not out:
+            self.father.dispMsg('Convert to HTML: no output file', 'red')
+        elif self.pagesRadio.isChecked():
+            self.editor.runJob('Convert to HTML', tohtml.convertPages, (self.editor.textLocs, out, title, labels),
+                               self.father.htmlConverted, modify=False)
+        elif os.path.isfile(self.fileEdit.text()):
+            self.father.runJob('Convert to HTML', tohtml.convertFile, (self.fileEdit.text(), out, title, labels),
+                               self.father.htmlConverted)
+        else:
+            self.father.dispMsg('Convert to HTML: select a text file', 'red')
+
+
+class HistoryWindow(wc.ToolWindow):
+    NAME = 'Operation history'
+    CANCELNAME = 'Close'
+    OKNAME = 'Restore'
+    RESIZABLE = True
+
+    def __init__(self, parent):
+        super(HistoryWindow, self).__init__(parent)
+        self.grid.addWidget(QtWidgets.QLabel('Restoring a snapshot undoes the selected operation and all later ones.'), 0, 0)
+        self.log = list(reversed(self.father.currentEditor.snapshotStore().log()))
+        self.table = QtWidgets.QTableWidget(len(self.log), 3)
+        self.table.setHorizontalHeaderLabels(['Time','Operation','Pages changed'])
+        self.table.verticalHeader().hide()
+        self.table.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectRows)
+        self.table.setSelectionMode(QtWidgets.QAbstractItemView.SingleSelection)
+        for pos, entry in enumerate(self.log):
+            changed = '' if entry['changed'] is None else str(entry['changed']) # None: the operation did not finish
+            items = [time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(entry['time'])), entry['name'], changed]
+            for col, val in enumerate(items):
+                item = QtWidgets.QTableWidgetItem(val)
+                item.setFlags(QtCore.Qt.ItemIsEnabled | QtCore.Qt.ItemIsSelectable)
+                self.table.setItem(pos, col, item)
+        self.table.resizeColumnsToContents()
+        if self.log:
+            self.table.selectRow(0)
+        self.grid.addWidget(self.table, 1, 0)
+        self.resize(500, 500)
+
+    def applyFunc(self):
+        rows = self.table.selectionModel().selectedRows()
+        if rows:
+            self.father.currentEditor.revertSnapshot(self.log[rows[0].row()]['id'])
+
+class RuleProfileWindow(wc.ToolWindow):
+    NAME = 'Rule profile'
+    CANCELNAME = 'Close'
+    OKNAME = 'Export'
+    APPLYANDCLOSE = False
+    MENUDISABLE = False
+    RESIZABLE = True
+
+    HEADERS = ['Rule','Option','Time (ms)','Slowest page (ms)','Slowest page','Matches','Bytes changed','Pages']
+
+    def __init__(self, parent, name, profile):
+        super(RuleProfileWindow, self).__init__(parent)
+        self.setWindowTitle(f'{self.NAME}: {name}')
+        self.profile = profile
+        summary = profile.summary()
+        self.grid.addWidget(QtWidgets.QLabel(f'{len(summary)} rules, {len(profile.pageNames)} pages. '
+                                             f'Red: over {rules.SLOWPAGE * 1000:.0f} ms on a single page. Grey: no matches.'), 0, 0)
+        self.table = QtWidgets.QTableWidget(len(summary), len(self.HEADERS))
+        self.table.setHorizontalHeaderLabels(self.HEADERS)
+        self.table.verticalHeader().hide()
+        for pos, elem in enumerate(summary):
+            values = [elem['rule'], elem['option'], elem['time'] * 1000, elem['maxTime'] * 1000,
+                      elem['slowestPage'], elem['matches'], elem['bytes'], elem['pages']]
+            for col, val in enumerate(values):
+                item = QtWidgets.QTableWidgetItem()
+                if isinstance(val, float):
+                    val = round(val, 2)
+                item.setData(QtCore.Qt.DisplayRole, val if val is not None else '')
+                item.setFlags(QtCore.Qt.ItemIsEnabled | QtCore.Qt.ItemIsSelectable)
+                if elem['slow']:
+                    item.setBackground(QtGui.QColor(255, 180, 180))
+                elif elem['unused']:
+                    item.setForeground(QtGui.QColor('gray'))
+                self.table.setItem(pos, col, item)
+        self.table.setSortingEnabled(True)
+        self.table.sortItems(2, QtCore.Qt.DescendingOrder)
+        self.table.resizeColumnsToContents()
+        self.grid.addWidget(self.table, 1, 0)
+        self.resize(900, 600)
+
+    def applyFunc(self):
+        path, filt = QtWidgets.QFileDialog.getSaveFileName(self, 'Export rule profile', self.father.lastLocation,
+                                                           'CSV (*.csv);;JSON (*.json)')
+        if len(path) == 0:
+            return
+        if not path.endswith(('.csv','.json')):
+            path += '.json' if 'json' in filt.lower() else '.csv'
+        try:
+            if path.endswith('.json'):
+                self.profile.saveJSON(path)
+            else:
+                self.profile.saveCSV(path)
+        except OSError as e:
+            self.father.dispMsg(f'Rule profile: {e}', 'red')
+            return
+        self.father.dispMsg(f'Rule profile saved to {path}')
+
+class CheckWindow(wc.ToolWindow):
+    NAME = 'Checks'
+    CANCELNAME = 'Close'
+    OKNAME = 'Run'
+    APPLYANDCLOSE = False
+    RESIZABLE = True
+
+    def __init__(self, parent):
+        super(CheckWindow, self).__init__(parent)
+        self.checkBoxes = []
+        for pos, check in enumerate(checks.CHECKS):
+            self.checkBoxes.append(QtWidgets.QCheckBox(check.NAME))
+            self.checkBoxes[-1].setChecked(True)
+            self.grid.addWidget(self.checkBoxes[-1], pos // 2, pos % 2)
+        self.table = QtWidgets.QTableWidget(0, 4)
+        self.table.setHorizontalHeaderLabels(['Page','Line','Check','Message'])
+        self.table.verticalHeader().hide()
+        self.table.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectRows)
+        self.table.cellClicked.connect(self.gotoResult)
+        self.grid.addWidget(self.table, 10, 0, 1, 2)
+        self.results = []
+        self.resize(800, 800)
+
+    def gotoResult(self, row, column):
+        page, line, col, code, msg = self.results[row]
+        self.father.currentEditor.gotoPosition(page, line, col)
+
+    def applyFunc(self):
+        editor = self.father.currentEditor
+        codes = [x[1].CODE for x in zip(self.checkBoxes, checks.CHECKS) if x[0].isChecked()]
+        self.job = editor.runJob('Checks', checks.runChecks, (editor.textLocs, codes), self.setResults, modify=False)
+
+    def setResults(self, results):
+        editor = self.father.currentEditor
+        self.results = results
+        names = {x.CODE: x.NAME for x in checks.CHECKS}
+        self.table.setRowCount(len(self.results))
+        for pos, (page, line, col, code, msg) in enumerate(self.results):
+            items = [editor.textNames[page - 1], str(line + 1), names[code], msg]
+            for num, val in enumerate(items):
+                item = QtWidgets.QTableWidgetItem(val)
+                item.setFlags(QtCore.Qt.ItemIsEnabled | QtCore.Qt.ItemIsSelectable)
+                self.table.setItem(pos, num, item)
+        self.table.resizeColumnsToContents()
+        self.father.dispMsg(f'Checks: {len(self.results)} results')
+
 
 class aboutWindow(wc.ToolWindow):
 
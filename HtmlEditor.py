@@ -18,10 +18,203 @@
 # You should have received a copy of the GNU General Public License
 # along with Disprop. If not, see <http://www.gnu.org/licenses/>.
 
+import os
+from PyQt5 import QtCore, QtWidgets
 import TextEditor
+import highlighter
+import htmlcheck
+import outline
 
 #QtGui.QFontDatabase.addApplicationFont(os.path.dirname(os.path.realpath(__file__)) + '/DPSansMono.ttf')
 
 class HtmlEditFrame(TextEditor.multiTextFrame):
+
+    HIGHLIGHTER = highlighter.HtmlHighlighter
+    PLAINTEXT = True
+
+    PREVIEWDELAY = 500 # ms without edits before the preview is updated
+
     def __init__(self,parent):
         super(HtmlEditFrame, self).__init__(parent)
+        self.viewer = None
+        self.previewTimer = QtCore.QTimer(self)
+        self.previewTimer.setSingleShot(True)
+        self.previewTimer.setInterval(self.PREVIEWDELAY)
+        self.previewTimer.timeout.connect(self.updatePreview)
+        self.textEditor.textChanged.connect(self.schedulePreview)
+
+    def setViewer(self,viewer):
+        """
+        Links an HtmlViewer, which then shows the edits live.
+        """
+        self.viewer = viewer
+
+    def schedulePreview(self):
+        if self.viewer is not None:
+            self.previewTimer.start()
+
+    def updatePreview(self):
+        if self.viewer is None or self.textLocs is None or self.textIndex is None:
+            return
+        self.viewer.showText(self.textEditor.toPlainText(), self.textLocs[self.textIndex - 1])
+
+    def clearReader(self):
+        self.previewTimer.stop()
+        super(HtmlEditFrame, self).clearReader()
+
+    def reload(self):
+        super(HtmlEditFrame, self).reload()
+        if isinstance(self.inputWindowWidget, OutlineWindow):
+            self.inputWindowWidget.watch(self.textEditor.document())
+
+    def openOutlineWindow(self):
+        self.openInputWidget(OutlineWindow(self))
+
+    def openHtmlCheckWindow(self):
+        self.openInputWidget(HtmlCheckWindow(self))
+        self.inputWindowWidget.run()
+
+
+class HtmlCheckWindow(QtWidgets.QWidget):
+    """
+    Shows the results of the html checks (see htmlcheck.py) of the edited
+    text. Clicking a result moves the cursor to it.
+    """
+
+    def __init__(self,parent):
+        QtWidgets.QWidget.__init__(self)
+        self.father = parent
+        self.job = None
+        self.results = []
+        layout = QtWidgets.QGridLayout(self)
+        layout.setColumnStretch(1,1)
+        layout.addWidget(QtWidgets.QLabel('<b>HTML checks</b>'), 0, 0)
+        self.countLabel = QtWidgets.QLabel('')
+        layout.addWidget(self.countLabel, 0, 1)
+        self.runButton = QtWidgets.QPushButton('Run')
+        self.runButton.clicked.connect(self.run)
+        layout.addWidget(self.runButton, 0, 2)
+        self.closeButton = QtWidgets.QPushButton('Close')
+        self.closeButton.clicked.connect(self.father.removeInputWindow)
+        layout.addWidget(self.closeButton, 0, 3)
+        self.table = QtWidgets.QTableWidget(0, 3)
+        self.table.setHorizontalHeaderLabels(['Line','Check','Message'])
+        self.table.verticalHeader().hide()
+        self.table.horizontalHeader().setStretchLastSection(True)
+        self.table.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectRows)
+        self.table.cellClicked.connect(self.gotoResult)
+        layout.addWidget(self.table, 1, 0, 1, 4)
+
+    def run(self):
+        editor = self.father
+        if editor.textLocs is None or editor.textIndex is None:
+            return
+        folder = os.path.dirname(editor.textLocs[editor.textIndex - 1])
+        self.countLabel.setText('Checking...')
+        self.job = editor.runJob('HTML checks', htmlcheck.checkHtmlJob,
+                                 (editor.textEditor.toPlainText(), folder), self.setResults, modify=False)
+
+    def stop(self):
+        if self.job is not None:
+            self.father.father.jobRunner.cancel(self.job)
+            self.job = None
+
+    def setResults(self,results):
+        self.job = None
+        self.results = results
+        self.table.setRowCount(len(results))
+        for pos, (line, column, code, msg) in enumerate(results):
+            for num, val in enumerate([str(line + 1), htmlcheck.CODES[code], msg]):
+                item = QtWidgets.QTableWidgetItem(val)
+                item.setFlags(QtCore.Qt.ItemIsEnabled | QtCore.Qt.ItemIsSelectable)
+                self.table.setItem(pos, num, item)
+        self.table.resizeColumnsToContents()
+        self.countLabel.setText(f'{len(results)} results')
+
+    def gotoResult(self,row,column):
+        line, col, code, msg = self.results[row]
+        self.father.gotoPosition(self.father.textIndex, line, col)
+
+
+class OutlineWindow(QtWidgets.QWidget):
+    """
+    Shows the outline of the edited document (see outline.py). The index
+    is updated on each edit; the tree is rebuilt when the edits stop, and
+    only if the outline changed. Clicking an entry shows it in the editor
+    and in the linked viewer.
+    """
+
+    REBUILDDELAY = 300 # ms
+
+    def __init__(self,parent):
+        QtWidgets.QWidget.__init__(self)
+        self.father = parent
+        self.doc = None
+        self.index = outline.OutlineIndex()
+        self.shown = [] # The entries in the tree
+        layout = QtWidgets.QGridLayout(self)
+        layout.setColumnStretch(1,1)
+        layout.addWidget(QtWidgets.QLabel('<b>HTML outline</b>'), 0, 0)
+        self.closeButton = QtWidgets.QPushButton('Close')
+        self.closeButton.clicked.connect(self.father.removeInputWindow)
+        layout.addWidget(self.closeButton, 0, 2)
+        self.tree = QtWidgets.QTreeWidget()
+        self.tree.setHeaderHidden(True)
+        self.tree.itemClicked.connect(self.gotoEntry)
+        layout.addWidget(self.tree, 1, 0, 1, 3)
+        self.timer = QtCore.QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(self.REBUILDDELAY)
+        self.timer.timeout.connect(self.fillTree)
+        self.watch(self.father.textEditor.document())
+
+    def watch(self,doc):
+        if self.doc is doc:
+            return
+        self.stop()
+        self.doc = doc
+        doc.contentsChange.connect(self.contentsChange)
+        self.index.build(doc.toPlainText())
+        self.fillTree()
+
+    def stop(self):
+        self.timer.stop()
+        if self.doc is not None:
+            try:
+                self.doc.contentsChange.disconnect(self.contentsChange)
+            except (TypeError, RuntimeError):
+                pass
+            self.doc = None
+
+    def contentsChange(self,position,removed,added):
+        first = self.doc.findBlock(position)
+        last = self.doc.findBlock(position + added)
+        if not last.isValid():
+            last = self.doc.lastBlock()
+        if self.index.update(lambda num: self.doc.findBlockByNumber(num).text(), self.doc.blockCount(),
+                             first.blockNumber(), last.blockNumber()):
+            self.timer.start()
+
+    def fillTree(self):
+        self.tree.clear()
+        self.shown = list(self.index.entries)
+        stack = [] # (level, item) of the open headings
+        for pos, entry in enumerate(self.shown):
+            while stack and stack[-1][0] >= entry.level:
+                stack.pop()
+            item = QtWidgets.QTreeWidgetItem([entry.label()])
+            item.setData(0, QtCore.Qt.UserRole, pos)
+            if stack:
+                stack[-1][1].addChild(item)
+            else:
+                self.tree.addTopLevelItem(item)
+            if entry.level < outline.LEAF:
+                stack.append((entry.level, item))
+        self.tree.expandToDepth(1)
+
+    def gotoEntry(self,item,column):
+        entry = self.shown[item.data(0, QtCore.Qt.UserRole)]
+        editor = self.father
+        editor.gotoPosition(editor.textIndex, entry.line)
+        if editor.viewer is not None:
+            editor.viewer.scrollToElement(entry.ident, entry.selector(), self.index.ordinal(entry))
@@ -19,8 +19,10 @@
 # along with Disprop. If not, see <http://www.gnu.org/licenses/>.
 
 import os.path
+import hashlib
 from PyQt5 import QtGui, QtCore, QtWidgets
 from PyQt5.QtWebKitWidgets import QWebView
+import pages
 
 
 
@@ -35,6 +37,9 @@ class HtmlViewer(QtWidgets.QSplitter):
 
 
         self.browser = Browser(self)
+        self.browser.loadFinished.connect(self.restoreScroll)
+        self.digest = None # Hash of the shown html
+        self.scrollPos = None # Scroll position to restore after loading
 
         self.addWidget(self.browser)
 
@@ -43,8 +48,41 @@ class HtmlViewer(QtWidgets.QSplitter):
 
     def setHtml(self,file):
         url = QtCore.QUrl().fromLocalFile(file)
+        self.digest = hashlib.sha1(pages.readPage(file).encode()).digest()
         self.browser.load(url)
 
+    def showText(self,text,file):
+        """
+        Shows html text from memory (i.e. the unsaved text of the editor).
+        Relative links are resolved from the location of file. Nothing is
+        done if the text did not change, and the scroll position is kept.
+        """
+        digest = hashlib.sha1(text.encode()).digest()
+        if digest == self.digest:
+            return
+        self.digest = digest
+        if self.scrollPos is None: # Keep the old position if the previous load did not finish yet
+            self.scrollPos = self.browser.page().mainFrame().scrollPosition()
+        self.browser.setHtml(text, QtCore.QUrl().fromLocalFile(file))
+
+    def restoreScroll(self,ok):
+        if self.scrollPos is not None:
+            self.browser.page().mainFrame().setScrollPosition(self.scrollPos)
+            self.scrollPos = None
+
+    def scrollToElement(self,ident,selector,ordinal):
+        """
+        Scrolls to the element with id ident. If ident is None, scrolls to
+        element number 'ordinal' of the elements that match the CSS selector.
+        """
+        frame = self.browser.page().mainFrame()
+        if ident:
+            frame.scrollToAnchor(ident)
+            return
+        elements = frame.findAllElements(selector)
+        if ordinal < elements.count():
+            elements.at(ordinal).evaluateJavaScript('this.scrollIntoView(true);')
+
     def clearReader(self):
         pass
 
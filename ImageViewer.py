@@ -28,6 +28,14 @@ def optImage(loc):
     im = Image.open(loc)
     im.save(loc,optimize=True)
 
+def optImages(progress, locs):
+    """
+    Job function: optimizes the images on a process pool.
+    """
+    with mp.get_context('spawn').Pool(max(mp.cpu_count()-1,1)) as p: # Not forked from the job thread
+        for pos, _ in enumerate(p.imap_unordered(optImage, locs)):
+            progress(pos + 1, len(locs))
+
 class multiImageFrame(QtWidgets.QWidget):
     def __init__(self,parent):
         super(multiImageFrame, self).__init__(parent)
@@ -107,8 +115,7 @@ class multiImageFrame(QtWidgets.QWidget):
     def optimizePNG(self):
         if self.imageLocs is not None:
             locs = [x for x in self.imageLocs if x.lower().endswith('.png')]
-            with mp.Pool(max(mp.cpu_count()-1,1)) as p:
-                p.map(optImage, locs)
+            self.father.runJob('Optimize png images', optImages, (locs,))
 
     def clearReader(self):
         self.imageLocs = None
@@ -26,11 +26,26 @@ import string
 import collections as col
 from ast import literal_eval
 import math
+import functools
 import greek
 import glyphs
 import widgetClasses as wc
+import spellcheck
+import jobs
+import macros
+import rules
+import pages
+import heads
+import markers
+import joined
+import snapshots
+import highlighter
 import unicode as unicode
 
+JOINED_SEPARATOR = QtCore.QRegularExpression('^-----File: ') # Page separator of joined files (see pages.SEPARATOR_RE)
+PAGE_END_HYPHEN_RE = re.compile(r'(\w+)-\*?$') # Hyphenated word at the end of the last line of a page
+PAGE_START_WORD_RE = re.compile(r'[ \t]*\*?(\w+)(\S*)[ \t]*') # Its continuation, on the first line of the next page
+
 #QtGui.QFontDatabase.addApplicationFont(os.path.dirname(os.path.realpath(__file__)) + '/DPSansMono.ttf')
 
 def getNgrams(input, corpus = 26, startYear = 1800, endYear = 1925, smoothing = 1):
@@ -64,6 +79,10 @@ def getNgrams(input, corpus = 26, startYear = 1800, endYear = 1925, smoothing =
     return sums
 
 class multiTextFrame(QtWidgets.QSplitter):
+
+    HIGHLIGHTER = highlighter.DPHighlighter # Highlighter class of the pages, or None
+    PLAINTEXT = False # If True, a QPlainTextEdit is used (faster for large files, no rich text layout)
+
     def __init__(self,parent):
         QtWidgets.QWidget.__init__(self)
         self.father = parent
@@ -78,7 +97,10 @@ class multiTextFrame(QtWidgets.QSplitter):
         self.textFrame = QtWidgets.QGridLayout(self.textWidget)
         self.addWidget(self.textWidget)
 
-        self.textEditor = QtTextEdit(self)
+        if self.PLAINTEXT:
+            self.textEditor = QtPlainTextEdit(self)
+        else:
+            self.textEditor = QtTextEdit(self)
 
         #Force LTR text
         #doc = self.textEditor.document()
@@ -89,13 +111,12 @@ class multiTextFrame(QtWidgets.QSplitter):
 
 
         self.textFrame.addWidget(self.textEditor, 0, 0, 1, 11)
-        self.textEditor.setAcceptRichText(False)
         self.textEditor.cursorPositionChanged.connect(self.cursorPositionChanged)
         self.textEditor.leave.connect(self.saveCurrent)
 
         self.textPageSpin = QtWidgets.QSpinBox(self)
         self.textPageSpin.setMinimum(1)
-        self.textPageSpin.valueChanged.connect(self.changeTextIndex)
+        self.textPageSpin.valueChanged.connect(self.spinChanged)
         self.textPageSpin.setEnabled(False)
         self.textFrame.addWidget(self.textPageSpin,1,0)
         self.textPageName = QtWidgets.QLabel('')
@@ -107,6 +128,21 @@ class multiTextFrame(QtWidgets.QSplitter):
         self.textLocs = None
         self.textIndex = None
         self.inputWindowWidget = None
+        self.readOnly = False
+        self.jobActive = False
+        self.macro = None # The macro that is being recorded
+        self.store = None # Snapshot store of the project
+        self.joinIndex = (None, None) # (location, JoinIndex or None) of the shown joined file
+        self.documents = PageDocuments(self, self.font, self.HIGHLIGHTER, self.PLAINTEXT)
+        # Holding a spinbox arrow only loads the page where it stops
+        self.pageTimer = QtCore.QTimer(self)
+        self.pageTimer.setSingleShot(True)
+        self.pageTimer.setInterval(80)
+        self.pageTimer.timeout.connect(self.pageTimerDone)
+        self.preloadTimer = QtCore.QTimer(self)
+        self.preloadTimer.setSingleShot(True)
+        self.preloadTimer.setInterval(300)
+        self.preloadTimer.timeout.connect(self.preloadNeighbours)
 
         self.lastSearch = ''
         self.setAcceptDrops(True)
@@ -119,6 +155,8 @@ class multiTextFrame(QtWidgets.QSplitter):
             return len(self.textLocs)
 
     def removeInputWindow(self):
+        if hasattr(self.inputWindowWidget, 'stop'): # Cancels its jobs
+            self.inputWindowWidget.stop()
         self.inputWindowWidget.deleteLater()
         self.inputWindowWidget = None
 
@@ -144,6 +182,9 @@ class multiTextFrame(QtWidgets.QSplitter):
     def openSearchDPWindow(self):
         self.openInputWidget(SearchDPWindow(self))
 
+    def openMarkerWindow(self):
+        self.openInputWidget(MarkerWindow(self))
+
     def openFormatWindow(self):
         self.openInputWidget(FormatWindow(self))
 
@@ -158,43 +199,158 @@ class multiTextFrame(QtWidgets.QSplitter):
         self.setStretchFactor(1, 0) # set stretch factor to 0, at least for greek
 
     def normUni(self):
+        if self.transformPages('Unicode normalize', lambda pos, text: uni.normalize('NFC',text)) is not None:
+            self.record('normUni')
+
+    def setReadOnly(self,readOnly):
+        self.readOnly = readOnly
+        # The editor stays read-only while a job changes the files
+        self.textEditor.setReadOnly(readOnly or self.jobActive)
+
+    def runJob(self,name,func,args=(),onDone=None,modify=True,snapshot=True):
+        """
+        Runs func(progress, *args) as a background job (see jobs.py).
+
+        Input
+        -----
+        name: string, name shown in the status bar
+        func: the job function
+        args: tuple, extra arguments for func
+        onDone: function, called with the result when the job finished
+        modify: bool, if True the job changes the files. The editor is then read-only
+                while the job runs, and the page is reloaded afterwards.
+        snapshot: bool, if True (and modify is True) a snapshot of all pages is
+                  taken first, so the operation can be reverted.
+
+        Returns
+        -------
+        The job, or None if the job could not be started.
+        """
         self.saveCurrent()
-        index = self.textIndex
-        self.saveText(index)
-        if not all:
-            locations = [self.textLocs[index - 1]]
-        else:
-            locations = self.textLocs
+        self.flushPages()
+        if modify and snapshot:
+            args = (self.snapshotStore(), name, self.textLocs, func) + tuple(args)
+            func = snapshots.snapshotFirst
+        job = self.father.runJob(name, func, args, onDone, self.jobEnded if modify else None)
+        if job is not None and modify:
+            self.jobActive = True
+            self.textEditor.setReadOnly(True)
+            self.textPageSpin.setEnabled(False)
+        return job
+
+    def flushPages(self):
+        """
+        Writes the pending pages, and reports the pages that could not be saved.
+        """
+        errors = pages.flush()
+        if errors:
+            self.father.dispMsg('Saving failed: ' + '; '.join(errors), 'red')
 
+    def jobEnded(self):
+        self.jobActive = False
+        self.textEditor.setReadOnly(self.readOnly)
+        if self.textLocs is not None:
+            self.textPageSpin.setEnabled(True)
+            self.reload()
+            if hasattr(self.inputWindowWidget, 'pagesChanged'):
+                self.inputWindowWidget.pagesChanged()
 
-        for loc in locations:
-            with open(loc,'r') as f:
-                text = f.read()
-            text = uni.normalize('NFC',text)
+    def snapshotStore(self):
+        """
+        The snapshots of a project are stored next to its pages.
+        """
+        root = os.path.dirname(self.textLocs[0])
+        if self.store is None or self.store.root != root:
+            self.store = snapshots.SnapshotStore(root)
+        return self.store
 
-            with open(loc,'w') as f:
-                f.write(text)
+    def revertSnapshot(self,num=None,onDone=None):
+        """
+        Restores the pages of a snapshot (default: the last one, i.e. undoes the
+        last bulk operation). The revert gets a snapshot too, so it can be undone.
+        """
+        store = self.snapshotStore()
+        log = store.log()
+        if len(log) == 0:
+            self.father.dispMsg('Revert: no snapshots', 'red')
+            return None
+        entry = log[-1] if num is None else [x for x in log if x['id'] == num][0]
+        return self.runJob(f'Revert {entry["name"]}', snapshots.revertJob, (store, entry['id']), onDone)
+
+    def transformPages(self,name,func,all=True,onDone=None):
+        """
+        Applies func(pos, text) --> text to the pages in a background job.
+        Only pages that change are written.
 
-        self.reload()
+        Input
+        -----
+        name: string, name shown in the status bar
+        func: function, pos is the index in the list of processed pages
+        all: bool, if False, only the current page is processed
+        onDone: function, called with the number of changed pages when finished
+        """
+        if all:
+            locations = self.textLocs
+        else:
+            locations = [self.textLocs[self.textIndex - 1]]
+        return self.runJob(name, transformFiles, (locations, func), onDone)
 
-    def setReadOnly(self,readOnly):
-        self.textEditor.setReadOnly(readOnly)
+    def spinChanged(self,index):
+        if self.textLocs is not None and index != self.textIndex:
+            self.textPageName.setText(self.textNames[index - 1])
+            self.pageTimer.start()
+
+    def pageTimerDone(self):
+        if self.textLocs is not None and self.textPageSpin.value() != self.textIndex:
+            self.changeTextIndex(self.textPageSpin.value())
 
     def changeTextIndex(self,index,save=True):
-        if save:
+        if save and self.textIndex is not None:
             self.saveText(self.textIndex)
+            pages.flush(wait=False)
         self.textIndex = index
         self.reload()
 
     def reload(self):
+        """
+        Shows the document of the current page. The document is taken from the
+        cache, and updated if the page file changed.
+        """
         index = self.textIndex
-        with open(self.textLocs[index - 1],'r') as f:
-            text = f.read()
-        self.textEditor.setCurrentFont(QtGui.QFont(self.font))
-        self.textEditor.setPlainText(text)
+        doc = self.documents.get(self.textLocs[index - 1], current=True)
+        if self.textEditor.document() is not doc:
+            self.textEditor.setDocument(doc)
         self.textPageName.setText(self.textNames[index - 1])
         self.textPageSpin.setValue(index)
         self.father.editTabs.setVisible(True)
+        self.preloadTimer.start()
+        if isinstance(self.inputWindowWidget, SearchWindow):
+            self.inputWindowWidget.updateMatches()
+
+    def preloadNeighbours(self):
+        if self.textLocs is None or self.textIndex is None:
+            return
+        for index in [self.textIndex + 1, self.textIndex - 1]:
+            if 0 < index <= len(self.textLocs):
+                self.documents.get(self.textLocs[index - 1])
+
+    def gotoPosition(self,index,line,column=0,length=0):
+        """
+        Shows page 'index' (1-based) and moves the cursor to line/column (0-based).
+        If length is given, that many characters are selected.
+        """
+        if index != self.textIndex:
+            self.changeTextIndex(index)
+        block = self.textEditor.document().findBlockByNumber(line)
+        if not block.isValid():
+            return
+        pos = block.position() + min(column, max(block.length() - 1, 0))
+        cursor = self.textEditor.textCursor()
+        cursor.setPosition(pos)
+        if length > 0:
+            cursor.setPosition(min(pos + length, block.position() + block.length() - 1), QtGui.QTextCursor.KeepAnchor)
+        self.textEditor.setTextCursor(cursor)
+        self.textEditor.setFocus()
 
     def indexIncrement(self, step = 'f'):
         if step == 'f':
@@ -224,17 +380,20 @@ class multiTextFrame(QtWidgets.QSplitter):
         cursor = self.textEditor.textCursor()
         text = self.textEditor.toPlainText()
         if regex is True:
+            pattern = searchPattern(sstr, True)
+            if pattern is None:
+                self.father.dispMsg('TextEdit: invalid regular expression', 'red')
+                return
             if side == 'f': #forward search
-                tmp = text[cursor.selectionEnd():]
-                m = re.search(sstr,tmp)
-                pos = cursor.selectionEnd() + m.start()
+                m = pattern.search(text, cursor.selectionEnd())
             else:
                 #Backwards search slow, as we need to find all elements first.
                 #Is there a better solution?
-                tmp = text[:cursor.selectionStart()]
-                m = [x for x in re.finditer(sstr,tmp)][-1]
-                pos = m.start()
-            matchlen = len(m.group(0))
+                m = None
+                for m in pattern.finditer(text, 0, cursor.selectionStart()):
+                    pass
+            pos = -1 if m is None else m.start()
+            matchlen = 0 if m is None else len(m.group(0))
         else:
             if side == 'f': #forward search
                 pos = text.find(sstr,cursor.selectionEnd())
@@ -261,8 +420,8 @@ class multiTextFrame(QtWidgets.QSplitter):
                 else:
                     self.father.dispMsg('TextEdit: Reached file limits')
 
-    def replaceWords(self,start,end):
-        self.runRegexp([[rf'\b{start}\b',end]])
+    def replaceWords(self,start,end,all=False,onDone=None):
+        self.runRegexp([[rf'\b{start}\b',end]],all=all,onDone=onDone)
 
     def addMarkup(self,markup,special = None):
         # Markup: len 2 list, start and end insert
@@ -293,6 +452,7 @@ class multiTextFrame(QtWidgets.QSplitter):
     def setTextList(self,pathList,reset=True):
         if len(pathList) > 0:
             self.clearReader()
+            self.joinIndex = (None, None)
             self.textLocs = pathList
             self.textNames = [os.path.basename(x) for x in pathList]
             self.textPageSpin.setValue(1)
@@ -304,15 +464,29 @@ class multiTextFrame(QtWidgets.QSplitter):
             self.father.editTabs.setVisible(True)
 
     def saveText(self,index):
-        with open(self.textLocs[index - 1],'w') as f:
-            f.write(self.textEditor.toPlainText())
+        """
+        Schedules the page for writing, if it was edited.
+        """
+        document = self.textEditor.document()
+        if document.isModified():
+            text = self.textEditor.toPlainText()
+            pages.scheduleWrite(self.textLocs[index - 1], text)
+            self.documents.saved(self.textLocs[index - 1], text)
+            document.setModified(False)
+            if hasattr(self.inputWindowWidget, 'pageSaved'):
+                self.inputWindowWidget.pageSaved(index, text)
 
     def saveCurrent(self):
-        if self.textLocs is not None:
-            self.saveText(self.textPageSpin.value())
+        if self.textLocs is not None and self.textIndex is not None and not self.jobActive:
+            self.saveText(self.textIndex)
 
     def clearReader(self):
         self.saveCurrent()
+        self.flushPages()
+        self.pageTimer.stop()
+        self.preloadTimer.stop()
+        self.textEditor.setDocument(self.documents.newDocument(self.textEditor))
+        self.documents.clear()
         self.textLocs = None
         self.textIndex = None
         self.textPageName.setText('')
@@ -338,6 +512,7 @@ class multiTextFrame(QtWidgets.QSplitter):
             self.unicodeLabel.setText(uni.name(Select[0]))
         else:
             self.unicodeLabel.setText('')
+        self.showJoinedImage()
 
         #tc = self.textEditor.textCursor()
         #tbf = tc.blockFormat()
@@ -346,158 +521,82 @@ class multiTextFrame(QtWidgets.QSplitter):
         #self.textEditor.setTextCursor(tc)
 
 
-    def runRegexp(self,regexps,all=False):
-        self.saveCurrent()
-        index = self.textIndex
-        self.saveText(index)
-        if not all:
-            locations = [self.textLocs[index - 1]]
+    def showJoinedImage(self):
+        """
+        For a joined file (see joined.py), shows the image of the page at the cursor next to the file name.
+        The page is looked up in the offset index of the file, or, if the file was edited since it was
+        joined, found by searching back for the separator line.
+        """
+        if self.textIndex is None:
+            return
+        doc = self.textEditor.document()
+        name = self.textNames[self.textIndex - 1]
+        if not pages.SEPARATOR_RE.match(doc.firstBlock().text()):
+            if self.textPageName.text() != name:
+                self.textPageName.setText(name)
+            return
+        image = None
+        if not doc.isModified():
+            loc = self.textLocs[self.textIndex - 1]
+            if self.joinIndex[0] != loc:
+                try:
+                    self.joinIndex = (loc, joined.loadIndex(loc))
+                except joined.JoinError:
+                    self.joinIndex = (loc, None)
+            try:
+                found = self.joinIndex[1].pageAt(self.textEditor.textCursor().position(), pages.stamp(loc)) if self.joinIndex[1] is not None else None
+            except OSError:
+                found = None
+            if found is not None:
+                image = found[1]
+        if image is None:
+            block = self.textEditor.textCursor().block()
+            found = doc.find(JOINED_SEPARATOR, block.position() + block.length() - 1, QtGui.QTextDocument.FindBackward)
+            m = pages.SEPARATOR_RE.match(found.block().text()) if not found.isNull() else None
+            image = m.group(1) if m else None
+        self.textPageName.setText(f'{name} ({image})' if image else name)
+
+    def runRegexp(self,regexps,all=False,onDone=None,name='Regular expressions',record=True):
+        """
+        Applies a list of [regexp, replacement] to the pages. If rule profiling is
+        switched on in the main window, the time and matches of each rule are
+        recorded and shown when finished.
+        """
+        if not self.father.profileRulesAct.isChecked():
+            job = self.transformPages(name, lambda pos, text: rules.regexpText(text,regexps), all, onDone)
         else:
-            locations = self.textLocs
-
-        for loc in locations:
-            with open(loc,'r') as f:
-                text = f.read()
-            for elem in regexps:
-                text = re.sub(elem[0],elem[1],text)
-
-            with open(loc,'w') as f:
-                f.write(text)
-
-        self.reload()
-
-
-    def cleanOCR(self,nameslist):
+            profile = rules.RuleProfile(regexps, self.textNames if all else [self.textNames[self.textIndex - 1]])
+            def done(changed):
+                self.father.showRuleProfile(name, profile)
+                if onDone is not None:
+                    onDone(changed)
+            job = self.transformPages(name, profile.apply, all, done)
+        if record and job is not None:
+            pages = None if all else [self.textNames[self.textIndex - 1]]
+            self.record('regexp', regexps=[[x[0].pattern, x[1], x[0].flags] if hasattr(x[0],'pattern') else [x[0], x[1], 0] for x in regexps], pages=pages)
+        return job
+
+
+    def cleanOCR(self,nameslist,packs=()):
         """
         Creates and runs a series of regexp based an a list of input names.
-        The names relate for the options that can be selected from an input window in the main program.
-        Unused names are ignored.
-        """
-        RegExps = [] #Start of ther reagexp list.
-
-
-        if 'formfeed' in nameslist:
-            RegExps.append(['\f','']) #Remove form feed character
-        if 'tabtospace' in nameslist:
-            RegExps.append(['\t',' ']) #Tab to white space
-
-        if 'multiwhite' in nameslist:
-            RegExps.append([' +',' ']) #Replace multiple white spaces with one
-        if 'fixscolon' in nameslist:
-            RegExps.append([' +;',';']) #Remove white spaces before semi-colon
-        if 'fixcolon' in nameslist:
-            RegExps.append([' +:',':']) #Remove white spaces before colon
-        if 'fixexlam' in nameslist:
-            RegExps.append([' +!','!']) #Remove white spaces before exclamation mark
-        if 'fixquestion' in nameslist:
-            RegExps.append([' +\?','?']) #Remove white spaces before question mark
-        if 'fixperiod' in nameslist:
-            RegExps.append([' +\.','.']) #Remove white spaces before period
-        if 'fixcomma' in nameslist:
-            RegExps.append([' +,','.']) #Remove white spaces before comma
-
-
-        if 'underscoreconv':
-            RegExps.append(['_','-']) #Replace underscore with dash
-        if 'emdashconv' in nameslist:
-            RegExps.append(['—','--']) #Replace em-dash with --
-        if 'emspace' in nameslist:
-            RegExps.append([' *-- *','--']) #Remove white spaces around double-dash
-        if 'emdashEOL' in nameslist:
-            RegExps.append(['--\n(\S+) *','--\g<1>\n' ]) #Combine em-dash at EOL.
-        if 'emdashSOL' in nameslist:
-            RegExps.append(['(\S)\n--(\S+) *','\g<1>--\g<2>\n' ]) #Combine em-dash at SOL.
-
-        if 'curlysingle' in nameslist:
-            RegExps.append(['[’‘]',"'"]) #Convert curly single quotes to the easy one
-        if 'stodquote' in nameslist:
-            RegExps.append(["''",'"']) #Convert two single apostrophe signs to a double apostrophe
-
-        #Correct white space around quotes
-        if 'curlyquotespace' in nameslist:
-            RegExps.append([' +”','”'])
-            RegExps.append(['“ +','“']) 
-
-        if 'guillespace1' in nameslist:
-            RegExps.append([' +»','»'])
-            RegExps.append(['« +','«']) 
-        if 'guillespace2' in nameslist:
-            RegExps.append([' +«','«'])
-            RegExps.append(['» +','»']) 
-        if 'quilletoquote' in nameslist:
-            RegExps.append(['[«»]','"']) #Convert some other signs to quote marks
-
-        if 'curlydouble' in nameslist:
-            RegExps.append(['[”“]','"']) #Convert curly quotes to straight
-
-        #Dutch lower quote conversions
-        if 'lowdquote' in nameslist:
-            RegExps.append(['„','"'])
-        if 'lowsquote' in nameslist:
-            RegExps.append(['‚',"'"])
-
-
-        if 'bracesconv' in nameslist:
-            RegExps.append(['{','('])
-            RegExps.append(['}',')'])
-
-        if 'commapara' in nameslist:
-            RegExps.append([',\n\n','.\n\n'])
-        
-        if 'fixopenbrack' in nameslist:
-            RegExps.append(['\( +','(']) #Remove spaces after opening brackets
-        if 'fixclosebrack' in nameslist:
-            RegExps.append([' +\)',')']) #Remove spaces before closing brackets
-        if 'commatoquote' in nameslist:
-            RegExps.append([',,','"']) #Convert double comma to double quote
-        if 'convellip' in nameslist:
-            RegExps.append(['…',"..."]) #Convert ellipsis
-
-
-        if 'ijligature' in nameslist:
-            RegExps.append(['ĳ',"ij"]) #Convert ij ligature
-            RegExps.append(['Ĳ',"IJ"]) #Convert IJ ligature
-        if 'greekTPK' in nameslist:
-            RegExps.append(['[͵᾿᾽΄̓͂]',"'"]) # convert Tonos Psili and Koronis to single quote
-        if 'greekTheta' in nameslist:
-            RegExps.append(['ϑ',"θ"]) #Normalize theta symbol to normal theta
-            RegExps.append(['ϴ',"Θ"]) #Normalize theta symbol to normal thet
-
-
-        if 'leadingwhite' in nameslist:
-            RegExps.append([re.compile('^ +',re.MULTILINE),'']) #Leading whitespaces
-        if 'trailingwhite' in nameslist:
-            RegExps.append([re.compile(' +$',re.MULTILINE),'']) #End whitespaces
-
-        if 'multilines' in nameslist:
-            RegExps.append(['\n\n+','\n\n']) #Convert >1 empty line to 1 empty line
-        if 'startlines' in nameslist:
-            RegExps.append(['^\n+','']) #Remove starting white lines
-        if 'endlines' in nameslist:
-            RegExps.append(['\n+$','']) #Remove ending white lines
-
-        #Some guiprep things for quotes and spaces
-        #      $line =~ s/^" /"/;  # start of line doublequote	      
-        #      $line =~ s/ "$/"/;  #  end of line doublequote
-        #      $line =~s/\s"-/"-/g;
-        #      $line =~s/the\s"\s/the\s"/g;
-        #      $line =~s/([.,!]) (["'] )/$1$2/g;      # punctuation, space, quote, space
-
-        self.runRegexp(RegExps,all=True)
+        The names relate for the options that can be selected from an input window in the main program,
+        and to the names of the rules in the rule packs (list of paths) that are used.
+        Unused names are ignored. The built-in rules run before the rule packs.
+        """
+        regexps = rules.cleanOCRRegexps(nameslist) + rules.packRegexps(packs, nameslist)
+        job = self.runRegexp(regexps,all=True,name='Clean OCR',record=False)
+        if job is not None:
+            self.record('cleanOCR', names=list(nameslist), packs=list(packs))
+        return job
 
 
     def labelEmptyPage(self,label='[Blank Page]'):
         """
         Insert a label on empty pages.
         """
-        self.saveCurrent()
-        for loc in self.textLocs:
-            with open(loc,'r') as f:
-                text = f.read().splitlines()
-            if len(text) == 0:
-                with open(loc,'w') as f:
-                    f.write(label)
-        self.reload()
+        if self.transformPages('Label empty pages', lambda pos, text: labelEmptyText(text,label)) is not None:
+            self.record('labelEmptyPage', label=label)
 
 
     def transliterateGreek(self):
@@ -514,48 +613,99 @@ class multiTextFrame(QtWidgets.QSplitter):
         
 
 
-    def getCharCount(self,all=True):
-        self.saveCurrent()
+    def getLocations(self,all=True):
         if not all:
-            locations = [self.textLocs[self.textIndex - 1]]
-        else:
-            locations = self.textLocs
-        text = ''
-        for loc in locations:
-            with open(loc,'r') as f:
-                text = text + f.read()
-        outDict = col.Counter(text)
-        return outDict
-
-    def getWordList(self,all=True):
+            return [self.textLocs[self.textIndex - 1]]
+        return self.textLocs
+
+    def getCharCount(self,all=True,onDone=None):
+        """
+        Counts the characters of the pages. If onDone is given, this is done in
+        a background job, and onDone is called with the result.
+        """
         self.saveCurrent()
-        if not all:
-            locations = [self.textLocs[self.textIndex - 1]]
-        else:
-            locations = self.textLocs
-        text = ''
-        for loc in locations:
-            with open(loc,'r') as f:
-                text = text + f.read()
-        outDict = getWordCount(text)
-        return outDict
+        locations = self.getLocations(all)
+        if onDone is None:
+            return countChars(noProgress, locations)
+        return self.runJob('Character count', countChars, (locations,), onDone, modify=False)
 
-    def getLines(self,pos):
+    def getWordList(self,all=True,onDone=None):
         """
-        Returns a list with all lines of index 'pos' for all opened files.
+        Counts the words of the pages. If onDone is given, this is done in
+        a background job, and onDone is called with the result.
+        """
+        self.saveCurrent()
+        locations = self.getLocations(all)
+        if onDone is None:
+            return countWords(noProgress, locations)
+        return self.runJob('Word count', countWords, (locations,), onDone, modify=False)
 
-        TODO: add check that index is ok.
+    def readPages(self):
+        """
+        Yields the text of all pages.
         """
-        lines = []
         for loc in self.textLocs:
-            with open(loc,'r') as f:
-                text = f.read().splitlines()
-                if len(text) > 0:
-                    lines.append(text[pos])
-                else:
-                    lines.append(None)
+            yield pages.readPage(loc)
+
+    def goodWordsFile(self):
+        """
+        The good words list of a project is stored with its snapshots, so it is
+        not taken for a page when the folder is opened.
+        """
+        return os.path.join(self.snapshotStore().folder, spellcheck.GOOD_WORDS_FILE)
+
+    def pageLabelsFile(self):
+        """
+        The printed page numbers of the images are stored with the snapshots.
+        """
+        return os.path.join(self.snapshotStore().folder, heads.LABELS_FILE)
+
+    def getPageLabels(self):
+        """
+        Fits the printed page numbers from the headers and footers.
+        See heads.pageLabels.
+        """
+        names = [pages.imageName(loc) for loc in self.textLocs]
+        return heads.pageLabels(self.getHeaders(), self.getFooters(), names)
+
+    def savePageLabels(self,labels):
+        """
+        Saves the map image name --> printed page number.
+        """
+        os.makedirs(self.snapshotStore().folder, exist_ok=True)
+        heads.saveLabels(self.pageLabelsFile(), labels)
+
+    def getSpellcheck(self,onDone=None):
+        """
+        Checks all words against the loaded dictionaries and the good words list.
+        If onDone is given, this is done in a background job, and onDone is
+        called with the result.
+
+        Returns
+        -------
+        words: Counter of all words
+        suspects: dict, suspect word --> list of page indices (1-based)
+        """
+        self.saveCurrent()
+        goodWords = spellcheck.loadGoodWords(self.goodWordsFile())
+        if onDone is None:
+            return spellcheck.spellcheck(self.readPages(), self.father.dictionaries, goodWords)
+        return self.runJob('Spellcheck', spellcheckFiles, (self.textLocs, self.father.dictionaries, goodWords),
+                           onDone, modify=False)
+
+    def addGoodWords(self,words):
+        path = self.goodWordsFile()
+        goodWords = spellcheck.loadGoodWords(path)
+        goodWords.update(words)
+        spellcheck.saveGoodWords(path,goodWords)
 
-        return lines
+    def getLines(self,pos):
+        """
+        Returns a list with the first (pos 0) or last (pos -1) line of all
+        opened files, or None for an empty file. Only the start and end of
+        the files are read (see pages.edgeLines).
+        """
+        return [pages.edgeLines(loc)[0 if pos == 0 else 1] for loc in self.textLocs]
 
     def getHeaders(self):
         return self.getLines(0)
@@ -572,18 +722,10 @@ class multiTextFrame(QtWidgets.QSplitter):
         checkList: List with booleans, True if first line needs to be removed
         cleanStart: Boolean. If True, remove possible empty line after header.
         """
-        self.saveCurrent()
-        for pos, loc in enumerate(self.textLocs):
-            if checkList[pos]:
-                with open(loc,'r') as f:
-                    text = f.read().splitlines()
-                
-                with open(loc,'w') as f:
-                    if cleanStart and len(text) > 1 and text[1] == '':
-                        f.writelines('\n'.join(text[2:]))
-                    else:
-                        f.writelines('\n'.join(text[1:]))
-        self.reload()
+        job = self.transformPages('Remove headers',
+                                  lambda pos, text: delHeaderText(text,cleanStart) if checkList[pos] else text)
+        if job is not None:
+            self.record('delHeaders', pages=[x[1] for x in zip(checkList,self.textNames) if x[0]], cleanStart=cleanStart)
 
     def delFooters(self,checkList,cleanStart=True):
         """
@@ -593,69 +735,78 @@ class multiTextFrame(QtWidgets.QSplitter):
         checkList: List with booleans, True if first line needs to be removed
         cleanStart: Boolean. If True, remove possible empty line after header.
         """
-        self.saveCurrent()
-        for pos, loc in enumerate(self.textLocs):
-            if checkList[pos]:
-                with open(loc,'r') as f:
-                    text = f.read().splitlines()
-                
-                with open(loc,'w') as f:
-                    if cleanStart and len(text) > 1 and text[-2] == '':
-                        f.writelines('\n'.join(text[:-2]))
-                    else:
-                        f.writelines('\n'.join(text[:-1]))
-        self.reload()
+        job = self.transformPages('Remove footers',
+                                  lambda pos, text: delFooterText(text,cleanStart) if checkList[pos] else text)
+        if job is not None:
+            self.record('delFooters', pages=[x[1] for x in zip(checkList,self.textNames) if x[0]], cleanStart=cleanStart)
 
 
-    def delEOLHypenWords(self,useDict=False,useText=True,otherwise=0):
-        self.saveCurrent()
-        if not all:
-            locations = [self.textLocs[self.textIndex - 1]]
-        else:
-            locations = self.textLocs
-        if useText:
-            wordDict = self.getWordList() #Get all words in the text
+    def delEOLHypenWords(self,useDict=False,useText=True,otherwise=0,crossPage=False):
+        job = self.runJob('Correct EOL hyphens', hyphenFiles,
+                          (self.textLocs, self.father.dictionaries, useDict, useText, otherwise, crossPage))
+        if job is not None:
+            self.record('delEOLHypenWords', useDict=useDict, useText=useText, otherwise=otherwise)
+            if crossPage:
+                self.record('crossPageHyphens', useDict=useDict, useText=useText, otherwise=otherwise)
 
-        for loc in locations:
-            with open(loc,'r') as f:
-                text = f.read()
-            
-            #Get all EOL hyphen words. Select also all non-whitespace characters
-            #after, as well as a series of white spaces (excluding line endings).
-            #After hyphen and EOL, at least 1 word character must be there.
-            hyphenWords = re.findall('\w+-\n\w\S+[\s^\r\n]*', text)
-            for w in hyphenWords:
-                # Get the word
-                usew = re.match('\w+-\n\w+',w).group(0)
-                #Make the two options
-                whyphen = usew.replace('\n','')
-                wohyphen = usew.replace('-\n','')
-
-                whFull = w.replace('\n','').rstrip()
-                wohFull = w.replace('-\n','').rstrip()
-                if useText:
-                    wcount = wordDict[whyphen]
-                    wocount = wordDict[wohyphen]
-                    if wocount > wcount:
-                        text = text.replace(w,wohFull+'\n',1)
-                        continue
-                    elif wcount > wocount:
-                        text = text.replace(w,wohFull+'\n',1)
-                        continue
-
-                if useDict:
-                    #Needs to be implemented
-                    pass
+    def record(self,op,**params):
+        """
+        Adds an operation to the macro that is being recorded (if any).
+        Only operations that were started are recorded.
+        """
+        if self.macro is not None:
+            self.macro.record(op, **params)
 
-                if otherwise == 1: #Keep hyphens
-                    text = text.replace(w,whFull+'\n',1)
-                elif otherwise == 2:
-                    text = text.replace(w,wohFull+'\n',1)
+    def startRecording(self):
+        self.macro = macros.Macro()
 
-            with open(loc,'w') as f:
-                f.write(text)
+    def stopRecording(self):
+        macro = self.macro
+        self.macro = None
+        return macro
 
-        self.reload()
+    def macroStepFunc(self,step):
+        """
+        Returns the function func(pos, text, wordDict) --> text of a macro step.
+        """
+        op = step['op']
+        names = self.textNames
+        if op == 'cleanOCR':
+            regexps = rules.cleanOCRRegexps(step['names']) + rules.packRegexps(step.get('packs', []), step['names'])
+            return lambda pos, text, wordDict: rules.regexpText(text,regexps)
+        elif op == 'regexp':
+            regexps = [[re.compile(x[0],x[2]),x[1]] for x in step['regexps']]
+            pages = None if step['pages'] is None else set(step['pages'])
+            return lambda pos, text, wordDict: rules.regexpText(text,regexps) if pages is None or names[pos] in pages else text
+        elif op == 'delHeaders' or op == 'delFooters':
+            pages = set(step['pages'])
+            func = delHeaderText if op == 'delHeaders' else delFooterText
+            return lambda pos, text, wordDict: func(text,step['cleanStart']) if names[pos] in pages else text
+        elif op == 'labelEmptyPage':
+            return lambda pos, text, wordDict: labelEmptyText(text,step['label'])
+        elif op == 'normUni':
+            return lambda pos, text, wordDict: uni.normalize('NFC',text)
+        elif op == 'delEOLHypenWords':
+            dictionaries = self.father.dictionaries
+            return lambda pos, text, wordDict: hyphenText(text, wordDict, dictionaries, step['useDict'],
+                                                          step['useText'], step['otherwise'])
+        elif op == 'crossPageHyphens':
+            dictionaries = self.father.dictionaries
+            return PagesStep(lambda progress, locations, wordDict: crossPageHyphens(progress, locations, wordDict, dictionaries,
+                                                                                    step['useDict'], step['useText'], step['otherwise']))
+
+    def runMacro(self,macro):
+        """
+        Replays a macro. The steps are fused: each page is read once, transformed
+        by the whole chain, and written once. Steps that need the neighbouring
+        pages (PagesStep) split the chain.
+        """
+        funcs = [self.macroStepFunc(step) for step in macro.steps]
+        needWords = any(step['op'] in ('delEOLHypenWords', 'crossPageHyphens') and step['useText'] for step in macro.steps)
+        job = self.runJob('Macro', macroFiles, (self.textLocs, funcs, needWords))
+        if job is not None and self.macro is not None:
+            self.macro.steps += macro.steps
+        return job
 
     def insertStr(self,string,select=False):
         self.textEditor.insertPlainText(string)
@@ -667,6 +818,91 @@ class multiTextFrame(QtWidgets.QSplitter):
 
         
 
+class PageDocuments:
+    """
+    LRU cache of the QTextDocument of the pages. A page that is shown again
+    keeps its layout and its own undo history. The documents hold at most
+    BUDGET characters in total (the page that is shown is always kept).
+    """
+
+    BUDGET = 2000000
+
+    def __init__(self, parent, font, highlighterClass=None, plainText=False):
+        self.parent = parent
+        self.font = font
+        self.highlighterClass = highlighterClass
+        self.plainText = plainText
+        self.docs = col.OrderedDict() # location --> [document, text of the file when last synced, highlighter]
+        self.size = 0
+        self.current = None
+
+    def get(self, loc, current=False):
+        """
+        Returns the document of a page. If the page file was changed by a bulk
+        operation, the document is updated as a single undoable edit.
+        """
+        text = pages.readPage(loc)
+        if loc in self.docs:
+            self.docs.move_to_end(loc)
+            entry = self.docs[loc]
+            if entry[1] is not text and entry[1] != text and not entry[0].isModified():
+                cursor = QtGui.QTextCursor(entry[0])
+                cursor.beginEditBlock()
+                cursor.select(QtGui.QTextCursor.Document)
+                cursor.insertText(text)
+                cursor.endEditBlock()
+                entry[0].setModified(False)
+                self.size += len(text) - len(entry[1])
+                entry[1] = text
+        else:
+            doc = self.newDocument(self.parent)
+            doc.setPlainText(text)
+            doc.setModified(False)
+            highlight = None
+            if self.highlighterClass is not None:
+                # Highlight before the document is shown: formatting a shown document relayouts it for each block
+                highlight = self.highlighterClass(doc)
+                highlight.rehighlight()
+            self.docs[loc] = [doc, text, highlight]
+            self.size += len(text)
+        if current:
+            self.current = loc
+        self._trim()
+        return self.docs[loc][0]
+
+    def newDocument(self, parent):
+        doc = QtGui.QTextDocument(parent)
+        if self.plainText: # Needed by QPlainTextEdit
+            doc.setDocumentLayout(QtWidgets.QPlainTextDocumentLayout(doc))
+        doc.setDefaultFont(QtGui.QFont(self.font))
+        doc.setDefaultCursorMoveStyle(QtCore.Qt.VisualMoveStyle)
+        return doc
+
+    def saved(self, loc, text):
+        if loc in self.docs:
+            self.size += len(text) - len(self.docs[loc][1])
+            self.docs[loc][1] = text
+
+    def _trim(self):
+        for loc in list(self.docs):
+            if self.size <= self.BUDGET or len(self.docs) <= 1:
+                break
+            if loc == self.current:
+                continue
+            doc, text, highlight = self.docs.pop(loc)
+            if doc.isModified():
+                pages.scheduleWrite(loc, doc.toPlainText())
+            self.size -= len(text)
+            doc.deleteLater()
+
+    def clear(self):
+        for doc, text, highlight in self.docs.values():
+            doc.deleteLater()
+        self.docs.clear()
+        self.size = 0
+        self.current = None
+
+
 class QtTextEdit(QtWidgets.QTextEdit):
     
     leave = QtCore.pyqtSignal()
@@ -675,6 +911,7 @@ class QtTextEdit(QtWidgets.QTextEdit):
         QtWidgets.QTextEdit.__init__(self)
         self.father = father
         self.setLineWrapMode(QtWidgets.QTextEdit.NoWrap)
+        self.setAcceptRichText(False)
         self.setAcceptDrops(True)
         font = QtGui.QFont()
         font.setPointSize(11)
@@ -716,9 +953,43 @@ class QtTextEdit(QtWidgets.QTextEdit):
         self.leave.emit()
 
 
+class QtPlainTextEdit(QtWidgets.QPlainTextEdit):
+    """
+    Plain text version of QtTextEdit, for large files.
+    Only the visible blocks are laid out.
+    """
+
+    leave = QtCore.pyqtSignal()
+
+    def __init__(self,father):
+        QtWidgets.QPlainTextEdit.__init__(self)
+        self.father = father
+        self.setLineWrapMode(QtWidgets.QPlainTextEdit.NoWrap)
+        self.setAcceptDrops(True)
+        font = QtGui.QFont()
+        font.setPointSize(11)
+        self.setFont(font)
+
+    def dropEvent(self, event):
+        self.father.dropEvent(event)
+
+    def dragMoveEvent(self, event):
+        pass
+
+    def dragEnterEvent(self, event):
+        self.father.dragEnterEvent(event)
+
+    def leaveEvent(self, QEvent):
+        self.leave.emit()
+
+
 
 
 class SearchWindow(QtWidgets.QWidget):
+
+    MAXHIGHLIGHT = 2000 # Highlighting stops after this many matches on a page
+    SCANLIMIT = 20000 # Maximum number of hits listed by 'Find all'
+
     def __init__(self,parent,lastSearch):
         QtWidgets.QWidget.__init__(self)
         self.father = parent
@@ -744,7 +1015,42 @@ class SearchWindow(QtWidgets.QWidget):
         self.frame.addWidget(self.regex, 0, 3)
         self.loopPages = QtWidgets.QCheckBox('Loop pages')
         self.frame.addWidget(self.loopPages, 1, 0)
-
+        self.countLabel = QtWidgets.QLabel('')
+        self.frame.addWidget(self.countLabel, 1, 1, 1, 3)
+        self.replaceInput = QtWidgets.QLineEdit()
+        self.replaceInput.setPlaceholderText('Replace with')
+        self.frame.addWidget(self.replaceInput, 2, 0)
+        self.findAllButton = QtWidgets.QPushButton('Find all')
+        self.findAllButton.clicked.connect(self.findAll)
+        self.frame.addWidget(self.findAllButton, 2, 1)
+        self.replaceButton = QtWidgets.QPushButton('Replace checked')
+        self.replaceButton.clicked.connect(self.replaceChecked)
+        self.replaceButton.setEnabled(False)
+        self.frame.addWidget(self.replaceButton, 2, 2)
+        self.results = QtWidgets.QTableWidget(0, 4)
+        self.results.setHorizontalHeaderLabels(['Page','Line','Before','After'])
+        self.results.verticalHeader().hide()
+        self.results.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectRows)
+        self.results.cellDoubleClicked.connect(self.gotoResult)
+        self.results.hide()
+        self.frame.addWidget(self.results, 3, 0, 1, 4)
+        self.hits = [] # see scanMatches
+        self.scanResults = []
+        self.scanJob = None
+
+        self.doc = None # The document with the highlighted matches
+        self.selections = []
+        self.otherCount = None # (matches, pages) on the other pages, from the count job
+        self.countJob = None
+        self.pool = QtCore.QThreadPool(self)
+        self.pool.setMaxThreadCount(1)
+        self.timer = QtCore.QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(150)
+        self.timer.timeout.connect(self.updateMatches)
+        self.input.textChanged.connect(self.timer.start)
+        self.regex.stateChanged.connect(self.timer.start)
+        self.timer.start()
 
     def search(self,side):
         text = self.input.text()
@@ -753,6 +1059,210 @@ class SearchWindow(QtWidgets.QWidget):
         if len(text) > 0:
             self.father.search(text,side,regex,loop)
 
+    def pattern(self):
+        if len(self.input.text()) == 0:
+            return None
+        return searchPattern(self.input.text(), bool(self.regex.checkState()))
+
+    def watch(self, doc):
+        if self.doc is doc:
+            return
+        if self.doc is not None:
+            try:
+                self.doc.contentsChange.disconnect(self.contentsChange)
+            except (TypeError, RuntimeError):
+                pass
+        self.doc = doc
+        if doc is not None:
+            doc.contentsChange.connect(self.contentsChange)
+
+    def updateMatches(self):
+        """
+        Highlights all matches on the page, and starts counting the matches on
+        the other pages in the background.
+        """
+        if self.countJob is not None:
+            self.countJob.cancelRequested = True
+            self.countJob = None
+        self.selections = []
+        self.otherCount = None
+        pattern = self.pattern()
+        editor = self.father.textEditor
+        if pattern is None or self.father.textLocs is None:
+            self.watch(None)
+            editor.setExtraSelections([])
+            self.countLabel.setText('Invalid regular expression' if len(self.input.text()) else '')
+            return
+        self.watch(editor.document())
+        self.addMatches(pattern, self.doc.toPlainText(), 0)
+        editor.setExtraSelections(self.selections)
+        current = self.father.textLocs[self.father.textIndex - 1]
+        locations = [x for x in self.father.textLocs if x != current]
+        self.countJob = jobs.Job('Search count', countMatches, (pattern, locations))
+        job = self.countJob
+        self.countJob.signals.finished.connect(lambda result: self.setOtherCount(job, result))
+        self.pool.start(self.countJob)
+        self.showCount()
+
+    def addMatches(self, pattern, text, offset):
+        """
+        Adds the matches in text (which starts at position offset in the document).
+        Only the first MAXHIGHLIGHT matches are highlighted.
+        """
+        fmt = QtGui.QTextCharFormat()
+        fmt.setBackground(QtGui.QColor('#ffd24d'))
+        astral = highlighter.astralPositions(text) # Document positions are UTF-16 offsets
+        for m in pattern.finditer(text):
+            if m.end() == m.start():
+                continue
+            if len(self.selections) >= self.MAXHIGHLIGHT:
+                break
+            sel = QtWidgets.QTextEdit.ExtraSelection()
+            sel.cursor = QtGui.QTextCursor(self.doc)
+            sel.cursor.setPosition(offset + highlighter.utf16Offset(m.start(), astral))
+            sel.cursor.setPosition(offset + highlighter.utf16Offset(m.end(), astral), QtGui.QTextCursor.KeepAnchor)
+            sel.format = fmt
+            self.selections.append(sel)
+
+    def contentsChange(self, position, removed, added):
+        """
+        Searches only the changed blocks again. The cursors of the other
+        matches move along with the edit.
+        """
+        pattern = self.pattern()
+        if pattern is None:
+            return
+        first = self.doc.findBlock(position)
+        last = self.doc.findBlock(position + added)
+        if not last.isValid():
+            last = self.doc.lastBlock()
+        start = first.position()
+        end = last.position() + last.length()
+        self.selections = [x for x in self.selections if x.cursor.hasSelection()
+                           and (x.cursor.selectionEnd() <= start or x.cursor.selectionStart() >= end)]
+        texts = []
+        block = first
+        while block.isValid():
+            texts.append(block.text())
+            if block == last:
+                break
+            block = block.next()
+        self.addMatches(pattern, '\n'.join(texts), start)
+        self.father.textEditor.setExtraSelections(self.selections)
+        self.showCount()
+
+    def setOtherCount(self, job, result):
+        if job is self.countJob:
+            self.otherCount = result
+            self.countJob = None
+            self.showCount()
+
+    def showCount(self):
+        page = len(self.selections)
+        pageText = f'{page}+' if page >= self.MAXHIGHLIGHT else str(page)
+        if self.otherCount is None:
+            self.countLabel.setText(f'{pageText} on this page, counting...')
+            return
+        matches, pages = self.otherCount
+        if page:
+            pages += 1
+        plus = '+' if page >= self.MAXHIGHLIGHT else ''
+        self.countLabel.setText(f'{pageText} on this page, {matches + page}{plus} matches on {pages} pages')
+
+    def findAll(self):
+        """
+        Lists all matches of all pages with their replacement. The pages are
+        scanned in a background job, and hits are added to the list while it runs.
+        """
+        pattern = self.pattern()
+        if pattern is None or self.father.father.jobRunner.busy():
+            return
+        repl = self.replaceInput.text()
+        if not self.regex.checkState():
+            repl = repl.replace('\\', '\\\\')
+        try:
+            pattern.sub(repl, '') # Checks the group references
+        except re.error as e:
+            self.father.father.dispMsg(f'Replace: {e}', 'red')
+            return
+        self.hits = []
+        self.scanResults = []
+        self.results.setRowCount(0)
+        self.results.show()
+        self.replaceButton.setEnabled(False)
+        self.scanJob = self.father.runJob('Find all', scanMatches, (pattern, repl, self.father.textLocs, self.scanResults, self.SCANLIMIT),
+                                          self.scanDone, modify=False)
+        if self.scanJob is not None:
+            self.scanJob.signals.progress.connect(self.pullResults)
+
+    def pullResults(self, *args):
+        """
+        Adds the hits that the scan job found since the last call to the list.
+        """
+        new = self.scanResults[len(self.hits):]
+        if not new:
+            return
+        row = self.results.rowCount()
+        self.results.setRowCount(row + len(new))
+        for hit in new:
+            page, line, col, start, end, matched, replacement, before, after = hit
+            self.hits.append(hit)
+            items = [self.father.textNames[page], str(line + 1), before, after]
+            for num, val in enumerate(items):
+                item = QtWidgets.QTableWidgetItem(val)
+                if num == 0:
+                    item.setFlags(QtCore.Qt.ItemIsEnabled | QtCore.Qt.ItemIsSelectable | QtCore.Qt.ItemIsUserCheckable)
+                    item.setCheckState(QtCore.Qt.Checked)
+                else:
+                    item.setFlags(QtCore.Qt.ItemIsEnabled | QtCore.Qt.ItemIsSelectable)
+                self.results.setItem(row, num, item)
+            row += 1
+
+    def scanDone(self, count):
+        self.pullResults()
+        self.scanJob = None
+        self.results.resizeColumnsToContents()
+        self.replaceButton.setEnabled(len(self.hits) > 0)
+        more = f' (only the first {self.SCANLIMIT} are listed)' if count > len(self.hits) else ''
+        self.father.father.dispMsg(f'Find all: {count} matches{more}')
+
+    def gotoResult(self, row, column):
+        page, line, col, start, end = self.hits[row][:5]
+        self.father.gotoPosition(page + 1, line, col, end - start)
+
+    def replaceChecked(self):
+        """
+        Applies the checked replacements, with a single write per page.
+        """
+        edits = dict() # page index --> list of (start, end, matched text, replacement)
+        for row, hit in enumerate(self.hits):
+            if self.results.item(row, 0).checkState() == QtCore.Qt.Checked:
+                edits.setdefault(hit[0], []).append(hit[3:7])
+        if not edits:
+            return
+        pagesList = sorted(edits)
+        locations = [self.father.textLocs[x] for x in pagesList]
+        perPage = [edits[x] for x in pagesList]
+        job = self.father.runJob('Replace', transformFiles, (locations, lambda pos, text: applyEdits(text, perPage[pos])),
+                                 self.replaceDone)
+        if job is not None:
+            self.replaceButton.setEnabled(False)
+
+    def replaceDone(self, changed):
+        self.father.father.dispMsg(f'Replace: {changed} pages changed')
+        self.results.setRowCount(0)
+        self.hits = []
+
+    def stop(self):
+        if self.scanJob is not None:
+            self.father.father.jobRunner.cancel(self.scanJob)
+        if self.countJob is not None:
+            self.countJob.cancelRequested = True
+            self.countJob = None
+        self.timer.stop()
+        self.watch(None)
+        self.father.textEditor.setExtraSelections([])
+
 
 class SearchDPWindow(QtWidgets.QWidget):
     def __init__(self,parent):
@@ -786,6 +1296,130 @@ class SearchDPWindow(QtWidgets.QWidget):
     def search(self,text,side):
         self.father.search(text,side,False,loop=True)
 
+class MarkerWindow(QtWidgets.QWidget):
+    """
+    Index of the DP markers of all pages (see markers.py), with the number
+    of each kind and a list to jump to them. The index is made in a
+    background job; a saved page is indexed again at once, and the pages
+    that were changed otherwise are scanned after each bulk operation, or
+    by Refresh.
+    """
+
+    RETRY = 500 # ms between tries to start the scan while another job runs
+
+    def __init__(self,parent):
+        QtWidgets.QWidget.__init__(self)
+        self.father = parent
+        self.job = None
+        self.saved = dict() # Position --> text of the pages saved while the scan runs
+        self.retryTimer = QtCore.QTimer(self)
+        self.retryTimer.setSingleShot(True)
+        self.retryTimer.setInterval(self.RETRY)
+        self.retryTimer.timeout.connect(self.refresh)
+        self.index = markers.MarkerIndex(parent.textLocs)
+        self.shown = []
+        layout = QtWidgets.QGridLayout(self)
+        layout.setColumnStretch(1,1)
+        layout.addWidget(QtWidgets.QLabel('<b>DP markers</b>'), 0, 0)
+        self.kindDrop = QtWidgets.QComboBox()
+        self.kinds = [None] + list(markers.KINDS) + [markers.UNBALANCED]
+        self.kindDrop.addItems(['All'] + [x[0] for x in markers.KINDS.values()] + ['Unbalanced blocks'])
+        self.kindDrop.currentIndexChanged.connect(self.fillTable)
+        layout.addWidget(self.kindDrop, 0, 1)
+        self.refreshButton = QtWidgets.QPushButton('Refresh')
+        self.refreshButton.clicked.connect(self.refresh)
+        layout.addWidget(self.refreshButton, 0, 2)
+        self.closeButton = QtWidgets.QPushButton('Close')
+        self.closeButton.clicked.connect(self.father.removeInputWindow)
+        layout.addWidget(self.closeButton, 0, 3)
+        self.countLabel = QtWidgets.QLabel('')
+        self.countLabel.setWordWrap(True)
+        layout.addWidget(self.countLabel, 1, 0, 1, 4)
+        self.table = QtWidgets.QTableWidget(0, 3)
+        self.table.setHorizontalHeaderLabels(['Page','Line','Text'])
+        self.table.verticalHeader().hide()
+        self.table.horizontalHeader().setStretchLastSection(True)
+        self.table.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectRows)
+        self.table.cellClicked.connect(self.gotoMarker)
+        layout.addWidget(self.table, 2, 0, 1, 4)
+        self.refresh()
+
+    def refresh(self):
+        if self.father.textLocs is None:
+            return
+        runner = self.father.father.jobRunner
+        if self.job is not None:
+            if runner.job is self.job:
+                return
+            self.setPages([]) # The scan was cancelled or failed
+        if runner.busy():
+            self.countLabel.setText('Waiting for the running operation...')
+            self.retryTimer.start()
+            return
+        self.father.saveCurrent()
+        positions = self.index.stale()
+        if not positions:
+            self.fillTable()
+            return
+        self.countLabel.setText('Indexing...')
+        self.job = self.father.runJob('Index DP markers', markers.scanPages,
+                                      (self.father.textLocs, positions), self.setPages, modify=False)
+        if self.job is None:
+            self.retryTimer.start()
+
+    def pagesChanged(self):
+        """
+        Called by the editor after a job that changed the pages. The scan
+        starts later, as the job may still start a follow-up job when done.
+        """
+        self.retryTimer.start()
+
+    def stop(self):
+        self.retryTimer.stop()
+        if self.job is not None:
+            self.father.father.jobRunner.cancel(self.job)
+            self.job = None
+
+    def setPages(self,results):
+        """
+        Stores the scanned pages. The pages saved during the scan are
+        indexed again, as the scan may have read their old text.
+        """
+        self.job = None
+        for pos, stamp, found, problems in results:
+            self.index.setPage(pos, found, problems, stamp)
+        for pos, text in self.saved.items():
+            self.index.updatePage(pos, text)
+        self.saved = dict()
+        self.fillTable()
+
+    def pageSaved(self,index,text):
+        if self.job is None:
+            self.index.updatePage(index - 1, text)
+            self.fillTable()
+        else:
+            self.saved[index - 1] = text
+
+    def fillTable(self):
+        counts = self.index.counts
+        self.countLabel.setText(', '.join(f'{name}: {counts[kind]}' for kind, (name, pattern) in markers.KINDS.items()) +
+                                f'; unbalanced blocks: {counts[markers.UNBALANCED]}')
+        kind = self.kinds[self.kindDrop.currentIndex()]
+        self.shown = list(self.index.entries(kind))
+        names = self.father.textNames
+        self.table.setRowCount(len(self.shown))
+        for row, (pos, line, column, markerKind, text) in enumerate(self.shown):
+            for num, val in enumerate([names[pos], str(line + 1), text]):
+                item = QtWidgets.QTableWidgetItem(val)
+                item.setFlags(QtCore.Qt.ItemIsEnabled | QtCore.Qt.ItemIsSelectable)
+                self.table.setItem(row, num, item)
+        self.table.resizeColumnToContents(0)
+        self.table.resizeColumnToContents(1)
+
+    def gotoMarker(self,row,column):
+        pos, line, col, kind, text = self.shown[row]
+        self.father.gotoPosition(pos + 1, line, col)
+
 class FormatWindow(QtWidgets.QWidget):
     def __init__(self,parent):
         QtWidgets.QWidget.__init__(self)
@@ -1288,23 +1922,313 @@ class UnicodeInputWindow(QtWidgets.QWidget):
         self.father.insertStr(char)
 
 def getWordCount(text):
-    text = re.sub('-----File: .+\.\w+-+',' ',text) #remove file headers
-    text = re.sub('--+',' ',text) # remove long dashes
-    text = re.sub('\*\*+',' ',text) # remove multiple stars
-    text = re.sub('</?[ibf]>','',text) # remove i/b/f tags
-    text = re.sub('</?sc>','',text) # remove <sc> tags
-    text = re.sub('<tb>','',text) # remove <tb> tags
-    # remove non-alphanumerical chars
-    text = re.sub("[^\w,.'’\\-*]",' ',text)
-    text = re.sub('[_]',' ',text) #Remove underscore that is in \w
-    words = text.split() #split based on white chars
-    # strip punctuation etc from left and right
-    words = [w.strip('\'\.,') for w in words]
-    # strip some chars from the left only
-    words = [w.lstrip('-*') for w in words]
-
-    # remove empty string
-    words = [w for w in words if len(w) != 0]
-        
-    outDict = col.Counter(words)
+    outDict = col.Counter(spellcheck.tokenize(text))
     return outDict
+
+def noProgress(done, total):
+    pass
+
+@functools.lru_cache(maxsize=32)
+def searchPattern(sstr, regex):
+    """
+    Returns the compiled search pattern, or None for an invalid regular expression.
+    Patterns are cached, so typing in the search field compiles each pattern once.
+    """
+    try:
+        return re.compile(sstr if regex else re.escape(sstr))
+    except re.error:
+        return None
+
+def scanMatches(progress, pattern, repl, locations, out, limit):
+    """
+    Job function: finds all matches on the pages, and appends them to out
+    while scanning (at most limit), so the caller can show them early.
+    Each hit is (page index, line, column, start, end, matched text,
+    replacement, line before, line after).
+
+    Returns
+    -------
+    int: the total number of matches
+    """
+    total = 0
+    for pos, loc in enumerate(locations):
+        progress(pos, len(locations))
+        text = pages.readPage(loc)
+        line = 0
+        lineStart = 0
+        for m in pattern.finditer(text):
+            if m.end() == m.start():
+                continue
+            total += 1
+            if len(out) >= limit:
+                continue
+            line += text.count('\n', lineStart, m.start())
+            lineStart = text.rfind('\n', 0, m.start()) + 1
+            lineEnd = text.find('\n', m.end())
+            if lineEnd == -1:
+                lineEnd = len(text)
+            replacement = m.expand(repl)
+            before = text[lineStart:lineEnd]
+            after = text[lineStart:m.start()] + replacement + text[m.end():lineEnd]
+            out.append((pos, line, m.start() - lineStart, m.start(), m.end(), m.group(), replacement, before, after))
+    progress(len(locations), len(locations))
+    return total
+
+def applyEdits(text, edits):
+    """
+    Applies a list of (start, end, matched text, replacement) to text.
+    Edits whose matched text is no longer at its place are skipped.
+    """
+    parts = []
+    pos = 0
+    for start, end, matched, replacement in sorted(edits):
+        if start < pos or text[start:end] != matched:
+            continue
+        parts.append(text[pos:start])
+        parts.append(replacement)
+        pos = end
+    parts.append(text[pos:])
+    return ''.join(parts)
+
+def countMatches(progress, pattern, locations):
+    """
+    Job function: counts the matches of pattern on the (cached) pages.
+
+    Returns
+    -------
+    (number of matches, number of pages with matches)
+    """
+    matches = 0
+    hits = 0
+    for pos, loc in enumerate(locations):
+        if pos % 50 == 0:
+            progress(pos, len(locations))
+        count = 0
+        for m in pattern.finditer(pages.readPage(loc)):
+            if m.end() > m.start():
+                count += 1
+        matches += count
+        if count:
+            hits += 1
+    return matches, hits
+
+def readFile(loc):
+    return pages.readPage(loc)
+
+def transformFiles(progress, locations, func):
+    """
+    Job function: applies func(pos, text) --> text to each file.
+    Only files that change are written.
+
+    Returns
+    -------
+    int: the number of changed files
+    """
+    changed = 0
+    for pos, loc in enumerate(locations):
+        progress(pos, len(locations))
+        text = readFile(loc)
+        new = func(pos, text)
+        if new != text:
+            pages.writePage(loc, new)
+            changed += 1
+    progress(len(locations), len(locations))
+    return changed
+
+def countChars(progress, locations):
+    outDict = col.Counter()
+    for pos, loc in enumerate(locations):
+        progress(pos, len(locations))
+        outDict.update(readFile(loc))
+    return outDict
+
+def countWords(progress, locations):
+    outDict = col.Counter()
+    for pos, loc in enumerate(locations):
+        progress(pos, len(locations))
+        outDict.update(getWordCount(readFile(loc)))
+    return outDict
+
+def spellcheckFiles(progress, locations, dictionaries, goodWords):
+    def texts():
+        for pos, loc in enumerate(locations):
+            progress(pos, len(locations))
+            yield readFile(loc)
+    return spellcheck.spellcheck(texts(), dictionaries, goodWords)
+
+def labelEmptyText(text, label):
+    if len(text.splitlines()) == 0:
+        return label
+    return text
+
+def delHeaderText(text, cleanStart=True):
+    text = text.splitlines()
+    if cleanStart and len(text) > 1 and text[1] == '':
+        return '\n'.join(text[2:])
+    return '\n'.join(text[1:])
+
+def delFooterText(text, cleanStart=True):
+    text = text.splitlines()
+    if cleanStart and len(text) > 1 and text[-2] == '':
+        return '\n'.join(text[:-2])
+    return '\n'.join(text[:-1])
+
+def hyphenChoice(first, second, wordDict, dictionaries, useDict=False, useText=True, otherwise=0):
+    """
+    Decides on a hyphenated word, split in first and second ('exam', 'ple').
+    See hyphenText for the parameters.
+
+    Returns
+    -------
+    True: join and keep the hyphen, False: join and remove the hyphen, None: leave it
+    """
+    whyphen = first + '-' + second
+    wohyphen = first + second
+    if useText:
+        wcount = wordDict[whyphen]
+        wocount = wordDict[wohyphen]
+        if wocount > wcount:
+            return False
+        elif wcount > wocount:
+            return True
+
+    if useDict:
+        # Joined word known: remove hyphen. Otherwise, keep the hyphen
+        # if both parts are known words.
+        if dictionaries.check(wohyphen):
+            return False
+        elif dictionaries.check(first) and dictionaries.check(second):
+            return True
+
+    if otherwise == 1: #Keep hyphens
+        return True
+    elif otherwise == 2:
+        return False
+    return None
+
+def hyphenText(text, wordDict, dictionaries, useDict=False, useText=True, otherwise=0):
+    """
+    Resolves the end of line hyphens of a text.
+
+    Input
+    -----
+    wordDict: Counter with the words of the whole book (used if useText)
+    dictionaries: dictionary.DictionarySet (used if useDict)
+    useDict: bool, decide based on the dictionaries
+    useText: bool, decide based on the frequency of the joined/hyphenated word in the book
+    otherwise: int, 0: do nothing, 1: join and keep hyphen, 2: join and remove hyphen
+    """
+    #Get all EOL hyphen words. Select also all non-whitespace characters
+    #after, as well as a series of white spaces (excluding line endings).
+    #After hyphen and EOL, at least 1 word character must be there.
+    hyphenWords = re.findall('\w+-\n\w\S+[\s^\r\n]*', text)
+    for w in hyphenWords:
+        # Get the word
+        first, second = re.match('(\w+)-\n(\w+)',w).groups()
+        keep = hyphenChoice(first, second, wordDict, dictionaries, useDict, useText, otherwise)
+        if keep is True:
+            text = text.replace(w,w.replace('\n','').rstrip()+'\n',1)
+        elif keep is False:
+            text = text.replace(w,w.replace('-\n','').rstrip()+'\n',1)
+    return text
+
+def crossPageHyphens(progress, locations, wordDict, dictionaries, useDict=False, useText=True, otherwise=0):
+    """
+    Job function: resolves the hyphens at the end of a page, of words that
+    continue on the next page ('exam-' and '*ple,'). The completed word is
+    moved to the end of the page, and the line it came from is removed if
+    it becomes empty. The hyphens are found from the first and last lines
+    of the pages only; just the pages that change are read in full.
+    See hyphenText for the parameters.
+
+    Returns
+    -------
+    int: the number of changed files
+    """
+    edits = dict() # pos --> [(hyphen part of the last line, completed word) or None, characters to cut from the first line]
+    prevLast = None
+    for pos, loc in enumerate(locations):
+        if pos % 50 == 0:
+            progress(pos, len(locations))
+        firstLine, lastLine = pages.edgeLines(loc)
+        end = PAGE_END_HYPHEN_RE.search(prevLast.rstrip()) if prevLast is not None else None
+        start = PAGE_START_WORD_RE.match(firstLine) if end is not None and firstLine is not None else None
+        if start is not None:
+            keep = hyphenChoice(end.group(1), start.group(1), wordDict, dictionaries, useDict, useText, otherwise)
+            if keep is not None:
+                word = end.group(1) + ('-' if keep else '') + start.group(1) + start.group(2)
+                edits.setdefault(pos - 1, [None, 0])[0] = (end.group(), word)
+                edits.setdefault(pos, [None, 0])[1] = start.end()
+        prevLast = lastLine
+    changed = 0
+    for num, pos in enumerate(sorted(edits)):
+        progress(num, len(edits))
+        joined, cut = edits[pos]
+        text = readFile(locations[pos])
+        new = text
+        if cut:
+            firstLine, sep, rest = new.partition('\n')
+            new = firstLine[cut:] + sep + rest if firstLine[cut:].strip() else rest
+        if joined is not None:
+            body = new.rstrip('\n')
+            head, sep, lastLine = body.rpartition('\n')
+            lastLine = lastLine.rstrip()
+            if lastLine.endswith(joined[0]): # Else its continuation was the whole line
+                new = head + sep + lastLine[:-len(joined[0])] + joined[1] + new[len(body):]
+        if new != text:
+            pages.writePage(locations[pos], new)
+            changed += 1
+    progress(len(locations), len(locations))
+    return changed
+
+class PagesStep:
+    """
+    Macro step that needs the neighbouring pages: func(progress, locations, wordDict)
+    --> number of changed files. It runs on all pages between the fused steps.
+    """
+
+    def __init__(self, func):
+        self.func = func
+
+def macroFiles(progress, locations, funcs, needWords=False):
+    """
+    Job function: applies a chain of macro step functions func(pos, text, wordDict)
+    to all files, with a single read and write per file. A PagesStep splits the
+    chain, and runs on its own.
+    If needWords, the word counts of the book are made first. These are used by the
+    EOL hyphen steps, and are based on the text before the macro.
+    """
+    wordDict = countWords(noProgress, locations) if needWords else None
+    def runChain(funcs):
+        def chain(pos, text):
+            for func in funcs:
+                text = func(pos, text, wordDict)
+            return text
+        return transformFiles(progress, locations, chain)
+    changed = 0
+    fused = []
+    for func in funcs:
+        if isinstance(func, PagesStep):
+            if fused:
+                changed += runChain(fused)
+                fused = []
+            changed += func.func(progress, locations, wordDict)
+        else:
+            fused.append(func)
+    if fused:
+        changed += runChain(fused)
+    return changed
+
+def hyphenFiles(progress, locations, dictionaries, useDict=False, useText=True, otherwise=0, crossPage=False):
+    """
+    Job function: resolves the end of line hyphens of all files, and
+    if crossPage also the hyphens at the end of the pages.
+    """
+    wordDict = None
+    if useText:
+        wordDict = countWords(noProgress, locations) #Get all words in the text
+    changed = transformFiles(progress, locations,
+                             lambda pos, text: hyphenText(text, wordDict, dictionaries, useDict, useText, otherwise))
+    if crossPage:
+        changed += crossPageHyphens(progress, locations, wordDict, dictionaries, useDict, useText, otherwise)
+    return changed
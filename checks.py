@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright 2021 Wouter Franssen
+
+# This file is part of Disprop.
+#
+# Disprop is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Disprop is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Disprop. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Batch checks (gutcheck style) for post-processing.
+
+Each check is a subclass of Check that gets every line of a page once,
+in order. All enabled checks share the same traversal of a page, and
+pages are divided over a process pool.
+"""
+
+import re
+import multiprocessing as mp
+
+
+class Check:
+    """
+    The base class of the checks.
+    Checks inherit this class and reimplement line() and, if needed, end().
+    """
+
+    CODE = ''     # The code used to enable the check
+    NAME = ''     # The name displayed in the check window
+
+    def __init__(self):
+        self.results = []
+
+    def report(self, line, column, msg):
+        """
+        Stores a result. Line and column are 0-based.
+        """
+        self.results.append((line, column, self.CODE, msg))
+
+    def line(self, num, text):
+        """
+        Called for each line of the page.
+        """
+        pass
+
+    def end(self, num):
+        """
+        Called after the last line. num is the number of lines.
+        """
+        pass
+
+
+class ParagraphCheck(Check):
+    """
+    A check that collects the lines of a paragraph and tests them when the paragraph ends.
+    """
+
+    def __init__(self):
+        super(ParagraphCheck, self).__init__()
+        self.start = None
+        self.lines = []
+
+    def line(self, num, text):
+        if len(text.strip()) == 0:
+            self.end(num)
+        else:
+            if self.start is None:
+                self.start = num
+            self.lines.append(text)
+
+    def end(self, num):
+        if self.start is not None:
+            self.paragraph(self.start, '\n'.join(self.lines))
+        self.start = None
+        self.lines = []
+
+    def paragraph(self, start, text):
+        pass
+
+
+class QuoteCheck(ParagraphCheck):
+    CODE = 'quotes'
+    NAME = 'Unbalanced quotes per paragraph'
+
+    def paragraph(self, start, text):
+        if text.count('"') % 2:
+            self.report(start, 0, 'Odd number of straight double quotes in paragraph')
+        if text.count('“') != text.count('”'):
+            self.report(start, 0, 'Unbalanced curly double quotes in paragraph')
+
+
+class BracketCheck(ParagraphCheck):
+    CODE = 'brackets'
+    NAME = 'Unbalanced brackets per paragraph'
+    PAIRS = ['()','[]','{}']
+
+    def paragraph(self, start, text):
+        for pair in self.PAIRS:
+            if text.count(pair[0]) != text.count(pair[1]):
+                self.report(start, 0, f'Unbalanced {pair} in paragraph')
+
+
+class TagCheck(Check):
+    CODE = 'tags'
+    NAME = 'Unclosed <i>, <b>, <sc>, <f>, <g> tags'
+    TAG = re.compile(r'<(/?)(i|b|sc|f|g)>')
+
+    def __init__(self):
+        super(TagCheck, self).__init__()
+        self.open = []
+
+    def line(self, num, text):
+        for m in self.TAG.finditer(text):
+            if m.group(1) == '':
+                self.open.append((num, m.start(), m.group(2)))
+            elif len(self.open) > 0 and self.open[-1][2] == m.group(2):
+                self.open.pop()
+            else:
+                self.report(num, m.start(), f'Closing tag {m.group(0)} without opening tag')
+
+    def end(self, num):
+        for line, column, tag in self.open:
+            self.report(line, column, f'Tag <{tag}> is not closed')
+
+
+class BlockCheck(Check):
+    CODE = 'blocks'
+    NAME = 'Mismatched /* */ and /# #/ blocks'
+    OPEN = {'/*':'*/','/#':'#/'}
+    CLOSE = {'*/':'/*','#/':'/#'}
+
+    def __init__(self):
+        super(BlockCheck, self).__init__()
+        self.open = []
+
+    def line(self, num, text):
+        stripped = text.strip()
+        mark = stripped[:2]
+        if mark in self.OPEN:
+            if len(stripped) > 2 and stripped[2] != '[': # /*[4] is allowed
+                self.report(num, 0, f'Text after {mark} on the same line')
+            self.open.append((num, mark))
+        elif stripped in self.CLOSE:
+            if len(self.open) > 0 and self.open[-1][1] == self.CLOSE[stripped]:
+                self.open.pop()
+            else:
+                self.report(num, 0, f'{stripped} without matching {self.CLOSE[stripped]}')
+
+    def end(self, num):
+        for line, mark in self.open:
+            self.report(line, 0, f'{mark} is not closed')
+
+
+class SpacedPunctCheck(Check):
+    CODE = 'spacedpunct'
+    NAME = 'Spaced punctuation'
+    PATTERN = re.compile(r'\S( +[,;:!?]| +\.(?!\.))')
+
+    def line(self, num, text):
+        for m in self.PATTERN.finditer(text):
+            self.report(num, m.start(1), f'Space before "{m.group(1).strip()}"')
+
+
+class NoteCheck(Check):
+    CODE = 'notes'
+    NAME = 'Proofer notes (** and [**)'
+    PATTERN = re.compile(r'\[\*\*|\*\*')
+
+    def line(self, num, text):
+        m = self.PATTERN.search(text)
+        if m is not None:
+            self.report(num, m.start(), 'Proofer note or marker')
+
+
+class DigitCheck(Check):
+    CODE = 'digits'
+    NAME = 'Digits inside words'
+    PATTERN = re.compile(r'\b\w*(?:[^\W\d_]\d|\d[^\W\d_])\w*\b')
+    ORDINAL = re.compile(r'\d+(st|nd|rd|th|d)', re.IGNORECASE)
+
+    def line(self, num, text):
+        for m in self.PATTERN.finditer(text):
+            if not self.ORDINAL.fullmatch(m.group(0)):
+                self.report(num, m.start(), f'Digit inside word: {m.group(0)}')
+
+
+CHECKS = [QuoteCheck, BracketCheck, TagCheck, BlockCheck, SpacedPunctCheck, NoteCheck, DigitCheck]
+CHECKDICT = {x.CODE: x for x in CHECKS}
+
+
+def checkText(text, codes):
+    """
+    Runs the checks given by codes on the text of a page, in a single traversal.
+
+    Returns
+    -------
+    List of (line, column, code, message)
+    """
+    checks = [CHECKDICT[x]() for x in codes]
+    lines = text.splitlines()
+    for num, line in enumerate(lines):
+        for check in checks:
+            check.line(num, line)
+    results = []
+    for check in checks:
+        check.end(len(lines))
+        results += check.results
+    results.sort()
+    return results
+
+
+def _checkPage(args):
+    pos, loc, codes = args
+    with open(loc,'r') as f:
+        text = f.read()
+    return [(pos,) + x for x in checkText(text, codes)]
+
+
+def runChecks(progress, locations, codes):
+    """
+    Job function: runs the checks on all files. The files are divided over a process pool.
+
+    Parameters
+    ----------
+    progress: function, called as progress(done, total)
+    locations: list of str, the paths of the pages
+    codes: list of str, the codes of the enabled checks
+
+    Returns
+    -------
+    List of (page index (1-based), line, column, code, message), sorted by position.
+    """
+    tasks = [(pos + 1, loc, codes) for pos, loc in enumerate(locations)]
+    results = []
+    if len(tasks) < 50: # Starting a pool is not worth it
+        for pos, task in enumerate(tasks):
+            progress(pos, len(tasks))
+            results.append(_checkPage(task))
+    else:
+        processes = max(mp.cpu_count()-1,1)
+        # A forked child of this worker thread could inherit locks held by the Qt and page writer threads
+        with mp.get_context('spawn').Pool(processes) as p:
+            # imap keeps the page order, and allows progress updates
+            for page in p.imap(_checkPage, tasks, chunksize=max(len(tasks) // (16 * processes), 1)):
+                progress(len(results), len(tasks))
+                results.append(page)
+    return [x for page in results for x in page]
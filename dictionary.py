@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright 2021 Wouter Franssen
+
+# This file is part of Disprop.
+#
+# Disprop is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Disprop is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Disprop. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Compact, memory mapped word lists.
+
+A dictionary file (.dpd) holds two tables: the words themselves and their
+folded forms (lower case, diacritics removed). Each table is an array of
+uint32 offsets followed by a blob with the sorted, UTF-8 encoded words.
+Lookups are binary searches directly on the mapped file, so opening a
+dictionary costs almost nothing, regardless of its size.
+"""
+
+import os.path
+import sys
+import mmap
+import struct
+import unicodedata as uni
+
+DICT_EXT = '.dpd'
+DICT_DIR = os.path.dirname(os.path.realpath(__file__)) + os.path.sep + 'Dictionaries'
+
+MAGIC = b'DPDICT01'
+HEADER = struct.Struct('<8sII') # magic, number of words, number of folded words
+OFFSET = struct.Struct('<I')
+
+
+def foldWord(word):
+    """
+    Returns the folded version of a word: lower case and without diacritics.
+    """
+    word = uni.normalize('NFKD', word.lower())
+    return ''.join([c for c in word if not uni.combining(c)])
+
+
+class _Table:
+    """
+    A sorted table of byte strings inside a buffer.
+    """
+
+    def __init__(self, buf, start, count):
+        self.buf = buf
+        self.count = count
+        self.offStart = start
+        self.blobStart = start + OFFSET.size * (count + 1)
+        self.end = self.blobStart + self.offset(count)
+
+    def offset(self, index):
+        return OFFSET.unpack_from(self.buf, self.offStart + OFFSET.size * index)[0]
+
+    def item(self, index):
+        start = self.offset(index)
+        end = self.offset(index + 1)
+        return self.buf[self.blobStart + start:self.blobStart + end]
+
+    def lowerBound(self, key):
+        """
+        Returns the index of the first item that is not smaller than key.
+        """
+        low = 0
+        high = self.count
+        while low < high:
+            mid = (low + high) // 2
+            if self.item(mid) < key:
+                low = mid + 1
+            else:
+                high = mid
+        return low
+
+    def contains(self, key):
+        pos = self.lowerBound(key)
+        return pos < self.count and self.item(pos) == key
+
+    def prefix(self, key):
+        """
+        Yields all items starting with key, in sorted order.
+        """
+        pos = self.lowerBound(key)
+        while pos < self.count:
+            item = self.item(pos)
+            if not item.startswith(key):
+                return
+            yield item
+            pos += 1
+
+
+class Dictionary:
+    """
+    A read-only word list backed by a memory mapped .dpd file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.name = os.path.splitext(os.path.basename(path))[0]
+        with open(path, 'rb') as f:
+            self.buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, nWords, nFolded = HEADER.unpack_from(self.buf, 0)
+        if magic != MAGIC:
+            self.buf.close()
+            raise ValueError(f'{path} is not a Disprop dictionary')
+        self.words = _Table(self.buf, HEADER.size, nWords)
+        self.folded = _Table(self.buf, self.words.end, nFolded)
+
+    def __len__(self):
+        return self.words.count
+
+    def __contains__(self, word):
+        return self.words.contains(word.encode('utf-8'))
+
+    def containsFolded(self, word):
+        """
+        Checks if word is present, ignoring case and diacritics.
+        """
+        return self.folded.contains(foldWord(word).encode('utf-8'))
+
+    def startingWith(self, prefix):
+        """
+        Yields all words that start with prefix.
+        """
+        for item in self.words.prefix(prefix.encode('utf-8')):
+            yield item.decode('utf-8')
+
+    def close(self):
+        self.buf.close()
+
+
+class DictionarySet:
+    """
+    A group of dictionaries (i.e. languages) that are consulted together.
+    """
+
+    def __init__(self, dictionaries=None):
+        self.dictionaries = [] if dictionaries is None else dictionaries
+
+    def __len__(self):
+        return len(self.dictionaries)
+
+    def __contains__(self, word):
+        return any(word in d for d in self.dictionaries)
+
+    def names(self):
+        return [d.name for d in self.dictionaries]
+
+    def check(self, word):
+        """
+        Checks a word as it appears in a text. Next to an exact match, a
+        lower case version is accepted for capitalized words (sentence starts).
+        """
+        if word in self:
+            return True
+        lower = word.lower()
+        if lower != word and word[1:] == lower[1:]:
+            return lower in self
+        return False
+
+    def containsFolded(self, word):
+        return any(d.containsFolded(word) for d in self.dictionaries)
+
+    def startingWith(self, prefix):
+        """
+        Yields the sorted, unique words starting with prefix from all dictionaries.
+        """
+        return iter(sorted(set(w for d in self.dictionaries for w in d.startingWith(prefix))))
+
+    def close(self):
+        for d in self.dictionaries:
+            d.close()
+        self.dictionaries = []
+
+
+def loadDictionaries(folder=DICT_DIR):
+    """
+    Opens all dictionaries in a folder. Invalid files are skipped.
+
+    Returns
+    -------
+    DictionarySet
+    """
+    dictionaries = []
+    if os.path.isdir(folder):
+        for name in sorted(os.listdir(folder)):
+            if name.endswith(DICT_EXT):
+                try:
+                    dictionaries.append(Dictionary(os.path.join(folder, name)))
+                except (ValueError, OSError, struct.error):
+                    pass
+    return DictionarySet(dictionaries)
+
+
+def readWordList(path, encoding='utf-8'):
+    """
+    Reads words from a hunspell .dic file or a plain word list (one word per line).
+    For .dic files the word count on the first line and the affix flags are removed.
+    Affix rules are not expanded: use an unmunched list for full coverage.
+    """
+    words = []
+    with open(path, 'r', encoding=encoding, errors='replace') as f:
+        lines = f.read().splitlines()
+    if path.endswith('.dic') and len(lines) > 0 and lines[0].strip().isdigit():
+        lines = lines[1:]
+    for line in lines:
+        line = line.strip()
+        if len(line) == 0 or line.startswith('#'):
+            continue
+        word = line.split()[0]
+        # Remove hunspell flags, which start at the first non-escaped slash
+        pos = 0
+        while True:
+            pos = word.find('/', pos)
+            if pos <= 0 or word[pos - 1] != '\\':
+                break
+            pos += 1
+        if pos > 0:
+            word = word[:pos]
+        word = word.replace('\\/', '/')
+        if len(word) > 0:
+            words.append(uni.normalize('NFC', word))
+    return words
+
+
+def _packTable(items):
+    offsets = [0]
+    for item in items:
+        offsets.append(offsets[-1] + len(item))
+    return struct.pack(f'<{len(offsets)}I', *offsets) + b''.join(items)
+
+
+def buildDictionary(inputs, outFile, encoding='utf-8'):
+    """
+    Builds a dictionary file from one or more word lists.
+
+    Parameters
+    ----------
+    inputs: list of str, paths of .dic files or plain word lists
+    outFile: str, path of the .dpd file to write
+    encoding [= 'utf-8']: str, encoding of the input files
+
+    Returns
+    -------
+    int: the number of unique words written
+    """
+    words = set()
+    for path in inputs:
+        words.update(readWordList(path, encoding))
+    encoded = sorted(set(w.encode('utf-8') for w in words))
+    folded = sorted(set(foldWord(w).encode('utf-8') for w in words))
+    with open(outFile, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, len(encoded), len(folded)))
+        f.write(_packTable(encoded))
+        f.write(_packTable(folded))
+    return len(encoded)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 3:
+        print('Usage: dictionary.py WORDLIST [WORDLIST ...] OUTPUT' + DICT_EXT)
+        sys.exit(1)
+    print(f'{buildDictionary(sys.argv[1:-1], sys.argv[-1])} words written to {sys.argv[-1]}')
@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright 2021 Wouter Franssen
+
+# This file is part of Disprop.
+#
+# Disprop is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Disprop is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Disprop. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Detection of running heads and page numbers in the first (or last) lines
+of the pages.
+
+The lines are normalized: numbers, arabic and roman, become '#', and case,
+punctuation and spacing are ignored. Equal normalized lines are counted
+in a dict. Near-duplicates (OCR errors, at most two edits) are merged
+into clusters: a line is only compared with the first line of the buckets
+it falls in (by its start, its end and its longest word), so the work is
+linear in the number of pages.
+
+A line is a likely header or footer if it is only an arabic page number,
+or only a roman one that fits in a sequence of page numbers (a lone 'I'
+or 'IV.' is as likely a chapter number), if its cluster occurs regularly
+(at least MINCOUNT times, on at least DENSITY of the pages it spans), or
+if it is a short upper case line that starts or ends with an arabic page
+number. Chapter headings ('CHAPTER IV') repeat
+too, but far apart, so sparse clusters are text.
+
+The printed page numbers are taken from the numbers at the start and end
+of these lines. A number gives the offset of the printed number to the
+position of the page; it is accepted if another page within WINDOW pages
+has a number with the same offset (and kind, arabic or roman). Pages with
+the same offset form runs, which are extended over the pages without
+number between them: forward only up to a run of the same kind (or to
+the end), and backward down to the number 1. The pages before the first
+run get no number, as front matter is often not numbered. A change of the
+offset between two runs means that images are missing (the offset
+increases), or that there are pages that are not counted, like plates,
+or duplicated images (it decreases).
+"""
+
+import os
+import re
+import json
+import collections as col
+import distance
+
+MINCOUNT = 3 # Occurrences of a running head
+DENSITY = 0.2 # Fraction of the pages between its first and last occurrence
+MAXWORDS = 8 # Words of a short upper case line with a page number
+BAND = 8 # Characters of the start and end buckets
+WINDOW = 10 # Pages within which a page number must be confirmed
+MAXNUMBER = 9999
+LABELS_FILE = 'pagelabels.json'
+LABELS_VERSION = 1
+
+NUMBER_RE = re.compile(r'\d+')
+ROMAN_RE = re.compile(r'\b(?=[ivxlc])c{0,3}(?:xc|xl|l?x{0,3})(?:ix|iv|v?i{0,3})(?<=[ivxlc])\b', re.I)
+PUNCTUATION_RE = re.compile(r'[^\w#\s]|_')
+MARKUP_RE = re.compile(r'\s*\*?\[(Blank Page|Illustration|Footnote|Sidenote)') # DP markup, never a header
+EDGE_NUMBER_RE = re.compile(r'^\W*\d+\b|\b\d+\W*$') # Arabic page number at the start or end of a line
+
+WORD_RE = re.compile(r'\w+')
+ROMAN_VALUES = {'i': 1, 'v': 5, 'x': 10, 'l': 50, 'c': 100}
+ROMAN_DIGITS = [(100, 'c'), (90, 'xc'), (50, 'l'), (40, 'xl'), (10, 'x'), (9, 'ix'), (5, 'v'), (4, 'iv'), (1, 'i')]
+
+PAGENUMBER = 'page number'
+RUNNINGHEAD = 'running head'
+ARABIC = 'arabic'
+ROMAN = 'roman'
+
+
+def normalize(line):
+    """
+    Returns the normalized form of a line: 'CHAP. IV.] THE WAR. 57' --> 'chap # the war #'.
+    """
+    line = NUMBER_RE.sub('#', line)
+    line = ROMAN_RE.sub('#', line)
+    line = PUNCTUATION_RE.sub(' ', line.lower())
+    return ' '.join(line.split())
+
+
+def _upperCase(line):
+    letters = [x for x in line if x.isupper() or x.islower()]
+    return len(letters) > 0 and sum(x.isupper() for x in letters) >= 0.7 * len(letters)
+
+
+def _near(key1, key2):
+    """
+    Checks if the edit distance of two normalized lines is at most two.
+    The letter counts are compared first, as distance.distanceIsTwo is slow
+    for lines that are not alike.
+    """
+    if abs(len(key1) - len(key2)) > 2:
+        return False
+    counts = col.Counter(key1)
+    counts.subtract(key2)
+    if sum(abs(x) for x in counts.values()) > 4:
+        return False
+    return distance.distanceIsTwo(key1, key2)
+
+
+class _Clusters:
+    """
+    Union-find of the normalized lines.
+    """
+
+    def __init__(self):
+        self.parent = dict()
+
+    def find(self, key):
+        root = key
+        while self.parent.get(root, root) != root:
+            root = self.parent[root]
+        while key != root: # Path compression
+            self.parent[key], key = root, self.parent[key]
+        return root
+
+    def union(self, key1, key2):
+        root1 = self.find(key1)
+        root2 = self.find(key2)
+        if root1 != root2:
+            self.parent[root2] = root1
+
+
+def classify(lines):
+    """
+    Classifies the first or last lines of the pages.
+
+    Input
+    -----
+    lines: list of strings (None for an empty page)
+
+    Returns
+    -------
+    list with per line PAGENUMBER, RUNNINGHEAD or None (probably text)
+    """
+    stats = dict() # normalized line --> [count, first page, last page]
+    keys = []
+    for pos, line in enumerate(lines):
+        key = normalize(line) if line is not None and not MARKUP_RE.match(line) else ''
+        keys.append(key)
+        if not key or key == '#':
+            continue
+        if key in stats:
+            stats[key][0] += 1
+            stats[key][2] = pos
+        else:
+            stats[key] = [1, pos, pos]
+    clusters = _Clusters()
+    buckets = dict() # (kind, text) --> first normalized line
+    for key in stats:
+        words = key.split()
+        for bucket in (('start', key[:BAND]), ('end', key[-BAND:]), ('word', max(words, key=len))):
+            first = buckets.setdefault(bucket, key)
+            if first != key and _near(first, key):
+                clusters.union(first, key)
+    total = dict() # root --> [count, first page, last page]
+    for key, (count, first, last) in stats.items():
+        root = clusters.find(key)
+        if root in total:
+            entry = total[root]
+            entry[0] += count
+            entry[1] = min(entry[1], first)
+            entry[2] = max(entry[2], last)
+        else:
+            total[root] = [count, first, last]
+    romans = [line if key == '#' and not NUMBER_RE.search(line) else None for line, key in zip(lines, keys)]
+    if any(romans):
+        labels = pageLabels(romans, [None] * len(lines), [''] * len(lines))[0]
+    kinds = []
+    for pos, (line, key) in enumerate(zip(lines, keys)):
+        if not key:
+            kinds.append(None)
+            continue
+        if key == '#':
+            if romans[pos] is None or labels[pos] in [label(*x) for x in numberCandidates(romans[pos])]:
+                kinds.append(PAGENUMBER)
+            else:
+                kinds.append(None) # Not in a sequence, e.g. a chapter number
+            continue
+        count, first, last = total[clusters.find(key)]
+        words = key.split()
+        if count >= MINCOUNT:
+            kinds.append(RUNNINGHEAD if count >= DENSITY * (last - first + 1) else None)
+        elif len(words) <= MAXWORDS and EDGE_NUMBER_RE.search(line) and _upperCase(line):
+            kinds.append(RUNNINGHEAD)
+        else:
+            kinds.append(None)
+    return kinds
+
+
+def romanValue(token):
+    """
+    Returns the value of a roman number (up to 399), or None if token is not one.
+    """
+    if not ROMAN_RE.fullmatch(token):
+        return None
+    total = 0
+    highest = 0
+    for char in reversed(token.lower()):
+        value = ROMAN_VALUES[char]
+        total += -value if value < highest else value
+        highest = max(highest, value)
+    return total
+
+
+def toRoman(value):
+    out = ''
+    for number, digits in ROMAN_DIGITS:
+        while value >= number:
+            out += digits
+            value -= number
+    return out
+
+
+def numberCandidates(line):
+    """
+    Returns the (kind, value) of the numbers at the start and end of a line.
+    """
+    tokens = WORD_RE.findall(line)
+    out = []
+    for token in tokens[:1] + tokens[-1:]:
+        if token.isdigit() and 0 < int(token) <= MAXNUMBER:
+            number = (ARABIC, int(token))
+        elif romanValue(token):
+            number = (ROMAN, romanValue(token))
+        else:
+            continue
+        if number not in out:
+            out.append(number)
+    return out
+
+
+def label(kind, value):
+    return toRoman(value) if kind == ROMAN else str(value)
+
+
+def pageLabels(headers, footers, names):
+    """
+    Fits the printed page numbers of the pages.
+
+    Input
+    -----
+    headers, footers: lists with the first and last line of each page (None for an empty page)
+    names: list with the image name of each page
+
+    Returns
+    -------
+    (list with the printed page number (string) or None per page,
+     list of (page position, message) of the jumps in the numbering)
+    """
+    number = len(names)
+    candidates = [] # Per page: list of (kind, offset)
+    for pos in range(number):
+        found = []
+        for line in (headers[pos], footers[pos]):
+            if line is not None:
+                for kind, value in numberCandidates(line):
+                    if (kind, value - pos) not in found:
+                        found.append((kind, value - pos))
+        candidates.append(found)
+    confirmed = [set() for _ in range(number)]
+    for order in (range(number), reversed(range(number))):
+        seen = dict() # (kind, offset) --> last page
+        for pos in order:
+            for cand in candidates[pos]:
+                if cand in seen and abs(seen[cand] - pos) <= WINDOW:
+                    confirmed[pos].add(cand)
+                seen[cand] = pos
+    runs = [] # [kind, offset, first page, last page]
+    for pos in range(number):
+        cands = [x for x in candidates[pos] if x in confirmed[pos]]
+        if not cands:
+            continue
+        if runs and tuple(runs[-1][:2]) in cands:
+            runs[-1][3] = pos
+        else:
+            runs.append([cands[0][0], cands[0][1], pos, pos])
+    values = [None] * number # (kind, value) per page
+    for kind, offset, first, last in runs:
+        for pos in range(first, last + 1):
+            values[pos] = (kind, pos + offset)
+    messages = []
+    for num, (kind, offset, first, last) in enumerate(runs):
+        prev = runs[num - 1] if num > 0 else None
+        nxt = runs[num + 1] if num + 1 < len(runs) else None
+        end = nxt[2] if nxt is not None else number
+        for pos in range(last + 1, end): # Pages after the run
+            if nxt is not None and (nxt[0] != kind or pos + offset >= nxt[2] + nxt[1]):
+                break # The next run fills the gap backward
+            values[pos] = (kind, pos + offset)
+        start = prev[3] if prev is not None else first - 1
+        for pos in range(first - 1, start, -1): # Pages before the run
+            if values[pos] is not None or pos + offset < 1:
+                break
+            if prev is not None and prev[0] == kind and pos + offset <= values[prev[3]][1]:
+                break
+            values[pos] = (kind, pos + offset)
+        if prev is not None and prev[0] == kind:
+            lastValue = values[prev[3]][1]
+            firstValue = first + offset
+            if offset > prev[1]:
+                messages.append((first, f'{offset - prev[1]} page(s) missing before {names[first]} (printed {label(kind, firstValue)})'))
+            elif firstValue <= lastValue:
+                messages.append((first, f'Printed page {label(kind, firstValue)} repeats at {names[first]} (duplicated image?)'))
+            else:
+                messages.append((first, f'{prev[1] - offset} page(s) without number before {names[first]} (plates?)'))
+    labels = [label(*x) if x is not None else None for x in values]
+    return labels, messages
+
+
+def saveLabels(path, labels):
+    """
+    Saves a map image name --> printed page number.
+    """
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump({'version': LABELS_VERSION, 'labels': labels}, f, indent=1)
+    os.replace(tmp, path)
+
+
+def loadLabels(path):
+    """
+    Returns the map image name --> printed page number, or None if there is none.
+    """
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'r') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(data, dict) or data.get('version') != LABELS_VERSION or not isinstance(data.get('labels'), dict):
+        return None
+    return data['labels']
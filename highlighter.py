@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright 2021 Wouter Franssen
+
+# This file is part of Disprop.
+#
+# Disprop is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Disprop is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Disprop. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Syntax highlighting of DP markup and of HTML.
+
+The state of a block holds the open /* */ and /# #/ blocks and the inline
+tags that are still open at its end. Qt only highlights the blocks that
+changed, and the blocks after them as long as their state changes, so the
+cost of an edit does not depend on the length of the page.
+The patterns and formats are created once and shared by all highlighters.
+
+For HTML, the state holds whether the block ends inside a comment or
+inside a tag (attributes that continue on the next line).
+
+The matches give offsets in code points, but Qt uses UTF-16 offsets: a
+character outside the BMP counts twice. The offsets are converted only
+for blocks that contain such characters (see utf16Offset, also used for
+the search highlights).
+"""
+
+import re
+import bisect
+from PyQt5 import QtGui
+
+BLOCKS = {'/*': ('*/', 1), '/#': ('#/', 2)} # start --> (end, state bit)
+TAGS = {'i': 4, 'b': 8, 'sc': 16, 'f': 32, 'g': 64, 'u': 128} # inline tag --> state bit
+
+TAG_RE = re.compile(r'<(/?)(i|b|sc|f|g|u)>')
+NOTE_RE = re.compile(r'\[\*\*[^\]]*\]?')
+MARKER_RE = re.compile(r'\*?\[(Footnote|Illustration|Sidenote|Blank Page|Greek|Hebrew)\b[^\]]*\]?')
+STAR_RE = re.compile(r'-\*|\*-|(?<!\S)\*(?!\S)')
+
+HTML_COMMENT, HTML_TAG = 1, 2
+HTML_OPEN_RE = re.compile(r'<!--|</?[A-Za-z][\w:-]*|<!\w+|&#?\w+;')
+HTML_ATTR_RE = re.compile(r'([\w:-]+)(?=\s*=)|"[^"]*"?|\'[^\']*\'?|/?>')
+
+_formats = None
+
+
+def _format(color=None, background=None, bold=False, italic=False, underline=False):
+    fmt = QtGui.QTextCharFormat()
+    if color is not None:
+        fmt.setForeground(QtGui.QColor(color))
+    if background is not None:
+        fmt.setBackground(QtGui.QColor(background))
+    if bold:
+        fmt.setFontWeight(QtGui.QFont.Bold)
+    fmt.setFontItalic(italic)
+    fmt.setFontUnderline(underline)
+    return fmt
+
+
+def formats():
+    """
+    Returns the shared formats. These are created on first use, as they
+    need a running application.
+    """
+    global _formats
+    if _formats is None:
+        _formats = {'block': _format('darkMagenta', bold=True),
+                    'inBlock': _format(background='#f2f2ff'),
+                    'tag': _format('darkGreen'),
+                    'note': _format('black', background='#ffff66'),
+                    'marker': _format('darkBlue', bold=True),
+                    'star': _format('white', background='#d05050'),
+                    'error': _format('white', background='red', bold=True),
+                    'htmlTag': _format('darkBlue', bold=True),
+                    'htmlAttr': _format('darkRed'),
+                    'htmlString': _format('darkGreen'),
+                    'htmlComment': _format('gray', italic=True),
+                    'htmlEntity': _format('darkMagenta')}
+    return _formats
+
+
+def astralPositions(text):
+    """
+    Returns the positions of the characters outside the BMP in text, or
+    None if there are none.
+    """
+    if text.isascii() or max(text) <= '\uffff':
+        return None
+    return [pos for pos, char in enumerate(text) if char > '\uffff']
+
+
+def utf16Offset(pos, astral):
+    """
+    Converts a code point offset in a text to the UTF-16 offset used by Qt.
+    astral: the result of astralPositions for the text.
+    """
+    return pos + bisect.bisect_left(astral, pos) if astral else pos
+
+
+class _Highlighter(QtGui.QSyntaxHighlighter):
+
+    _astral = None # Positions of the characters outside the BMP in the current block
+
+    def prepare(self, text):
+        self._astral = astralPositions(text)
+
+    def mark(self, start, length, fmt):
+        """
+        setFormat with code point offsets.
+        """
+        if self._astral:
+            end = utf16Offset(start + length, self._astral)
+            start = utf16Offset(start, self._astral)
+            length = end - start
+        self.setFormat(start, length, fmt)
+
+
+class DPHighlighter(_Highlighter):
+
+    def __init__(self, document):
+        super(DPHighlighter, self).__init__(document)
+        self.fmt = formats()
+        self._tagFormats = dict() # state --> format of text inside tags
+
+    def tagFormat(self, state):
+        if state not in self._tagFormats:
+            self._tagFormats[state] = _format(bold=bool(state & (TAGS['b'] | TAGS['g'])),
+                                              italic=bool(state & TAGS['i']),
+                                              underline=bool(state & TAGS['u']))
+            if state & TAGS['sc']:
+                self._tagFormats[state].setFontCapitalization(QtGui.QFont.SmallCaps)
+        return self._tagFormats[state]
+
+    def highlightBlock(self, text):
+        self.prepare(text)
+        state = max(self.previousBlockState(), 0)
+        fmt = self.fmt
+        start = text[:2]
+        if start in BLOCKS:
+            bit = BLOCKS[start][1]
+            self.mark(0, len(text), fmt['error'] if state & bit else fmt['block'])
+            self.setCurrentBlockState(state | bit)
+            return
+        for begin, (end, bit) in BLOCKS.items():
+            if text.startswith(end):
+                self.mark(0, len(text), fmt['block'] if state & bit else fmt['error'])
+                self.setCurrentBlockState(state & ~bit)
+                return
+        if state & 3:
+            self.mark(0, len(text), fmt['inBlock'])
+        # Inline tags: format the text in between, and mark unbalanced tags
+        pos = 0
+        for m in TAG_RE.finditer(text):
+            if state & ~3 and m.start() > pos:
+                self.mark(pos, m.start() - pos, self.tagFormat(state & ~3))
+            bit = TAGS[m.group(2)]
+            if m.group(1):
+                self.mark(m.start(), m.end() - m.start(), fmt['tag'] if state & bit else fmt['error'])
+                state &= ~bit
+            else:
+                self.mark(m.start(), m.end() - m.start(), fmt['error'] if state & bit else fmt['tag'])
+                state |= bit
+            pos = m.end()
+        if state & ~3 and len(text) > pos:
+            self.mark(pos, len(text) - pos, self.tagFormat(state & ~3))
+        for m in MARKER_RE.finditer(text):
+            self.mark(m.start(), m.end() - m.start(), fmt['marker'])
+        for m in NOTE_RE.finditer(text):
+            self.mark(m.start(), m.end() - m.start(), fmt['note'])
+        if '*' in text:
+            for m in STAR_RE.finditer(text):
+                self.mark(m.start(), m.end() - m.start(), fmt['star'])
+        self.setCurrentBlockState(state)
+
+
+class HtmlHighlighter(_Highlighter):
+
+    def __init__(self, document):
+        super(HtmlHighlighter, self).__init__(document)
+        self.fmt = formats()
+
+    def highlightBlock(self, text):
+        self.prepare(text)
+        state = max(self.previousBlockState(), 0)
+        fmt = self.fmt
+        pos = 0
+        while pos < len(text) or state == HTML_COMMENT:
+            if state == HTML_COMMENT:
+                end = text.find('-->', pos)
+                if end == -1:
+                    self.mark(pos, len(text) - pos, fmt['htmlComment'])
+                    break
+                self.mark(pos, end + 3 - pos, fmt['htmlComment'])
+                pos = end + 3
+                state = 0
+            elif state == HTML_TAG:
+                for m in HTML_ATTR_RE.finditer(text, pos):
+                    if m.group(1):
+                        self.mark(m.start(), m.end() - m.start(), fmt['htmlAttr'])
+                    elif m.group().endswith('>'):
+                        self.mark(m.start(), m.end() - m.start(), fmt['htmlTag'])
+                        pos = m.end()
+                        state = 0
+                        break
+                    else:
+                        self.mark(m.start(), m.end() - m.start(), fmt['htmlString'])
+                else:
+                    break
+            else:
+                m = HTML_OPEN_RE.search(text, pos)
+                if m is None:
+                    break
+                token = m.group()
+                if token == '<!--':
+                    state = HTML_COMMENT
+                    self.mark(m.start(), 4, fmt['htmlComment'])
+                elif token[0] == '&':
+                    self.mark(m.start(), m.end() - m.start(), fmt['htmlEntity'])
+                else:
+                    self.mark(m.start(), m.end() - m.start(), fmt['htmlTag'])
+                    state = HTML_TAG
+                pos = m.end()
+        self.setCurrentBlockState(state)
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright 2021 Wouter Franssen
+
+# This file is part of Disprop.
+#
+# Disprop is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Disprop is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Disprop. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Consistency checks of an HTML file.
+
+The document is parsed once. The parser collects the ids, links, image
+sources, used classes and the classes of the CSS selectors (from <style>
+and local stylesheets). The references are resolved when the document
+has been read. Results are (line, column, code, message), 0-based, like
+the results of the text checks.
+"""
+
+import os
+import re
+import urllib.parse
+from html.parser import HTMLParser
+
+FOOTNOTE_RE = re.compile(r'(?i)^(fn|footnote)') # ids of footnotes and their anchors
+CSS_COMMENT_RE = re.compile(r'/\*.*?\*/', re.S)
+CSS_TOKEN_RE = re.compile(r'[^{}]*[{}]')
+CSS_CLASS_RE = re.compile(r'\.(-?[_a-zA-Z][\w-]*)')
+NESTING_RULES = ('@media', '@supports', '@document') # @-rules that contain rules
+
+CODES = {'link': 'Dangling link',
+         'id': 'Duplicate id',
+         'file': 'Missing file',
+         'note': 'Footnote link',
+         'class': 'Undefined class',
+         'css': 'Unused class'}
+
+
+def cssClasses(css):
+    """
+    Returns the classes used in the selectors of a style sheet.
+
+    Returns
+    -------
+    dict: class --> offset of its first use in css
+    """
+    css = CSS_COMMENT_RE.sub(lambda m: re.sub(r'[^\n]', ' ', m.group()), css) # Keep the offsets
+    classes = dict()
+    stack = [] # Per open block: True if it contains rules
+    for m in CSS_TOKEN_RE.finditer(css):
+        token = m.group()
+        if token[-1] == '}':
+            if stack:
+                stack.pop()
+            continue
+        selector = token[:-1]
+        if stack and not stack[-1]: # Declarations
+            stack.append(False)
+            continue
+        if selector.lstrip().startswith('@'):
+            stack.append(selector.lstrip().lower().startswith(NESTING_RULES))
+            continue
+        for c in CSS_CLASS_RE.finditer(selector):
+            classes.setdefault(c.group(1), m.start() + c.start())
+        stack.append(False)
+    return classes
+
+
+def _offsetToPos(text, offset, line=0, column=0):
+    """
+    Converts an offset in text to a (line, column), with text starting at line/column.
+    """
+    before = text.count('\n', 0, offset)
+    if before == 0:
+        return line, column + offset
+    return line + before, offset - text.rfind('\n', 0, offset) - 1
+
+
+class HtmlChecker(HTMLParser):
+
+    def __init__(self, folder):
+        super(HtmlChecker, self).__init__(convert_charrefs=True)
+        self.folder = folder
+        self.ids = dict() # id --> list of (line, column)
+        self.links = [] # (line, column, target id, id of the link)
+        self.files = dict() # local file --> (line, column) of first use
+        self.used = dict() # class --> [(line, column) of first use, number of uses]
+        self.defined = dict() # class --> (line, column) of the selector (None if in a stylesheet)
+        self.inStyle = False
+
+    def handle_starttag(self, tag, attrs):
+        line, column = self.getpos()
+        pos = (line - 1, column)
+        attrs = dict(attrs)
+        ident = attrs.get('id')
+        if ident is None and tag == 'a':
+            ident = attrs.get('name')
+        if ident is not None:
+            self.ids.setdefault(ident, []).append(pos)
+        classes = attrs.get('class')
+        if classes:
+            for name in classes.split():
+                if name in self.used:
+                    self.used[name][1] += 1
+                else:
+                    self.used[name] = [pos, 1]
+        href = attrs.get('href')
+        if href is not None:
+            if tag == 'link' and 'stylesheet' in (attrs.get('rel') or '').lower():
+                self.addFile(href, pos, style=True)
+            elif href.startswith('#'):
+                self.links.append((pos[0], pos[1], urllib.parse.unquote(href[1:]), ident if tag == 'a' else None))
+            else:
+                self.addFile(href, pos)
+        src = attrs.get('src')
+        if src is not None:
+            self.addFile(src, pos)
+        self.inStyle = tag == 'style'
+
+    def handle_endtag(self, tag):
+        self.inStyle = False
+
+    def handle_data(self, data):
+        if self.inStyle:
+            line, column = self.getpos()
+            for name, offset in cssClasses(data).items():
+                self.defined.setdefault(name, _offsetToPos(data, offset, line - 1, column))
+
+    def addFile(self, url, pos, style=False):
+        """
+        Stores a link to a local file. Style sheets are read for their classes.
+        """
+        parts = urllib.parse.urlsplit(url)
+        if parts.scheme or parts.netloc or not parts.path:
+            return
+        path = os.path.normpath(os.path.join(self.folder, urllib.parse.unquote(parts.path)))
+        if path in self.files:
+            return
+        self.files[path] = pos
+        if style and os.path.isfile(path):
+            try:
+                with open(path, 'r') as f:
+                    for name in cssClasses(f.read()):
+                        self.defined.setdefault(name, None)
+            except (OSError, UnicodeDecodeError):
+                pass
+
+    def results(self):
+        """
+        Resolves the collected references.
+
+        Returns
+        -------
+        list of (line, column, code, message), sorted by position
+        """
+        out = []
+        for ident, places in self.ids.items():
+            for line, column in places[1:]:
+                out.append((line, column, 'id', f'Id "{ident}" is also used on line {places[0][0] + 1}'))
+        forward = dict() # id of a link --> target id
+        incoming = set()
+        for line, column, target, source in self.links:
+            if target not in self.ids:
+                out.append((line, column, 'link', f'No element with id "{target}"'))
+                continue
+            incoming.add(target)
+            if source is not None:
+                forward[source] = target
+        for line, column, target, source in self.links:
+            if target not in self.ids or not (FOOTNOTE_RE.match(target) or (source and FOOTNOTE_RE.match(source))):
+                continue
+            if source is None:
+                if FOOTNOTE_RE.match(target) and target not in forward:
+                    continue # An anchor without id, to a footnote without back-link
+                out.append((line, column, 'note', f'Link to "{target}" has no id for the back-link'))
+            elif forward.get(target) != source:
+                out.append((line, column, 'note', f'"{target}" does not link back to "{source}"'))
+        for ident, places in self.ids.items():
+            if ident.lower().startswith('footnote') and ident not in incoming:
+                out.append((places[0][0], places[0][1], 'note', f'Footnote "{ident}" is not referenced'))
+        for path, (line, column) in self.files.items():
+            if not os.path.exists(path):
+                out.append((line, column, 'file', f'{os.path.relpath(path, self.folder)} does not exist'))
+        for name, ((line, column), number) in self.used.items():
+            if name not in self.defined:
+                out.append((line, column, 'class', f'Class "{name}" is not defined ({number}x used)'))
+        for name, pos in self.defined.items():
+            if name not in self.used and pos is not None: # Stylesheets can be shared by several files
+                out.append((pos[0], pos[1], 'css', f'Class "{name}" is not used'))
+        out.sort()
+        return out
+
+
+def checkHtml(text, folder):
+    """
+    Checks the html text. Relative links are resolved from folder.
+    """
+    checker = HtmlChecker(folder)
+    checker.feed(text)
+    checker.close()
+    return checker.results()
+
+
+def checkHtmlJob(progress, text, folder):
+    """
+    Job function: see checkHtml.
+    """
+    progress(0, 1)
+    return checkHtml(text, folder)
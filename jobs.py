@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright 2021 Wouter Franssen
+
+# This file is part of Disprop.
+#
+# Disprop is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Disprop is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Disprop. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Background jobs for bulk operations.
+
+A job function has the form func(progress, *args). It runs on a worker
+thread and must not touch any widgets. It should call progress(done, total)
+regularly: this reports the progress to the main window and raises
+JobCancelled when the user cancelled the job.
+"""
+
+from PyQt5 import QtCore
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class JobSignals(QtCore.QObject):
+    """
+    The signals of a job. These live in the main thread, so connected
+    slots are called in the main thread.
+    """
+    progress = QtCore.pyqtSignal(int, int)
+    finished = QtCore.pyqtSignal(object)
+    failed = QtCore.pyqtSignal(str)
+    cancelled = QtCore.pyqtSignal()
+
+
+class Job(QtCore.QRunnable):
+
+    def __init__(self, name, func, args=()):
+        super(Job, self).__init__()
+        self.setAutoDelete(False)
+        self.name = name
+        self.func = func
+        self.args = args
+        self.cancelRequested = False
+        self.signals = JobSignals()
+
+    def progress(self, done, total):
+        if self.cancelRequested:
+            raise JobCancelled()
+        self.signals.progress.emit(done, total)
+
+    def run(self):
+        try:
+            result = self.func(self.progress, *self.args)
+        except JobCancelled:
+            self.signals.cancelled.emit()
+        except Exception as e:
+            self.signals.failed.emit(f'{type(e).__name__}: {e}')
+        else:
+            self.signals.finished.emit(result)
+
+
+class JobRunner(QtCore.QObject):
+    """
+    Runs a single job at a time on a worker thread.
+    """
+
+    started = QtCore.pyqtSignal(str)
+    progress = QtCore.pyqtSignal(str, int, int)
+    ended = QtCore.pyqtSignal(str, str) # name, status message
+
+    def __init__(self, parent=None):
+        super(JobRunner, self).__init__(parent)
+        self.pool = QtCore.QThreadPool(self)
+        self.pool.setMaxThreadCount(1)
+        self.job = None
+
+    def busy(self):
+        return self.job is not None
+
+    def start(self, name, func, args=(), onDone=None, onEnd=None):
+        """
+        Starts a job, unless another one is running.
+
+        Parameters
+        ----------
+        name: str, the name shown in the status bar
+        func: the job function, called as func(progress, *args)
+        args [= ()]: tuple, extra arguments of func
+        onDone [= None]: function, called with the result if the job finished
+        onEnd [= None]: function, always called when the job stops (before onDone)
+
+        Returns
+        -------
+        Job, or None if another job is running.
+        """
+        if self.busy():
+            return None
+        job = Job(name, func, args)
+        job.signals.progress.connect(lambda done, total: self.progress.emit(name, done, total))
+        job.signals.finished.connect(lambda result: self._end(job, 'finished', result, onDone, onEnd))
+        job.signals.failed.connect(lambda msg: self._end(job, 'failed: ' + msg, None, None, onEnd))
+        job.signals.cancelled.connect(lambda: self._end(job, 'cancelled', None, None, onEnd))
+        self.job = job
+        self.started.emit(name)
+        self.pool.start(job)
+        return job
+
+    def _end(self, job, status, result, onDone, onEnd):
+        if job.cancelRequested: # Cancelled after the work was done: ignore the result
+            status = 'cancelled'
+            onDone = None
+        self.job = None
+        self.ended.emit(job.name, status)
+        if onEnd is not None:
+            onEnd()
+        if onDone is not None:
+            onDone(result)
+
+    def cancel(self, job=None):
+        """
+        Requests the running job (or only 'job', if given) to stop.
+        """
+        if self.job is not None and (job is None or job is self.job):
+            self.job.cancelRequested = True
+
+    def wait(self):
+        """
+        Blocks until the worker thread is idle, and handles the pending signals.
+        """
+        self.pool.waitForDone()
+        QtCore.QCoreApplication.processEvents()
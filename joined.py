@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright 2021 Wouter Franssen
+
+# This file is part of Disprop.
+#
+# Disprop is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Disprop is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Disprop. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Joining the pages into one text file, and splitting it again.
+
+Each page is written as a '-----File: 001.png---' separator line, the text
+of the page and a newline, so splitting gives the exact page texts back.
+Next to the joined file, an index (the file name + '.idx', JSON) stores per
+page the image, the page file, the hash of the text when it was joined and
+the offset of its separator line. When splitting, a page is only written
+if its text differs from the hash, i.e. if it was edited in the joined
+file.
+
+The offsets map a position in the joined file to its page. They count
+UTF-16 units, like the positions of a Qt document, and they are only
+valid for the file as it was joined: the index stores the (mtime, size)
+of the file, and pageAt gives up when it differs. The editor then finds
+the page by searching back for a separator line.
+"""
+
+import os
+import json
+import bisect
+import hashlib
+import pages
+
+INDEX_VERSION = 3 # 1: offsets in code points, 2: no offsets
+WIDTH = 75 # Length of the separator lines
+
+
+class JoinError(Exception):
+    pass
+
+
+def separator(image):
+    line = f'-----File: {image}---'
+    return line + '-' * max(WIDTH - len(line), 0)
+
+
+def _digest(text):
+    return hashlib.sha1(text.encode()).hexdigest()
+
+
+def _units(text):
+    """
+    Returns the length of text in UTF-16 units.
+    """
+    return len(text) if text.isascii() else len(text.encode('utf-16-le')) // 2
+
+
+def indexPath(path):
+    return path + '.idx'
+
+
+class JoinIndex:
+
+    def __init__(self, entries, folder, stamp=None):
+        """
+        Input
+        -----
+        entries: list of [image, page file (relative to folder), hash, separator offset]
+        folder: string, the folder of the joined file
+        stamp: (mtime, size) of the joined file the offsets belong to (None: no offsets)
+        """
+        self.entries = entries
+        self.folder = folder
+        self.stamp = tuple(stamp) if stamp is not None else None
+        self._seps = [x[3] for x in entries] if stamp is not None else None
+
+    def __len__(self):
+        return len(self.entries)
+
+    def location(self, num):
+        return os.path.normpath(os.path.join(self.folder, self.entries[num][1]))
+
+    def pageAt(self, pos, stamp):
+        """
+        Returns (page number (0-based), image) of a position in the joined
+        file, or None if the offsets do not belong to the file.
+
+        Input
+        -----
+        pos: int, position in UTF-16 units
+        stamp: the current (mtime, size) of the joined file (see pages.stamp)
+        """
+        if not self._seps or tuple(stamp) != self.stamp:
+            return None
+        num = max(bisect.bisect_right(self._seps, pos) - 1, 0)
+        return num, self.entries[num][0]
+
+    def save(self, path):
+        tmp = indexPath(path) + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({'version': INDEX_VERSION, 'stamp': self.stamp, 'pages': self.entries}, f, separators=(',', ':'))
+        os.replace(tmp, indexPath(path))
+
+
+def loadIndex(path):
+    """
+    Returns the JoinIndex of a joined file, or None if it has none.
+
+    Raises
+    ------
+    JoinError if the index is damaged.
+    """
+    if not os.path.exists(indexPath(path)):
+        return None
+    try:
+        with open(indexPath(path), 'r') as f:
+            data = json.load(f)
+        entries = data['pages']
+        stamp = data.get('stamp')
+        if data.get('version') == 1:
+            entries = [[x[0], x[1], x[4], None] for x in entries]
+            stamp = None
+        elif data.get('version') == 2:
+            entries = [x + [None] for x in entries]
+        elif data.get('version') != INDEX_VERSION:
+            raise ValueError(f'unknown version {data.get("version")}')
+        return JoinIndex(entries, os.path.dirname(os.path.abspath(path)), stamp)
+    except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+        raise JoinError(f'{indexPath(path)} is damaged: {e}')
+
+
+def joinPages(progress, locations, outPath):
+    """
+    Job function: writes the pages to one file, and writes its index.
+    The image of a page has the name of the page file, with extension .png.
+
+    Returns
+    -------
+    JoinIndex
+    """
+    folder = os.path.dirname(os.path.abspath(outPath))
+    entries = []
+    pos = 0
+    tmp = outPath + '.tmp'
+    try:
+        with open(tmp, 'w') as out:
+            for num, loc in enumerate(locations):
+                progress(num, len(locations))
+                text = pages.readPage(loc)
+                sep = separator(pages.imageName(loc)) + '\n'
+                entries.append([pages.imageName(loc), os.path.relpath(loc, folder), _digest(text), pos])
+                out.write(sep)
+                out.write(text)
+                out.write('\n')
+                pos += _units(sep) + _units(text) + 1
+        os.replace(tmp, outPath)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    index = JoinIndex(entries, folder, pages.stamp(outPath))
+    index.save(outPath)
+    return index
+
+
+def readJoined(path):
+    """
+    Yields (image, text) of the pages in a joined file, reading one page at a time.
+    Text before the first separator is returned with image None.
+    """
+    def pageText(lines):
+        text = ''.join(lines)
+        return text[:-1] if text.endswith('\n') else text # Without the newline added when joining
+
+    image = None
+    lines = []
+    with open(path, 'r') as f:
+        for line in f:
+            m = pages.SEPARATOR_RE.match(line)
+            if m is None:
+                lines.append(line)
+                continue
+            if image is not None or lines:
+                yield image, pageText(lines)
+            image = m.group(1)
+            lines = []
+    if image is not None or lines:
+        yield image, pageText(lines)
+
+
+def splitFile(progress, path, locations=()):
+    """
+    Job function: writes the pages of a joined file back to the page files.
+    Only pages whose text differs from the index (or, without index, from
+    the page file) are written. Pages that were also changed after joining
+    are not written, but reported.
+
+    Input
+    -----
+    path: string, the joined file
+    locations: list of page files, used to find the pages if there is no index
+
+    Returns
+    -------
+    (list of written page files, list of messages of pages that were not written)
+    """
+    index = loadIndex(path)
+    if index is not None:
+        byImage = {entry[0]: (index.location(num), entry[2], num) for num, entry in enumerate(index.entries)}
+    else:
+        byImage = {pages.imageName(loc): (loc, None, None) for loc in locations}
+    total = max(len(byImage), 1)
+    written = []
+    skipped = []
+    for num, (image, text) in enumerate(readJoined(path)):
+        progress(min(num, total), total)
+        if image is None:
+            if text.strip():
+                skipped.append('Text before the first page separator')
+            continue
+        if image not in byImage:
+            skipped.append(f'{image}: no page file')
+            continue
+        loc, joinedDigest, entryNum = byImage[image]
+        digest = _digest(text)
+        if joinedDigest is not None:
+            if digest == joinedDigest:
+                continue # Not edited in the joined file
+            if not os.path.exists(loc) or _digest(pages.readPage(loc)) != joinedDigest:
+                skipped.append(f'{image}: {os.path.basename(loc)} was also changed after joining')
+                continue
+        elif os.path.exists(loc) and pages.readPage(loc) == text:
+            continue
+        pages.writePage(loc, text)
+        written.append(loc)
+        if index is not None:
+            index.entries[entryNum][2] = digest
+    if index is not None and written:
+        index.save(path)
+    return written, skipped
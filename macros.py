@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright 2021 Wouter Franssen
+
+# This file is part of Disprop.
+#
+# Disprop is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Disprop is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Disprop. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Recordable macros of bulk text operations.
+
+A macro is a list of steps. Each step is a dict with the name of the
+operation ('op') and its parameters. Macros are stored as JSON files.
+Replaying is done by the text editor (multiTextFrame.runMacro).
+"""
+
+import os
+import json
+
+MACRO_VERSION = 1
+
+# Operation --> required parameters
+OPS = {'cleanOCR': ['names'],
+       'delHeaders': ['pages','cleanStart'],
+       'delFooters': ['pages','cleanStart'],
+       'labelEmptyPage': ['label'],
+       'normUni': [],
+       'delEOLHypenWords': ['useDict','useText','otherwise'],
+       'crossPageHyphens': ['useDict','useText','otherwise'],
+       'regexp': ['regexps','pages']}
+
+
+class MacroError(Exception):
+    pass
+
+
+class Macro:
+
+    def __init__(self, steps=None):
+        self.steps = [] if steps is None else steps
+
+    def __len__(self):
+        return len(self.steps)
+
+    def record(self, op, **params):
+        if op not in OPS:
+            raise MacroError(f'Unknown operation {op}')
+        step = {'op': op}
+        step.update(params)
+        self.steps.append(step)
+
+    def describe(self):
+        """
+        Returns a short description of each step.
+        """
+        out = []
+        for step in self.steps:
+            params = [f'{key}={step[key]}' for key in OPS[step['op']] if key != 'pages']
+            if 'pages' in step and step['pages'] is not None:
+                params.append(f'{len(step["pages"])} pages')
+            if step.get('packs'):
+                params.append('packs=' + ', '.join(os.path.basename(x) for x in step['packs']))
+            out.append(step['op'] + ' (' + ', '.join(params) + ')')
+        return out
+
+    def save(self, path):
+        with open(path,'w') as f:
+            json.dump({'version': MACRO_VERSION, 'steps': self.steps}, f, indent=1)
+
+
+def loadMacro(path):
+    """
+    Loads and validates a macro file.
+
+    Raises
+    ------
+    MacroError if the file is not a valid macro.
+    """
+    try:
+        with open(path,'r') as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        raise MacroError(str(e))
+    if not isinstance(data, dict) or data.get('version') != MACRO_VERSION or not isinstance(data.get('steps'), list):
+        raise MacroError(f'{path} is not a version {MACRO_VERSION} macro')
+    for step in data['steps']:
+        if not isinstance(step, dict) or step.get('op') not in OPS:
+            raise MacroError(f'Invalid step: {step}')
+        for key in OPS[step['op']]:
+            if key not in step:
+                raise MacroError(f'Step {step["op"]} misses parameter {key}')
+    return Macro(data['steps'])
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright 2021 Wouter Franssen
+
+# This file is part of Disprop.
+#
+# Disprop is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Disprop is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Disprop. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Index of the DP markers of the pages.
+
+All markers are found with a single regular expression per page. Per page
+the index keeps the markers, the block markers that are not balanced on
+that page, and the (mtime, size) of the file it was made from. The totals
+per kind are updated when a page is indexed again, so refreshing after an
+edit only scans the changed pages.
+"""
+
+import re
+import collections as col
+import pages
+
+# Kind --> (name, pattern)
+KINDS = {'note': ('Proofer note', r'\[\*\*[^\]\n]*\]?'),
+         'star': ('Starred hyphen', r'-\*(?=\s|$)|^\*(?=\w)'),
+         'poetry': ('/* */ block', r'^/\*|^\*/'),
+         'quote': ('/# #/ block', r'^/#|^#/'),
+         'footnote': ('Footnote', r'\[Footnote\b'),
+         'illustration': ('Illustration', r'\[Illustration\b'),
+         'sidenote': ('Sidenote', r'\[Sidenote\b'),
+         'tb': ('Thought break', r'<tb>')}
+UNBALANCED = 'unbalanced'
+
+MARKER_RE = re.compile('|'.join(f'(?P<{kind}>{pattern})' for kind, (name, pattern) in KINDS.items()), re.M)
+BLOCKS = {'/*': '*/', '/#': '#/'} # Opening --> closing marker
+SNIPPET = 40 # Characters of the line shown with a marker
+
+
+def scanPage(text):
+    """
+    Returns the markers of a page.
+
+    Returns
+    -------
+    (list of (line, column, kind, text of the line), 0-based,
+     list of (line, column, message) of the unbalanced block markers)
+    """
+    markers = []
+    problems = []
+    stack = [] # Open blocks: (marker, line, column)
+    line = 0
+    lineStart = 0
+    for m in MARKER_RE.finditer(text):
+        line += text.count('\n', lineStart, m.start())
+        lineStart = text.rfind('\n', 0, m.start()) + 1
+        column = m.start() - lineStart
+        lineEnd = text.find('\n', m.start())
+        markers.append((line, column, m.lastgroup, text[lineStart:lineEnd if lineEnd != -1 else len(text)][:SNIPPET]))
+        marker = m.group()
+        if marker in BLOCKS:
+            if marker == '/*' and stack and stack[-1][0] == '/*':
+                problems.append((line, column, f'/* inside the /* block of line {stack[-1][1] + 1}'))
+            stack.append((marker, line, column))
+        elif marker in BLOCKS.values():
+            if stack and BLOCKS[stack[-1][0]] == marker:
+                stack.pop()
+            elif stack:
+                problems.append((line, column, f'{marker} closes the {stack[-1][0]} of line {stack[-1][1] + 1}'))
+                stack.pop()
+            else:
+                problems.append((line, column, f'{marker} without opening marker'))
+    for marker, line, column in stack:
+        problems.append((line, column, f'{marker} is not closed on this page'))
+    problems.sort()
+    return markers, problems
+
+
+class MarkerIndex:
+
+    def __init__(self, locations):
+        self.locations = locations
+        self.pages = [None] * len(locations) # Per page: ((mtime, size) or None, markers, problems)
+        self.counts = col.Counter() # Kind --> number of markers (UNBALANCED: block problems)
+
+    def setPage(self, pos, markers, problems, stamp=None):
+        """
+        Stores the markers of page pos (0-based), and updates the totals.
+        """
+        old = self.pages[pos]
+        if old is not None:
+            self.counts.subtract(x[2] for x in old[1])
+            self.counts[UNBALANCED] -= len(old[2])
+        self.counts.update(x[2] for x in markers)
+        self.counts[UNBALANCED] += len(problems)
+        self.pages[pos] = (stamp, markers, problems)
+
+    def updatePage(self, pos, text):
+        """
+        Indexes a page of which the text was saved (but maybe not written yet).
+        """
+        self.setPage(pos, *scanPage(text))
+
+    def stale(self):
+        """
+        Returns the positions of the pages whose file changed since they were indexed.
+        """
+        out = []
+        for pos, loc in enumerate(self.locations):
+            entry = self.pages[pos]
+            if entry is None or (entry[0] is not None and entry[0] != pages.stamp(loc)) or \
+               (entry[0] is None and pages.writer.pending(loc) is None):
+                out.append(pos)
+        return out
+
+    def entries(self, kind=None):
+        """
+        Yields (page (0-based), line, column, kind, text) of the markers of a kind
+        (None: all markers, UNBALANCED: the block problems).
+        """
+        for pos, entry in enumerate(self.pages):
+            if entry is None:
+                continue
+            if kind == UNBALANCED:
+                for line, column, msg in entry[2]:
+                    yield pos, line, column, UNBALANCED, msg
+            else:
+                for line, column, markerKind, text in entry[1]:
+                    if kind is None or kind == markerKind:
+                        yield pos, line, column, markerKind, text
+
+
+def scanPages(progress, locations, positions):
+    """
+    Job function: scans the pages at positions.
+
+    Returns
+    -------
+    list of (position, (mtime, size), markers, problems)
+    """
+    out = []
+    for num, pos in enumerate(positions):
+        if num % 50 == 0:
+            progress(num, len(positions))
+        stamp = pages.stamp(locations[pos])
+        out.append((pos, stamp) + scanPage(pages.readPage(locations[pos])))
+    return out
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright 2021 Wouter Franssen
+
+# This file is part of Disprop.
+#
+# Disprop is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Disprop is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Disprop. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Structural outline of an HTML document.
+
+The index lists the headings, chapter divs, footnotes, illustrations and
+tables, with their line. An element (and the text used for its title) may
+span at most LOOKAHEAD lines. After an edit, only the changed lines and
+the LOOKAHEAD lines before them are scanned again; the entries after them
+only move.
+"""
+
+import re
+import html
+
+LOOKAHEAD = 20 # Lines an element may span
+
+ELEMENT_RE = re.compile(r'<(h[1-6]|div|table|figure)\b([^<>]*)>', re.I)
+CLASS_RE = re.compile(r'\bclass\s*=\s*["\']([^"\']*)', re.I)
+ID_RE = re.compile(r'\bid\s*=\s*["\']([^"\']*)', re.I)
+ALT_RE = re.compile(r'<img\b[^>]*\balt\s*=\s*["\']([^"\']*)', re.I)
+CAPTION_RE = re.compile(r'<caption\b[^>]*>(.*?)</caption', re.I | re.S)
+SUMMARY_RE = re.compile(r'\bsummary\s*=\s*["\']([^"\']*)', re.I)
+TAG_RE = re.compile(r'<[^>]*>')
+TITLELENGTH = 80
+LEAF = 7 # Level of the entries that are not headings or chapters
+
+# Kind --> (level in the outline, CSS selector of the elements of that kind)
+KINDS = {'chapter': (0, 'div.chapter'),
+         'footnote': (LEAF, 'div.footnote'),
+         'illustration': (LEAF, 'div[class^="fig"], div[class*=" fig"], figure'),
+         'table': (LEAF, 'table')}
+
+
+class Entry:
+
+    __slots__ = ('line', 'kind', 'level', 'title', 'ident')
+
+    def __init__(self, line, kind, level, title, ident):
+        self.line = line
+        self.kind = kind
+        self.level = level
+        self.title = title
+        self.ident = ident
+
+    def label(self):
+        if self.kind == 'heading':
+            return self.title
+        label = self.kind.capitalize()
+        if self.title:
+            return f'{label}: {self.title}'
+        return f'{label} ({self.ident})' if self.ident else label
+
+    def selector(self):
+        if self.kind == 'heading':
+            return f'h{self.level}'
+        return KINDS[self.kind][1]
+
+    def key(self):
+        return (self.kind, self.level, self.title, self.ident)
+
+
+def _clean(text):
+    text = ' '.join(html.unescape(TAG_RE.sub(' ', text)).split())
+    return text if len(text) <= TITLELENGTH else text[:TITLELENGTH - 3] + '...'
+
+
+def _window(text, start):
+    """
+    Returns the end of the LOOKAHEAD lines that start at offset start.
+    """
+    end = start
+    for _ in range(LOOKAHEAD):
+        end = text.find('\n', end + 1)
+        if end == -1:
+            return len(text)
+    return end
+
+
+def _classify(m, text):
+    """
+    Returns (kind, level, title) of an element, or None if it is not part of the outline.
+    """
+    tag = m.group(1).lower()
+    attrs = m.group(2)
+    end = _window(text, m.start())
+    if tag[0] == 'h':
+        close = text.find('</' + tag, m.end(), end)
+        if close == -1:
+            close = text.find('</' + m.group(1), m.end(), end)
+            if close == -1:
+                return None
+        return 'heading', int(tag[1]), _clean(text[m.end():close]) or tag
+    if tag == 'table':
+        body = text[m.end():end]
+        caption = CAPTION_RE.search(body)
+        summary = SUMMARY_RE.search(attrs)
+        title = _clean(caption.group(1)) if caption else (summary.group(1) if summary else '')
+        return 'table', KINDS['table'][0], title
+    if tag == 'div':
+        classes = CLASS_RE.search(attrs)
+        classes = classes.group(1).split() if classes else []
+        if 'chapter' in classes:
+            return 'chapter', KINDS['chapter'][0], ''
+        if 'footnote' in classes:
+            return 'footnote', KINDS['footnote'][0], _clean(text[m.end():text.find('</div', m.end(), end)])
+        if not any(x.startswith('fig') for x in classes):
+            return None
+    alt = ALT_RE.search(text, m.end(), end)
+    return 'illustration', KINDS['illustration'][0], alt.group(1).strip() if alt else ''
+
+
+def scan(text, firstLine=0, lastLine=None):
+    """
+    Returns the entries of the elements in text that start at a line up to lastLine.
+
+    Input
+    -----
+    text: string, lines firstLine... of the document
+    firstLine: int, the line number of the first line of text
+    lastLine: int, the last line that is scanned (None: all lines)
+    """
+    entries = []
+    line = firstLine
+    pos = 0
+    for m in ELEMENT_RE.finditer(text):
+        line += text.count('\n', pos, m.start())
+        pos = m.start()
+        if lastLine is not None and line > lastLine:
+            break
+        kind = _classify(m, text)
+        if kind is None:
+            continue
+        ident = ID_RE.search(m.group(2))
+        entries.append(Entry(line, kind[0], kind[1], kind[2], ident.group(1) if ident else None))
+    return entries
+
+
+class OutlineIndex:
+
+    def __init__(self):
+        self.entries = []
+        self.lineCount = 0
+
+    def build(self, text):
+        self.entries = scan(text)
+        self.lineCount = text.count('\n') + 1
+
+    def update(self, lineText, lineCount, first, last):
+        """
+        Updates the index after an edit.
+
+        Input
+        -----
+        lineText: function, returns the text of a line (0-based)
+        lineCount: int, the number of lines after the edit
+        first, last: int, the first and last changed line, after the edit
+
+        Returns
+        -------
+        bool: True if entries were added, removed or changed. If the entries
+              only moved, the Entry objects are kept.
+        """
+        delta = lineCount - self.lineCount
+        self.lineCount = lineCount
+        start = max(first - LOOKAHEAD, 0)
+        oldLast = last - delta
+        before = [x for x in self.entries if x.line < start]
+        old = [x for x in self.entries if start <= x.line <= oldLast]
+        after = [x for x in self.entries if x.line > oldLast]
+        for entry in after:
+            entry.line += delta
+        text = '\n'.join(lineText(num) for num in range(start, min(last + LOOKAHEAD, lineCount - 1) + 1))
+        new = scan(text, start, last)
+        changed = [x.key() for x in old] != [x.key() for x in new]
+        if not changed:
+            for entry, moved in zip(old, new):
+                entry.line = moved.line
+            new = old
+        self.entries = before + new + after
+        return changed
+
+    def ordinal(self, entry):
+        """
+        Returns the number of earlier entries with the same CSS selector.
+        """
+        selector = entry.selector()
+        num = 0
+        for other in self.entries:
+            if other is entry:
+                return num
+            if other.selector() == selector:
+                num += 1
+        return num
@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright 2021 Wouter Franssen
+
+# This file is part of Disprop.
+#
+# Disprop is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Disprop is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Disprop. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Cached access to the page files.
+
+The texts of the pages that were read or written last are kept in memory,
+at most BUDGET characters in total (least recently used pages are dropped
+first). A cached text is used as long as the modification time and size
+of the file do not change, so files edited by other programs are read
+again.
+
+Edits from the text editor are written behind by a background thread
+(scheduleWrite). Writes to the same page are coalesced, and readPage
+returns the pending text of a page that is not written yet.
+"""
+
+import os
+import re
+import time
+import locale
+import threading
+import collections as col
+
+DELAY = 1.0 # Seconds a scheduled write waits for further edits
+SEPARATOR_RE = re.compile(r'-----File: (\S+?\.\w+)-') # Page separator line of joined text files, group 1 is the image
+
+TAIL = 4096 # Bytes read from the end of a file to find its last line
+BUDGET = 2000000 # Characters of page text kept in the cache
+_cache = col.OrderedDict() # location --> ((mtime, size), text), least recently used first
+_cacheSize = 0 # Characters in _cache
+_cacheLock = threading.Lock() # Pages are also read by jobs and written by the writer thread
+_edges = dict() # location --> ((mtime, size), (first line, last line))
+
+
+def _stamp(loc):
+    st = os.stat(loc)
+    return (st.st_mtime_ns, st.st_size)
+
+
+def _cacheGet(loc):
+    with _cacheLock:
+        entry = _cache.get(loc)
+        if entry is not None:
+            _cache.move_to_end(loc)
+        return entry
+
+
+def _cachePut(loc, stamp, text):
+    global _cacheSize
+    with _cacheLock:
+        old = _cache.pop(loc, None)
+        if old is not None:
+            _cacheSize -= len(old[1])
+        _cache[loc] = (stamp, text)
+        _cacheSize += len(text)
+        while _cacheSize > BUDGET and len(_cache) > 1:
+            _cacheSize -= len(_cache.popitem(last=False)[1][1])
+
+
+def stamp(loc):
+    """
+    Returns the (mtime, size) of a page file, which changes when it is written.
+    """
+    return _stamp(loc)
+
+
+def readPage(loc):
+    """
+    Returns the text of a page file.
+    """
+    pending = writer.pending(loc)
+    if pending is not None:
+        return pending
+    entry = _cacheGet(loc)
+    stamp = _stamp(loc)
+    if entry is not None and entry[0] == stamp:
+        return entry[1]
+    with open(loc,'r') as f:
+        text = f.read()
+    _cachePut(loc, stamp, text)
+    return text
+
+
+def writePage(loc, text):
+    """
+    Writes the text of a page file, and updates the cache.
+    A pending write of the page is dropped.
+    """
+    writer.cancel(loc)
+    with open(loc,'w') as f:
+        f.write(text)
+    _cachePut(loc, _stamp(loc), text)
+
+
+def _textEdges(text):
+    lines = text.splitlines()
+    if len(lines) == 0:
+        return (None, None)
+    return (lines[0], lines[-1])
+
+
+def edgeLines(loc):
+    """
+    Returns (first line, last line) of a page file, or (None, None) if it
+    is empty. Only the start and the end of the file are read, and the
+    result is kept as long as the file does not change.
+    """
+    pending = writer.pending(loc)
+    if pending is not None:
+        return _textEdges(pending)
+    stamp = _stamp(loc)
+    entry = _cacheGet(loc)
+    if entry is not None and entry[0] == stamp:
+        return _textEdges(entry[1])
+    entry = _edges.get(loc)
+    if entry is not None and entry[0] == stamp:
+        return entry[1]
+    encoding = locale.getpreferredencoding(False)
+    with open(loc,'rb') as f:
+        first = f.readline()
+        f.seek(max(stamp[1] - TAIL, 0))
+        tail = f.read()
+    if len(tail) < stamp[1] and b'\n' not in tail.rstrip(b'\r\n'):
+        edges = _textEdges(readPage(loc)) # Last line longer than TAIL
+    else:
+        start = tail.find(b'\n') + 1 if len(tail) < stamp[1] else 0 # Skip a partial line (or character)
+        lines = tail[start:].decode(encoding, errors='replace').splitlines()
+        firstLines = first.decode(encoding, errors='replace').splitlines()
+        edges = (firstLines[0], lines[-1]) if firstLines and lines else _textEdges(readPage(loc))
+    _edges[loc] = (stamp, edges)
+    return edges
+
+
+def imageName(loc):
+    """
+    Returns the name of the image of a page file: its name with extension .png.
+    """
+    return os.path.splitext(os.path.basename(loc))[0] + '.png'
+
+
+def forget(loc=None):
+    """
+    Removes a page (or all pages if loc is None) from the cache.
+    """
+    global _cacheSize
+    with _cacheLock:
+        if loc is None:
+            _cache.clear()
+            _cacheSize = 0
+        else:
+            entry = _cache.pop(loc, None)
+            if entry is not None:
+                _cacheSize -= len(entry[1])
+    if loc is None:
+        _edges.clear()
+    else:
+        _edges.pop(loc, None)
+
+
+class PageWriter:
+    """
+    Writes pages on a background thread. A scheduled page is written after
+    'delay' seconds, unless it is scheduled again before that: only the
+    last text is written.
+    """
+
+    def __init__(self, delay=DELAY):
+        self.delay = delay
+        self._pending = dict() # location --> [text, due time]
+        self._writing = dict() # location --> text, pages that are being written
+        self._errors = []
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def schedule(self, loc, text, delay=None):
+        with self._cond:
+            self._pending[loc] = [text, time.monotonic() + (self.delay if delay is None else delay)]
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='PageWriter', daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+
+    def pending(self, loc):
+        with self._cond:
+            entry = self._pending.get(loc)
+            return self._writing.get(loc) if entry is None else entry[0]
+
+    def cancel(self, loc):
+        with self._cond:
+            self._pending.pop(loc, None)
+
+    def flush(self, wait=True):
+        """
+        Writes all pending pages now. If wait is True, this blocks until they are written.
+
+        Returns
+        -------
+        list of str: the errors of failed writes since the last flush (only if wait is True)
+        """
+        with self._cond:
+            for entry in self._pending.values():
+                entry[1] = 0
+            self._cond.notify_all()
+            if not wait:
+                return []
+            while self._pending or self._writing:
+                self._cond.wait()
+            errors = self._errors
+            self._errors = []
+        return errors
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    now = time.monotonic()
+                    due = [loc for loc, entry in self._pending.items() if entry[1] <= now]
+                    if due:
+                        break
+                    if self._pending:
+                        self._cond.wait(min(entry[1] for entry in self._pending.values()) - now)
+                    else:
+                        self._cond.wait()
+                for loc in due:
+                    self._writing[loc] = self._pending.pop(loc)[0]
+                items = list(self._writing.items())
+            errors = []
+            try:
+                for loc, text in items:
+                    try:
+                        with open(loc,'w') as f:
+                            f.write(text)
+                        _cachePut(loc, _stamp(loc), text)
+                    except Exception as e: # E.g. UnicodeEncodeError; the thread must not die
+                        errors.append(f'{loc}: {e}')
+            finally:
+                with self._cond:
+                    self._errors += errors
+                    self._writing.clear()
+                    self._cond.notify_all()
+
+
+writer = PageWriter()
+
+
+def scheduleWrite(loc, text):
+    writer.schedule(loc, text)
+
+
+def flush(wait=True):
+    return writer.flush(wait)
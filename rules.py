@@ -0,0 +1,456 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright 2021 Wouter Franssen
+
+# This file is part of Disprop.
+#
+# Disprop is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Disprop is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Disprop. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Regular expression rule sets, as used by Clean OCR.
+
+A rule is a list [regexp, replacement, name]. The regexp is a string or a
+compiled pattern, and the name identifies the option the rule belongs to.
+Several rules can share a name.
+
+Besides the built-in Clean OCR rules, rule packs can be loaded from files.
+A JSON pack looks like:
+
+    {"version": 1, "name": "shop", "rules": [
+        {"id": "dblcomma", "pattern": ",,", "replacement": ",",
+         "flags": "", "languages": ["en"]}]}
+
+A text pack has the header line '#rulepack 1 <name>' and then one rule per
+line, with tab separated fields: id, pattern, replacement, flags and
+languages (comma separated). Empty lines and lines starting with '#' are
+ignored. Flags are given as the letters of the Python inline flags (aimsux).
+Rules without languages apply to all languages.
+"""
+
+import os
+import re
+import time
+import csv
+import json
+import multiprocessing as mp
+import pages
+
+SNIPPETS = 3   # Number of before/after examples kept per rule
+CONTEXT = 25   # Number of characters shown around a match
+SLOWPAGE = 0.05 # Time (s) of a rule on a single page above which it is marked as slow
+PACK_VERSION = 1
+PACK_FLAGS = {'a': re.ASCII, 'i': re.IGNORECASE, 'm': re.MULTILINE, 's': re.DOTALL, 'u': re.UNICODE, 'x': re.VERBOSE}
+
+_packCache = dict() # (path, mtime) --> RulePack
+
+
+def cleanOCRRegexps(nameslist):
+    """
+    Returns the list of [regexp, replacement, option name] of the Clean OCR options in nameslist.
+    """
+    RegExps = [] #Start of ther reagexp list.
+
+
+    if 'formfeed' in nameslist:
+        RegExps.append(['\f','','formfeed']) #Remove form feed character
+    if 'tabtospace' in nameslist:
+        RegExps.append(['\t',' ','tabtospace']) #Tab to white space
+
+    if 'multiwhite' in nameslist:
+        RegExps.append([' +',' ','multiwhite']) #Replace multiple white spaces with one
+    if 'fixscolon' in nameslist:
+        RegExps.append([' +;',';','fixscolon']) #Remove white spaces before semi-colon
+    if 'fixcolon' in nameslist:
+        RegExps.append([' +:',':','fixcolon']) #Remove white spaces before colon
+    if 'fixexlam' in nameslist:
+        RegExps.append([' +!','!','fixexlam']) #Remove white spaces before exclamation mark
+    if 'fixquestion' in nameslist:
+        RegExps.append([' +\?','?','fixquestion']) #Remove white spaces before question mark
+    if 'fixperiod' in nameslist:
+        RegExps.append([' +\.','.','fixperiod']) #Remove white spaces before period
+    if 'fixcomma' in nameslist:
+        RegExps.append([' +,',',','fixcomma']) #Remove white spaces before comma
+
+
+    if 'underscoreconv' in nameslist:
+        RegExps.append(['_','-','underscoreconv']) #Replace underscore with dash
+    if 'emdashconv' in nameslist:
+        RegExps.append(['—','--','emdashconv']) #Replace em-dash with --
+    if 'emspace' in nameslist:
+        RegExps.append([' *-- *','--','emspace']) #Remove white spaces around double-dash
+    if 'emdashEOL' in nameslist:
+        RegExps.append(['--\n(\S+) *','--\g<1>\n' ,'emdashEOL']) #Combine em-dash at EOL.
+    if 'emdashSOL' in nameslist:
+        RegExps.append(['(\S)\n--(\S+) *','\g<1>--\g<2>\n' ,'emdashSOL']) #Combine em-dash at SOL.
+
+    if 'curlysingle' in nameslist:
+        RegExps.append(['[’‘]',"'",'curlysingle']) #Convert curly single quotes to the easy one
+    if 'stodquote' in nameslist:
+        RegExps.append(["''",'"','stodquote']) #Convert two single apostrophe signs to a double apostrophe
+
+    #Correct white space around quotes
+    if 'curlyquotespace' in nameslist:
+        RegExps.append([' +”','”','curlyquotespace'])
+        RegExps.append(['“ +','“','curlyquotespace']) 
+
+    if 'guillespace1' in nameslist:
+        RegExps.append([' +»','»','guillespace1'])
+        RegExps.append(['« +','«','guillespace1']) 
+    if 'guillespace2' in nameslist:
+        RegExps.append([' +«','«','guillespace2'])
+        RegExps.append(['» +','»','guillespace2']) 
+    if 'quilletoquote' in nameslist:
+        RegExps.append(['[«»]','"','quilletoquote']) #Convert some other signs to quote marks
+
+    if 'curlydouble' in nameslist:
+        RegExps.append(['[”“]','"','curlydouble']) #Convert curly quotes to straight
+
+    #Dutch lower quote conversions
+    if 'lowdquote' in nameslist:
+        RegExps.append(['„','"','lowdquote'])
+    if 'lowsquote' in nameslist:
+        RegExps.append(['‚',"'",'lowsquote'])
+
+
+    if 'bracesconv' in nameslist:
+        RegExps.append(['{','(','bracesconv'])
+        RegExps.append(['}',')','bracesconv'])
+
+    if 'commapara' in nameslist:
+        RegExps.append([',\n\n','.\n\n','commapara'])
+    
+    if 'fixopenbrack' in nameslist:
+        RegExps.append(['\( +','(','fixopenbrack']) #Remove spaces after opening brackets
+    if 'fixclosebrack' in nameslist:
+        RegExps.append([' +\)',')','fixclosebrack']) #Remove spaces before closing brackets
+    if 'commatoquote' in nameslist:
+        RegExps.append([',,','"','commatoquote']) #Convert double comma to double quote
+    if 'convellip' in nameslist:
+        RegExps.append(['…',"...",'convellip']) #Convert ellipsis
+
+
+    if 'ijligature' in nameslist:
+        RegExps.append(['ĳ',"ij",'ijligature']) #Convert ij ligature
+        RegExps.append(['Ĳ',"IJ",'ijligature']) #Convert IJ ligature
+    if 'greekTPK' in nameslist:
+        RegExps.append(['[͵᾿᾽΄̓͂]',"'",'greekTPK']) # convert Tonos Psili and Koronis to single quote
+    if 'greekTheta' in nameslist:
+        RegExps.append(['ϑ',"θ",'greekTheta']) #Normalize theta symbol to normal theta
+        RegExps.append(['ϴ',"Θ",'greekTheta']) #Normalize theta symbol to normal thet
+
+
+    if 'leadingwhite' in nameslist:
+        RegExps.append([re.compile('^ +',re.MULTILINE),'','leadingwhite']) #Leading whitespaces
+    if 'trailingwhite' in nameslist:
+        RegExps.append([re.compile(' +$',re.MULTILINE),'','trailingwhite']) #End whitespaces
+
+    if 'multilines' in nameslist:
+        RegExps.append(['\n\n+','\n\n','multilines']) #Convert >1 empty line to 1 empty line
+    if 'startlines' in nameslist:
+        RegExps.append(['^\n+','','startlines']) #Remove starting white lines
+    if 'endlines' in nameslist:
+        RegExps.append(['\n+$','','endlines']) #Remove ending white lines
+
+    #Some guiprep things for quotes and spaces
+    #      $line =~ s/^" /"/;  # start of line doublequote	      
+    #      $line =~ s/ "$/"/;  #  end of line doublequote
+    #      $line =~s/\s"-/"-/g;
+    #      $line =~s/the\s"\s/the\s"/g;
+    #      $line =~s/([.,!]) (["'] )/$1$2/g;      # punctuation, space, quote, space
+    return RegExps
+
+
+def regexpText(text, regexps):
+    for elem in regexps:
+        text = re.sub(elem[0],elem[1],text)
+    return text
+
+
+class RulePackError(Exception):
+    pass
+
+
+class RulePack:
+    """
+    A validated rule pack. The rules are compiled once, and each rule gets
+    the name '<pack name>:<rule id>'.
+    """
+
+    def __init__(self, name, rules, path=None):
+        self.name = name
+        self.path = path
+        self.rules = [] # [compiled pattern, replacement, name, languages]
+        ids = set()
+        for num, rule in enumerate(rules):
+            where = f'{name}, rule {num + 1}'
+            if not isinstance(rule, dict):
+                raise RulePackError(f'{where}: not a rule')
+            ruleId = rule.get('id')
+            if not isinstance(ruleId, str) or len(ruleId) == 0:
+                raise RulePackError(f'{where}: missing id')
+            if ruleId in ids:
+                raise RulePackError(f'{where}: duplicate id {ruleId}')
+            ids.add(ruleId)
+            pattern = rule.get('pattern')
+            repl = rule.get('replacement', '')
+            flagText = rule.get('flags', '')
+            languages = rule.get('languages', [])
+            if not isinstance(pattern, str) or len(pattern) == 0 or not isinstance(repl, str):
+                raise RulePackError(f'{where} ({ruleId}): pattern and replacement must be text')
+            if not isinstance(flagText, str) or any(x not in PACK_FLAGS for x in flagText):
+                raise RulePackError(f'{where} ({ruleId}): invalid flags {flagText}')
+            if not isinstance(languages, list) or not all(isinstance(x, str) for x in languages):
+                raise RulePackError(f'{where} ({ruleId}): languages must be a list of text')
+            flags = 0
+            for letter in flagText:
+                flags |= PACK_FLAGS[letter]
+            try:
+                compiled = re.compile(pattern, flags)
+                compiled.sub(repl, '') # Checks the group references of the replacement
+            except re.error as e:
+                raise RulePackError(f'{where} ({ruleId}): {e}')
+            self.rules.append([compiled, repl, f'{name}:{ruleId}', languages])
+
+    def names(self, language=None):
+        """
+        Returns the rule names, optionally only those that apply to a language.
+        """
+        return [x[2] for x in self.rules if language is None or not x[3] or language in x[3]]
+
+    def regexps(self, nameslist):
+        """
+        Returns the list of [regexp, replacement, name] of the rules in nameslist.
+        """
+        return [x[:3] for x in self.rules if x[2] in nameslist]
+
+
+def _parseTextPack(text, path):
+    lines = text.splitlines()
+    header = lines[0].split(None, 2) if lines else []
+    if len(header) < 2 or header[0] != '#rulepack':
+        raise RulePackError(f'{path}: missing #rulepack header')
+    version = header[1]
+    name = header[2].strip() if len(header) > 2 else os.path.splitext(os.path.basename(path))[0]
+    rules = []
+    for line in lines[1:]:
+        if len(line.strip()) == 0 or line.startswith('#'):
+            continue
+        fields = line.split('\t')
+        if len(fields) < 2:
+            raise RulePackError(f'{path}: invalid line {line}')
+        fields += [''] * (5 - len(fields))
+        languages = [x.strip() for x in fields[4].split(',') if x.strip()]
+        rules.append({'id': fields[0], 'pattern': fields[1], 'replacement': fields[2],
+                      'flags': fields[3].strip(), 'languages': languages})
+    return {'version': int(version) if version.isdigit() else version, 'name': name, 'rules': rules}
+
+
+def loadPack(path):
+    """
+    Loads and validates a rule pack (JSON or text). Packs are compiled once
+    and cached until the file changes.
+
+    Raises
+    ------
+    RulePackError if the file is not a valid rule pack.
+    """
+    try:
+        key = (path, os.path.getmtime(path))
+        if key in _packCache:
+            return _packCache[key]
+        with open(path,'r') as f:
+            text = f.read()
+    except OSError as e:
+        raise RulePackError(str(e))
+    if path.endswith('.json'):
+        try:
+            data = json.loads(text)
+        except ValueError as e:
+            raise RulePackError(f'{path}: {e}')
+        if not isinstance(data, dict):
+            raise RulePackError(f'{path} is not a rule pack')
+    else:
+        data = _parseTextPack(text, path)
+    if data.get('version') != PACK_VERSION:
+        raise RulePackError(f'{path} is not a version {PACK_VERSION} rule pack')
+    name = data.get('name') or os.path.splitext(os.path.basename(path))[0]
+    if not isinstance(data.get('rules'), list):
+        raise RulePackError(f'{path} has no list of rules')
+    _packCache[key] = RulePack(name, data['rules'], path)
+    return _packCache[key]
+
+
+def packRegexps(paths, nameslist):
+    """
+    Returns the rules of the packs at paths that are in nameslist, in pack order.
+    """
+    out = []
+    for path in paths:
+        out += loadPack(path).regexps(nameslist)
+    return out
+
+
+class RuleProfile:
+    """
+    Applies rules like regexpText, and records for each rule and page the
+    wall time, the number of matches and the number of bytes changed
+    (bytes of the matched text plus bytes of the replacement).
+    The rules are applied one after another, so the timing of a rule
+    includes the effect of the rules before it. The bytes are counted
+    during the substitution, so they are part of the timing.
+    """
+
+    FIELDS = ['rule','option','page','time','matches','bytes']
+
+    def __init__(self, rules, pageNames):
+        self.rules = [(re.compile(x[0]), x[1], x[2] if len(x) > 2 and isinstance(x[2], str) else '') for x in rules]
+        self.pageNames = pageNames
+        self.records = [] # (rule index, page index, time, matches, bytes)
+
+    def apply(self, pos, text):
+        for num, (pattern, repl, name) in enumerate(self.rules):
+            changed = 0
+            def replace(m, repl=repl, literal='\\' not in repl):
+                # Counts the bytes in the same pass as the substitution
+                nonlocal changed
+                out = repl if literal else m.expand(repl)
+                changed += len(m.group().encode()) + len(out.encode())
+                return out
+            start = time.perf_counter()
+            text, count = pattern.subn(replace, text)
+            elapsed = time.perf_counter() - start
+            self.records.append((num, pos, elapsed, count, changed))
+        return text
+
+    def summary(self):
+        """
+        Returns a list with per rule a dict with the totals over all pages,
+        the slowest page, and the flags 'slow' and 'unused'.
+        """
+        out = []
+        for pattern, repl, name in self.rules:
+            out.append({'rule': pattern.pattern, 'option': name, 'time': 0.0, 'maxTime': 0.0,
+                        'slowestPage': None, 'matches': 0, 'bytes': 0, 'pages': 0})
+        for num, pos, elapsed, count, changed in self.records:
+            elem = out[num]
+            elem['time'] += elapsed
+            elem['matches'] += count
+            elem['bytes'] += changed
+            if count:
+                elem['pages'] += 1
+            if elapsed >= elem['maxTime']:
+                elem['maxTime'] = elapsed
+                elem['slowestPage'] = self.pageNames[pos]
+        for elem in out:
+            elem['slow'] = elem['maxTime'] >= SLOWPAGE
+            elem['unused'] = elem['matches'] == 0
+        return out
+
+    def rows(self):
+        for num, pos, elapsed, count, changed in self.records:
+            pattern, repl, name = self.rules[num]
+            yield [pattern.pattern, name, self.pageNames[pos], elapsed, count, changed]
+
+    def saveCSV(self, path):
+        """
+        Writes a row per rule per page.
+        """
+        with open(path,'w',newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(self.FIELDS)
+            writer.writerows(self.rows())
+
+    def saveJSON(self, path):
+        data = {'rules': self.summary(), 'pages': [dict(zip(self.FIELDS, x)) for x in self.rows()]}
+        with open(path,'w') as f:
+            json.dump(data, f, indent=1)
+
+
+def _snippet(text, m, repl):
+    """
+    Returns the text around a match, before and after replacement.
+    """
+    start = max(m.start() - CONTEXT, 0)
+    end = min(m.end() + CONTEXT, len(text))
+    before = text[start:end]
+    after = text[start:m.start()] + m.expand(repl) + text[m.end():end]
+    return before.replace('\n','⏎'), after.replace('\n','⏎')
+
+
+def countRules(texts, rules):
+    """
+    Counts the matches of each rule, without doing any replacement.
+    Each rule is tested on the unchanged text.
+
+    Parameters
+    ----------
+    texts: list of (page index, text)
+    rules: list of [regexp, replacement, name]
+
+    Returns
+    -------
+    dict, name --> [number of matches, list of page indices, list of (before, after) snippets]
+    """
+    compiled = [(re.compile(x[0]), x[1], x[2]) for x in rules]
+    out = dict()
+    for name in set(x[2] for x in rules):
+        out[name] = [0, [], []]
+    for pos, text in texts:
+        for pattern, repl, name in compiled:
+            result = out[name]
+            count = 0
+            for m in pattern.finditer(text):
+                count += 1
+                if len(result[2]) < SNIPPETS:
+                    result[2].append(_snippet(text, m, repl))
+            if count:
+                result[0] += count
+                if len(result[1]) == 0 or result[1][-1] != pos:
+                    result[1].append(pos)
+    return out
+
+
+def _countChunk(args):
+    return countRules(*args)
+
+
+def previewRules(progress, locations, rules):
+    """
+    Job function: counts the matches of each rule on the page files (see
+    countRules), without changing them. Large sets of pages are divided
+    over a process pool. The page indices in the result refer to 'locations'.
+    """
+    texts = []
+    for pos, loc in enumerate(locations):
+        if pos % 50 == 0:
+            progress(0, 1)
+        texts.append((pos, pages.readPage(loc)))
+    if len(texts) < 50 or len(rules) < 2:
+        progress(0, 1)
+        return countRules(texts, rules)
+    processes = max(mp.cpu_count()-1,1)
+    size = max(len(texts) // (4 * processes), 1)
+    chunks = [(texts[x:x + size], rules) for x in range(0, len(texts), size)]
+    out = dict()
+    with mp.get_context('spawn').Pool(processes) as p: # Not forked from the job thread
+        for num, result in enumerate(p.imap(_countChunk, chunks)):
+            progress(num, len(chunks))
+            for name, val in result.items():
+                if name not in out:
+                    out[name] = [0, [], []]
+                out[name][0] += val[0]
+                out[name][1] += val[1]
+                out[name][2] = (out[name][2] + val[2])[:SNIPPETS]
+    return out
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright 2021 Wouter Franssen
+
+# This file is part of Disprop.
+#
+# Disprop is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Disprop is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Disprop. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Detection of OCR scannos based on a confusion table.
+
+A confusion table has two sections. Under [words], each line holds a
+scanno and its correction as whole words (e.g. 'tbe the'). Under [letters],
+each line holds two letter groups that OCR confuses in both directions
+(e.g. 'rn m'). Lines starting with # are comments.
+"""
+
+import os.path
+import collections as col
+
+DEFAULT_TABLE = """
+[words]
+tbe the
+tlie the
+tne the
+arid and
+aud and
+modem modern
+hut but
+tbat that
+tliat that
+wbich which
+wliich which
+tbis this
+tliis this
+bim him
+liim him
+liis his
+wbo who
+wben when
+wliat what
+fiom from
+iu in
+ot of
+cf of
+[letters]
+rn m
+cl d
+li h
+vv w
+ii u
+"""
+
+_tableCache = dict()
+
+
+class ConfusionTable:
+    """
+    A parsed confusion table.
+
+    Attributes
+    ----------
+    words: dict, scanno --> set of corrections (whole words)
+    letters: list of (str, str), letter groups that are confused in both directions
+    """
+
+    def __init__(self, text):
+        self.words = col.defaultdict(set)
+        self.letters = []
+        section = 'words'
+        for line in text.splitlines():
+            line = line.strip()
+            if len(line) == 0 or line.startswith('#'):
+                continue
+            if line.startswith('[') and line.endswith(']'):
+                section = line[1:-1].strip().lower()
+                continue
+            parts = line.split()
+            if len(parts) != 2 or parts[0] == parts[1]:
+                continue
+            if section == 'words':
+                self.words[parts[0]].add(parts[1])
+                # Also add the capitalized versions (sentence starts)
+                self.words[parts[0].capitalize()].add(parts[1].capitalize())
+            elif section == 'letters':
+                self.letters.append((parts[0],parts[1]))
+
+
+def loadTable(path=None):
+    """
+    Returns the parsed confusion table of a file, or the default table if path is None.
+    Tables are parsed once and cached until the file changes.
+    """
+    if path is None:
+        key = None
+    else:
+        key = (path, os.path.getmtime(path))
+    if key not in _tableCache:
+        if path is None:
+            text = DEFAULT_TABLE
+        else:
+            with open(path,'r') as f:
+                text = f.read()
+        _tableCache[key] = ConfusionTable(text)
+    return _tableCache[key]
+
+
+def _variants(word, old, new):
+    """
+    Yields all versions of word where a single occurrence of old is replaced by new.
+    """
+    pos = word.find(old)
+    while pos != -1:
+        yield word[:pos] + new + word[pos + len(old):]
+        pos = word.find(old, pos + 1)
+
+
+def expandCandidates(words, table):
+    """
+    Expands a confusion table against the words of a book.
+
+    Parameters
+    ----------
+    words: Counter, the word index of the book
+    table: ConfusionTable
+
+    Returns
+    -------
+    dict, possible scanno --> set of corrections
+    """
+    candidates = col.defaultdict(set)
+    for wrong, rights in table.words.items():
+        candidates[wrong].update(rights)
+    # For each real word, all forms that OCR could have made of it
+    for word in words:
+        for a, b in table.letters:
+            for variant in _variants(word, a, b):
+                candidates[variant].add(word)
+            for variant in _variants(word, b, a):
+                candidates[variant].add(word)
+    return candidates
+
+
+def findScannos(words, table, minRatio=1.0):
+    """
+    Finds possible scannos in a book.
+
+    Parameters
+    ----------
+    words: Counter, the word index of the book
+    table: ConfusionTable
+    minRatio [= 1.0]: float, letter group hits are only reported if the corrected
+                      form is at least this many times more common than the scanno.
+
+    Returns
+    -------
+    List of (scanno, count, correction, correction count, ratio), sorted on
+    descending ratio.
+    """
+    candidates = expandCandidates(words, table)
+    hits = []
+    for word, count in words.items():
+        if word not in candidates:
+            continue
+        for correct in candidates[word]:
+            ratio = words[correct] / count
+            if ratio < minRatio and correct not in table.words.get(word, ()):
+                continue
+            hits.append((word, count, correct, words[correct], ratio))
+    hits.sort(key=lambda x: (-x[4], x[0]))
+    return hits
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright 2021 Wouter Franssen
+
+# This file is part of Disprop.
+#
+# Disprop is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Disprop is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Disprop. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Snapshots of the page files, taken before each bulk operation.
+
+The store lives in a '.disprop' folder next to the pages. The text of each
+page is stored once as a zlib compressed object, named after its SHA-1
+hash, so unchanged pages cost nothing in later snapshots. A snapshot is a
+JSON file that maps the page paths (relative to the project folder) to
+their hashes. The file 'log.json' lists the snapshots, oldest first.
+
+Reverting is an operation too: it takes a snapshot first, so a revert can
+be undone like any other operation.
+"""
+
+import os
+import json
+import time
+import zlib
+import hashlib
+import pages
+
+STORE_DIR = '.disprop'
+MAX_SNAPSHOTS = 100 # Older snapshots (and the objects only they use) are removed
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def _digest(text):
+    return hashlib.sha1(text.encode()).hexdigest()
+
+
+class SnapshotStore:
+
+    def __init__(self, root):
+        self.root = root
+        self.folder = os.path.join(root, STORE_DIR)
+        self.objects = os.path.join(self.folder, 'objects')
+        self.logPath = os.path.join(self.folder, 'log.json')
+        self._log = None
+
+    def log(self):
+        """
+        Returns the list of snapshots, oldest first. Each is a dict with
+        'id', 'name', 'time' and 'changed' (the number of pages changed by
+        the operation after the snapshot, None until it is known).
+        """
+        if self._log is None:
+            try:
+                with open(self.logPath,'r') as f:
+                    self._log = json.load(f)
+            except (OSError, ValueError):
+                self._log = []
+        return self._log
+
+    def _saveLog(self):
+        tmp = self.logPath + '.tmp'
+        with open(tmp,'w') as f:
+            json.dump(self._log, f, indent=1)
+        os.replace(tmp, self.logPath)
+
+    def _objectPath(self, digest):
+        return os.path.join(self.objects, digest[:2], digest[2:])
+
+    def _snapshotPath(self, num):
+        return os.path.join(self.folder, f'{num:06d}.json')
+
+    def _put(self, text):
+        data = text.encode()
+        digest = hashlib.sha1(data).hexdigest()
+        path = self._objectPath(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = path + '.tmp'
+            with open(tmp,'wb') as f:
+                f.write(zlib.compress(data))
+            os.replace(tmp, path)
+        return digest
+
+    def _get(self, digest):
+        try:
+            with open(self._objectPath(digest),'rb') as f:
+                return zlib.decompress(f.read()).decode()
+        except (OSError, zlib.error) as e:
+            raise SnapshotError(f'Object {digest} is damaged: {e}')
+
+    def pageHashes(self, num):
+        """
+        Returns the dict page path --> hash of a snapshot.
+        """
+        try:
+            with open(self._snapshotPath(num),'r') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            raise SnapshotError(f'Snapshot {num} is damaged: {e}')
+
+    def take(self, name, locations):
+        """
+        Stores the current text of the page files as a new snapshot.
+
+        Returns
+        -------
+        dict: the log entry of the snapshot
+        """
+        os.makedirs(self.objects, exist_ok=True)
+        log = self.log()
+        hashes = {os.path.relpath(loc, self.root): self._put(pages.readPage(loc)) for loc in locations}
+        num = log[-1]['id'] + 1 if log else 1
+        with open(self._snapshotPath(num),'w') as f:
+            json.dump(hashes, f)
+        entry = {'id': num, 'name': name, 'time': time.time(), 'changed': None}
+        log.append(entry)
+        if len(log) > MAX_SNAPSHOTS:
+            self._prune(len(log) - MAX_SNAPSHOTS)
+        self._saveLog()
+        return entry
+
+    def finish(self, entry, locations):
+        """
+        Sets 'changed' of the log entry of a snapshot, after its operation:
+        the number of pages that now differ from the snapshot.
+        """
+        hashes = self.pageHashes(entry['id'])
+        entry['changed'] = sum(1 for loc in locations
+                               if hashes.get(os.path.relpath(loc, self.root)) != _digest(pages.readPage(loc)))
+        self._saveLog()
+
+    def restore(self, num, progress=None):
+        """
+        Writes the pages of a snapshot back. Only pages that differ are written.
+
+        Returns
+        -------
+        int: the number of restored pages
+        """
+        hashes = self.pageHashes(num)
+        restored = 0
+        for pos, (key, digest) in enumerate(hashes.items()):
+            if progress is not None:
+                progress(pos, len(hashes))
+            loc = os.path.join(self.root, key)
+            if os.path.exists(loc) and _digest(pages.readPage(loc)) == digest:
+                continue
+            pages.writePage(loc, self._get(digest))
+            restored += 1
+        return restored
+
+    def _prune(self, number):
+        log = self.log()
+        for entry in log[:number]:
+            try:
+                os.remove(self._snapshotPath(entry['id']))
+            except OSError:
+                pass
+        del log[:number]
+        used = set()
+        for entry in log:
+            used.update(self.pageHashes(entry['id']).values())
+        for sub in os.listdir(self.objects):
+            for name in os.listdir(os.path.join(self.objects, sub)):
+                if sub + name not in used:
+                    os.remove(os.path.join(self.objects, sub, name))
+
+
+def snapshotFirst(progress, store, name, locations, func, *args):
+    """
+    Job function: takes a snapshot of the pages, runs func(progress, *args),
+    and then logs the number of pages it changed.
+    """
+    progress(0, 1)
+    entry = store.take(name, locations)
+    try:
+        return func(progress, *args)
+    finally:
+        store.finish(entry, locations)
+
+
+def revertJob(progress, store, num):
+    """
+    Job function: restores snapshot num. Run with snapshotFirst, so the
+    revert is logged as an operation of its own.
+    """
+    return store.restore(num, progress)
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright 2021 Wouter Franssen
+
+# This file is part of Disprop.
+#
+# Disprop is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Disprop is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Disprop. If not, see <http://www.gnu.org/licenses/>.
+
+import os.path
+import re
+import collections as col
+
+GOOD_WORDS_FILE = 'good_words.txt'
+
+# Patterns of the word count tokenization, compiled once
+_TOKEN_SUBS = [(re.compile(r'-----File: .+\.\w+-+'),' '), #remove file headers
+               (re.compile('--+'),' '), # remove long dashes
+               (re.compile(r'\*\*+'),' '), # remove multiple stars
+               (re.compile('</?[ibf]>'),''), # remove i/b/f tags
+               (re.compile('</?sc>'),''), # remove <sc> tags
+               (re.compile('<tb>'),''), # remove <tb> tags
+               (re.compile("[^\\w,.'’\\-*]"),' '), # remove non-alphanumerical chars
+               (re.compile('[_]'),' ')] #Remove underscore that is in \w
+
+_HAS_LETTER = re.compile(r'[^\W\d_]')
+
+
+def tokenize(text):
+    """
+    Splits a text in words, using the rules of the word count.
+
+    Returns
+    -------
+    List of words, in order of appearance.
+    """
+    for pattern, repl in _TOKEN_SUBS:
+        text = pattern.sub(repl,text)
+    words = text.split() #split based on white chars
+    # strip punctuation etc from left and right
+    words = [w.strip('\'\\.,') for w in words]
+    # strip some chars from the left only
+    words = [w.lstrip('-*') for w in words]
+    # remove empty string
+    return [w for w in words if len(w) != 0]
+
+
+def loadGoodWords(path):
+    """
+    Reads a good words file (one word per line). Returns an empty set if it does not exist.
+    """
+    if not os.path.isfile(path):
+        return set()
+    with open(path,'r') as f:
+        return set(x.strip() for x in f.read().splitlines() if len(x.strip()) > 0)
+
+
+def saveGoodWords(path, words):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path,'w') as f:
+        f.write('\n'.join(sorted(words)) + '\n')
+
+
+def isKnown(word, dictionaries, goodWords):
+    """
+    Checks a single token against the good words and the dictionaries.
+    Hyphenated (or starred hyphen) words are accepted if all parts are known.
+    """
+    if word in goodWords:
+        return True
+    if not _HAS_LETTER.search(word): # numbers etc. are not checked
+        return True
+    word = word.replace('’',"'")
+    if word in goodWords or dictionaries.check(word):
+        return True
+    if word.lower() in goodWords:
+        return True
+    if '-' in word:
+        parts = [x for x in word.replace('*','').split('-') if len(x) > 0]
+        if len(parts) > 1:
+            return all(isKnown(x, dictionaries, goodWords) for x in parts)
+    return False
+
+
+def spellcheck(texts, dictionaries, goodWords=frozenset()):
+    """
+    Finds the words that are not in the dictionaries or good words.
+    Each distinct word is checked only once.
+
+    Parameters
+    ----------
+    texts: iterable of str, the text of each page
+    dictionaries: dictionary.DictionarySet
+    goodWords [= empty]: set of str, words that are accepted
+
+    Returns
+    -------
+    words: Counter of all words
+    suspects: dict, suspect word --> list of page indices (1-based) where it occurs
+    """
+    words = col.Counter()
+    pages = col.defaultdict(list)
+    for pos, text in enumerate(texts):
+        counts = col.Counter(tokenize(text))
+        words.update(counts)
+        for word in counts:
+            pages[word].append(pos + 1)
+
+    suspects = dict()
+    for word in words:
+        if not isKnown(word, dictionaries, goodWords):
+            suspects[word] = pages[word]
+    return words, suspects
@@ -0,0 +1,452 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright 2021 Wouter Franssen
+
+# This file is part of Disprop.
+#
+# Disprop is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Disprop is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Disprop. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Conversion of DP formatted text to a skeleton HTML document.
+
+The text is read line by line, and each paragraph, verse or note is written
+as soon as it ends, so only the current paragraph (or note) is kept in
+memory. Paragraphs after four blank lines become chapter headings (h2),
+after two or three blank lines section headings (h3).
+
+Footnote anchors ([1], [A]) are numbered in order. A footnote is linked
+to the oldest anchor with the same label that has no footnote yet, so
+labels that restart on each page are handled.
+
+Footnotes are written after the paragraph they follow, just before the
+next other output, so a continued footnote ('[Footnote 1: ...]*' and
+'*[Footnote: ...]' on the next page) is merged into one. An incomplete
+footnote waits for its continuation until a new footnote on a later page,
+or until the page after the next one starts; then it is written as it
+is, and reported. A paragraph
+followed by footnotes at the bottom of a page stays open, and continues
+if the next page does not start with a blank line.
+"""
+
+import os
+import re
+import html
+import collections
+import pages
+
+INLINE_RE = re.compile(r'&lt;(/?)(i|b|sc|g|f|u)&gt;') # On escaped text
+INLINE_TAGS = {'i': ('<i>', '</i>'),
+               'b': ('<b>', '</b>'),
+               'sc': ('<span class="smcap">', '</span>'),
+               'g': ('<em class="gesperrt">', '</em>'),
+               'f': ('<span class="antiqua">', '</span>'),
+               'u': ('<u>', '</u>')}
+ANCHOR_RE = re.compile(r'\[(\d+|[A-Za-z])\]')
+NOTE_RE = re.compile(r'(\*?)\[(Footnote|Illustration|Sidenote)\b *([^:\]]*):? *')
+MARKUP_LINES = ('/*', '/#', '#/', '<tb>', '[Blank Page]') # Lines that never continue a paragraph
+CHAPTER_BLANKS = 4 # Blank lines before a chapter heading
+SECTION_BLANKS = 2 # Blank lines before a section heading
+MAXPENDING = 100 # Anchors per label that wait for their footnote (older ones are dropped)
+
+HEAD = """<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+<style>
+body {{ margin-left: 10%; margin-right: 10%; }}
+h1, h2, h3 {{ text-align: center; clear: both; }}
+p {{ margin-top: .51em; margin-bottom: .49em; text-align: justify; }}
+hr.tb {{ width: 45%; margin-left: 27.5%; margin-right: 27.5%; }}
+.pagenum {{ position: absolute; right: 4%; font-size: smaller; color: #aaa; font-style: normal; }}
+.smcap {{ font-variant: small-caps; }}
+.gesperrt {{ letter-spacing: .2em; font-style: normal; }}
+.antiqua {{ font-family: sans-serif; }}
+.blockquot {{ margin-left: 5%; margin-right: 10%; }}
+.poetry-container {{ text-align: center; }}
+.poetry {{ display: inline-block; text-align: left; }}
+.poetry .stanza {{ margin: 1em auto; }}
+.poetry .verse {{ text-indent: -3em; padding-left: 3em; }}
+.fnanchor {{ vertical-align: super; font-size: .8em; text-decoration: none; }}
+.footnote {{ margin-left: 10%; margin-right: 10%; font-size: .9em; }}
+.footnote .label {{ position: absolute; right: 84%; text-align: right; }}
+.figcenter {{ margin: auto; text-align: center; }}
+.caption {{ font-weight: bold; }}
+.sidenote {{ width: 20%; float: left; clear: left; margin-right: 1em; font-size: smaller; }}
+</style>
+</head>
+<body>
+"""
+FOOT = """</body>
+</html>
+"""
+
+
+class HtmlConverter:
+
+    def __init__(self, out, title='', images='images', labels=None):
+        """
+        Input
+        -----
+        out: file object the html is written to
+        title: string, the title of the document
+        images: string, folder of the illustrations (relative to the html file)
+        labels: dict, image name --> printed page number (None: use the image names)
+        """
+        self.out = out
+        self.title = title
+        self.images = images
+        self.labels = labels
+        self.blank = 0 # Blank lines before the current line
+        self.para = [] # Converted lines of the open paragraph
+        self.paraBlank = 0 # Blank lines before the open paragraph
+        self.hold = 0 # Open paragraph followed by: 1 blank lines, 2 footnotes, 3 footnotes and a new page
+        self.heldPagenum = '' # Page markers after a held paragraph
+        self.poetry = False
+        self.stanza = False # True if a stanza is open
+        self.blocks = 0 # Number of open /# #/ blocks
+        self.note = None # [kind, label, lines, bracket depth, continued] of an open note
+        self.footnotes = [] # [link, paragraphs] of the footnotes that are not written yet
+        self.incomplete = None # Index in footnotes of a footnote that continues later
+        self.incompletePage = None # (page number, image name) of the incomplete footnote
+        self.pageNum = 0 # Number of pages started
+        self.pageName = '' # Image name of the current page
+        self.warnings = [] # Messages about footnotes that could not be joined
+        self.anchors = 0 # Number of footnote anchors/footnotes
+        self.pending = dict() # label --> numbers of the anchors without footnote
+        self.illustrations = 0
+        self.pagenum = '' # Page markers to write before the next output
+
+    def begin(self):
+        self.out.write(HEAD.format(title=html.escape(self.title)))
+
+    def end(self):
+        if self.note is not None:
+            self.finishNote()
+        self.flushPara()
+        if self.incomplete is not None:
+            self.expireFootnote()
+        self.flushFootnotes()
+        self.closePoetry()
+        self.out.write('</div>\n' * self.blocks)
+        self.blocks = 0
+        if self.pagenum:
+            self.out.write(f'<p>{self.pagenum}</p>\n')
+            self.pagenum = ''
+        self.out.write(FOOT)
+
+    def page(self, name):
+        """
+        Marks the start of a page. name is the name of the page image.
+        With page labels, pages without a printed number get no marker.
+        """
+        self.pageNum += 1
+        self.pageName = name
+        if self.incomplete is not None and self.pageNum - self.incompletePage[0] >= 2:
+            self.expireFootnote()
+        if self.labels is None:
+            stem = html.escape(os.path.splitext(name)[0])
+            marker = f'<span class="pagenum" id="Page_{stem}">[{stem}]</span>'
+        elif self.labels.get(name):
+            number = html.escape(self.labels[name])
+            marker = f'<span class="pagenum" id="Page_{number}">[Pg {number}]</span>'
+        else:
+            marker = ''
+        if self.hold == 1: # The paragraph ended on the previous page
+            self.flushPara()
+        if self.hold:
+            self.hold = 3
+            self.heldPagenum += marker
+        elif self.para:
+            if marker:
+                self.para.append(marker)
+        else:
+            self.pagenum += marker
+
+    def inline(self, text):
+        """
+        Converts the inline markup of a line of text.
+        """
+        text = html.escape(text, quote=False)
+        text = INLINE_RE.sub(lambda m: INLINE_TAGS[m.group(2)][1 if m.group(1) else 0], text)
+        return ANCHOR_RE.sub(self.anchor, text)
+
+    def anchor(self, m):
+        self.anchors += 1
+        num = self.anchors
+        if m.group(1) not in self.pending:
+            self.pending[m.group(1)] = collections.deque(maxlen=MAXPENDING)
+        self.pending[m.group(1)].append(num)
+        return f'<a id="FNanchor_{num}" href="#Footnote_{num}" class="fnanchor">[{m.group(1)}]</a>'
+
+    def write(self, text):
+        self.flushFootnotes()
+        self.out.write(self.pagenum + text + '\n')
+        self.pagenum = ''
+
+    def emit(self, text):
+        """
+        Writes markup that gets no page markers.
+        """
+        self.flushFootnotes()
+        self.out.write(text)
+
+    def flushFootnotes(self):
+        if self.incomplete is not None:
+            return
+        for link, paras in self.footnotes:
+            if link:
+                paras[0] = f'{link} {paras[0]}'
+            self.out.write('<div class="footnote">\n' + '\n'.join(f'<p>{x}</p>' for x in paras) + '\n</div>\n')
+        self.footnotes = []
+
+    def line(self, text):
+        """
+        Converts a line of text.
+        """
+        if self.note is not None:
+            self.noteLine(text)
+            return
+        stripped = text.strip()
+        if self.poetry:
+            if stripped == '*/':
+                self.closePoetry()
+            elif not stripped:
+                if self.stanza:
+                    self.emit('</div>\n')
+                    self.stanza = False
+            else:
+                if not self.stanza:
+                    self.emit('<div class="stanza">\n')
+                    self.stanza = True
+                indent = len(text) - len(text.lstrip(' '))
+                style = f' style="margin-left: {indent / 2:g}em;"' if indent else ''
+                self.write(f'<div class="verse"{style}>{self.inline(stripped)}</div>')
+            return
+        if not stripped:
+            if self.hold == 3: # The next page starts a new paragraph
+                self.flushPara()
+            elif self.para and not self.hold:
+                self.hold = 1
+            self.blank += 1
+            return
+        m = NOTE_RE.match(stripped)
+        if self.para and m is not None and m.group(2) == 'Footnote':
+            self.hold = max(self.hold, 2)
+        elif self.hold == 3 and m is None and stripped not in MARKUP_LINES: # The paragraph continues on this page
+            self.para.append(self.heldPagenum + self.inline(stripped))
+            self.heldPagenum = ''
+            self.hold = 0
+            self.blank = 0
+            return
+        elif self.hold:
+            self.flushPara()
+        if stripped == '/*':
+            self.flushPara()
+            self.emit('<div class="poetry-container"><div class="poetry">\n')
+            self.poetry = True
+        elif stripped == '/#':
+            self.flushPara()
+            self.emit('<div class="blockquot">\n')
+            self.blocks += 1
+        elif stripped == '#/' and self.blocks:
+            self.flushPara()
+            self.emit('</div>\n')
+            self.blocks -= 1
+        elif stripped == '<tb>':
+            self.flushPara()
+            self.write('<hr class="tb">')
+        elif stripped == '[Blank Page]':
+            pass
+        elif m is not None:
+            if not self.hold:
+                self.flushPara()
+            self.note = [m.group(2), m.group(3).strip(), [], 0, bool(m.group(1))]
+            self.noteLine(stripped[m.end():])
+            return
+        else:
+            if not self.para:
+                self.paraBlank = self.blank
+            self.para.append(self.inline(stripped))
+        self.blank = 0
+
+    def flushPara(self):
+        """
+        Writes the open paragraph, and then the footnotes that followed it.
+        """
+        if not self.para:
+            return
+        if self.paraBlank >= CHAPTER_BLANKS and not self.blocks:
+            text = '<h2>' + '<br>\n'.join(self.para) + '</h2>'
+        elif self.paraBlank >= SECTION_BLANKS and not self.blocks:
+            text = '<h3>' + '<br>\n'.join(self.para) + '</h3>'
+        else:
+            text = '<p>' + '\n'.join(self.para) + '</p>'
+        self.out.write(self.pagenum + text + '\n')
+        self.pagenum = self.heldPagenum
+        self.heldPagenum = ''
+        self.para = []
+        self.hold = 0
+        self.flushFootnotes()
+
+    def expireFootnote(self):
+        """
+        Stops waiting for the continuation of the incomplete footnote.
+        """
+        self.warnings.append(f'{self.incompletePage[1]}: continued footnote without continuation')
+        self.incomplete = None
+        if not self.para: # Otherwise written after the paragraph
+            self.flushFootnotes()
+
+    def closePoetry(self):
+        if self.stanza:
+            self.emit('</div>\n')
+            self.stanza = False
+        if self.poetry:
+            self.emit('</div></div>\n')
+            self.poetry = False
+
+    def noteLine(self, text):
+        """
+        Adds a line to the open note, and finishes the note at its closing bracket.
+        """
+        depth = self.note[3]
+        for pos, char in enumerate(text):
+            if char == '[':
+                depth += 1
+            elif char == ']':
+                if depth == 0:
+                    self.note[2].append(text[:pos])
+                    rest = text[pos + 1:]
+                    self.finishNote(rest.startswith('*'))
+                    rest = rest[1:] if rest.startswith('*') else rest
+                    if rest.strip():
+                        self.line(rest)
+                    return
+                depth -= 1
+        self.note[3] = depth
+        self.note[2].append(text)
+
+    def finishNote(self, incomplete=False):
+        """
+        Writes the open note. Footnotes are kept in self.footnotes; an
+        incomplete footnote (closed by ']*') waits for its continuation.
+        """
+        kind, label, lines, depth, continued = self.note
+        self.note = None
+        paras = []
+        for text in lines:
+            if text.strip():
+                if not paras or paras[-1] is None:
+                    paras.append([])
+                paras[-1].append(self.inline(text.strip()))
+            elif paras:
+                paras.append(None)
+        paras = ['\n'.join(x) for x in paras if x]
+        if kind == 'Footnote' and continued and self.footnotes:
+            num = self.incomplete if self.incomplete is not None else len(self.footnotes) - 1
+            previous = self.footnotes[num][1]
+            if paras:
+                previous[-1] = f'{previous[-1]}\n{paras[0]}' if previous[-1] else paras[0]
+                previous.extend(paras[1:])
+            self.incomplete = num if incomplete else None
+            if incomplete:
+                self.incompletePage = (self.pageNum, self.pageName)
+        elif kind == 'Footnote' and continued:
+            self.warnings.append(f'{self.pageName}: continuation of a footnote that was already written')
+            self.footnotes.append(['', paras or ['']])
+        elif kind == 'Footnote':
+            if self.incomplete is not None and self.pageNum > self.incompletePage[0]:
+                self.expireFootnote()
+            waiting = self.pending.get(label)
+            if waiting:
+                num = waiting.popleft()
+                link = f'<a id="Footnote_{num}" href="#FNanchor_{num}" class="label">[{html.escape(label)}]</a>'
+            else:
+                self.anchors += 1
+                link = f'<a id="Footnote_{self.anchors}" class="label">[{html.escape(label)}]</a>'
+            self.footnotes.append([link, paras or ['']])
+            if incomplete and self.incomplete is None:
+                self.incomplete = len(self.footnotes) - 1
+                self.incompletePage = (self.pageNum, self.pageName)
+        elif kind == 'Illustration':
+            self.illustrations += 1
+            caption = ''.join(f'<p>{x}</p>' for x in paras)
+            src = f'{self.images}/illus{self.illustrations:03d}.jpg'
+            self.write(f'<div class="figcenter">\n<img src="{src}" alt="">\n'
+                       + (f'<div class="caption">{caption}</div>\n' if caption else '') + '</div>')
+        else:
+            self.write('<div class="sidenote">' + '<br>'.join(paras) + '</div>')
+        self.blank = 0
+
+
+def _convert(outPath, title, labels, feed):
+    """
+    Writes the html file via a temporary file. feed(converter) converts the lines.
+
+    Returns
+    -------
+    (outPath, list of warnings)
+    """
+    tmp = outPath + '.tmp'
+    try:
+        with open(tmp, 'w') as out:
+            conv = HtmlConverter(out, title, labels=labels)
+            conv.begin()
+            feed(conv)
+            conv.end()
+        os.replace(tmp, outPath)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    return outPath, conv.warnings
+
+
+def convertPages(progress, locations, outPath, title='', labels=None):
+    """
+    Job function: converts the pages to a html file. The file is written
+    while the pages are read. labels: see HtmlConverter.
+    """
+    def feed(conv):
+        for pos, loc in enumerate(locations):
+            progress(pos, len(locations))
+            conv.page(pages.imageName(loc))
+            with open(loc, 'r') as f:
+                for line in f:
+                    conv.line(line.rstrip('\n'))
+            conv.blank = 0 # Blank lines do not continue on the next page
+    return _convert(outPath, title, labels, feed)
+
+
+def convertFile(progress, path, outPath, title='', labels=None):
+    """
+    Job function: converts a joined text file, with '-----File: ...' page
+    separators, to a html file. labels: see HtmlConverter.
+    """
+    size = max(os.path.getsize(path), 1)
+    def feed(conv):
+        done = 0
+        with open(path, 'r') as f:
+            for num, line in enumerate(f):
+                done += len(line)
+                if num % 1000 == 0:
+                    progress(min(done, size), size)
+                m = pages.SEPARATOR_RE.match(line)
+                if m is not None:
+                    conv.page(m.group(1))
+                else:
+                    conv.line(line.rstrip('\n'))
+    return _convert(outPath, title, labels, feed)
@@ -47,6 +47,7 @@ class ToolWindow(QtWidgets.QWidget):
         super(ToolWindow, self).__init__(parent)
         self.setWindowFlags(QtCore.Qt.Window | QtCore.Qt.Tool)
         self.father = parent
+        self.job = None        # Background job that only serves this window (cancelled on close)
         self.setWindowTitle(self.NAME)
         self.layout = QtWidgets.QGridLayout(self)
         self.grid = QtWidgets.QGridLayout()
@@ -92,6 +93,8 @@ class ToolWindow(QtWidgets.QWidget):
         *args
             Any arguments are ignored.
         """
+        if self.job is not None:
+            self.father.jobRunner.cancel(self.job)
         if self.MENUDISABLE:
             self.father.menuEnable(True)
         self.deleteLater()